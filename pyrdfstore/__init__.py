@@ -7,7 +7,9 @@
 .. moduleauthor:: "Open Science Team VLIZ vzw" <opsci@vliz.be>
 """
 
+from .batch import BatchInsertError
 from .build import create_rdf_store
+from .cache import CachingRDFStore
 from .clean import (
     build_clean_chain,
     clean_graph,
@@ -18,6 +20,8 @@ from .store import GraphNameMapper, RDFStore
 
 __all__ = [
     "RDFStore",
+    "BatchInsertError",
+    "CachingRDFStore",
     "create_rdf_store",
     "GraphNameMapper",
     "build_clean_chain",
@@ -0,0 +1,580 @@
+"""Array backed in memory store.
+
+Every rdf term is interned into an integer id, and the triples of each
+named_graph are kept as sorted numpy arrays of those ids, in the SPO, POS
+and OSP column orders. That costs some 72 bytes per triple (plus the
+terms themselves, once) versus the roughly 1KB of the rdflib Memory store.
+
+Note: this module requires numpy (the optional 'arrays' extra)
+"""
+
+import logging
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from rdflib import Dataset, Graph
+from rdflib.graph import ConjunctiveGraph
+from rdflib.plugins.sparql import CUSTOM_EVALS
+from rdflib.plugins.sparql.parserutils import CompValue
+from rdflib.plugins.sparql.sparql import FrozenBindings, QueryContext
+from rdflib.store import Store
+from rdflib.term import Identifier, Node
+
+from .snapshot import Snapshot, write_snapshot
+from .store import MemoryRDFStore, union_dataset
+
+log = logging.getLogger(__name__)
+
+ID_DTYPE = np.int64
+# the kept column orders, as positions of the (s, p, o) columns
+SPO: Tuple[int, ...] = (0, 1, 2)
+POS: Tuple[int, ...] = (1, 2, 0)
+OSP: Tuple[int, ...] = (2, 0, 1)
+VIEWS_KEPT = 16  # views (with their union index) kept per set of graphs
+
+IdPattern = Tuple[Optional[int], Optional[int], Optional[int]]
+
+
+def _no_rows() -> np.ndarray:
+    return np.empty((0, 3), dtype=ID_DTYPE)
+
+
+def _sorted_rows(rows: np.ndarray) -> np.ndarray:
+    # lexicographic sort of the rows (first column first)
+    return rows[np.lexsort(rows.T[::-1])]
+
+
+def _row_keys(*tables: np.ndarray) -> List[np.ndarray]:
+    """maps the rows of the (equally wide) tables to single int keys,
+    equal keys meaning equal rows
+    """
+    both = np.concatenate(tables)
+    _, inverse = np.unique(both, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    bounds = np.cumsum([len(t) for t in tables])[:-1]
+    return np.split(inverse, bounds)
+
+
+def _isin_rows(rows: np.ndarray, other: np.ndarray) -> np.ndarray:
+    """mask of the rows that also appear in other"""
+    if len(rows) == 0 or len(other) == 0:
+        return np.zeros(len(rows), dtype=bool)
+    keys, other_keys = _row_keys(rows, other)
+    return np.isin(keys, other_keys)
+
+
+class TermDictionary:
+    """Interns rdf terms as consecutive integer ids.
+    Note: ids are never released, terms no longer used simply linger
+    """
+
+    def __init__(self, terms: Iterable[Node] = ()):
+        """constructor
+
+        :param terms: (optional) the initial terms, getting ids 0, 1, ...
+        :type terms: Iterable[Node]
+        """
+        self._terms: List[Node] = list(terms)
+        self._ids: Dict[Node, int] = {t: i for i, t in enumerate(self._terms)}
+        self._decoder: np.ndarray = np.empty(0, dtype=object)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def intern(self, term: Node) -> int:
+        """the id of the term, assigning a new one if unknown"""
+        id = self._ids.get(term)
+        if id is None:
+            with self._lock:  # the dictionary is shared by all graphs
+                id = self._ids.get(term)
+                if id is None:
+                    self._terms.append(term)
+                    id = self._ids[term] = len(self._terms) - 1
+        return id
+
+    def lookup(self, term: Node) -> Optional[int]:
+        """the id of the term, None if unknown"""
+        return self._ids.get(term)
+
+    def term(self, id: int) -> Node:
+        return self._terms[id]
+
+    @property
+    def terms(self) -> List[Node]:
+        """all terms, in the order of their ids"""
+        return list(self._terms)
+
+    def decode(self, ids: np.ndarray) -> np.ndarray:
+        """the terms for the ids, as an object array of the same shape"""
+        if len(self._decoder) != len(self._terms):
+            terms: List[Node] = list(self._terms)  # as it may grow meanwhile
+            decoder = np.empty(len(terms), dtype=object)
+            decoder[:] = terms
+            self._decoder = decoder
+        return self._decoder[ids]
+
+
+class TripleIndex:
+    """The triples of one graph as a sorted (n, 3) array of term ids,
+    with its POS and OSP permutations derived on demand. So every triple
+    pattern is a range (binary search) on the leading columns of one of
+    them. Changes are buffered, and merged in on the next lookup.
+    """
+
+    def __init__(self, rows: Optional[np.ndarray] = None):
+        """constructor
+
+        :param rows: (optional) the initial (s, p, o) id rows,
+          should be unique and sorted
+        :type rows: np.ndarray
+        """
+        rows = rows if rows is not None else _no_rows()
+        self._perms: Dict[Tuple[int, ...], np.ndarray] = {SPO: rows}
+        self._added: List[np.ndarray] = list()
+        self._removed: List[np.ndarray] = list()
+        self._lock = threading.RLock()
+
+    def add(self, rows: np.ndarray) -> None:
+        with self._lock:
+            if self._removed:  # keep the order of adds and removes
+                self._merge()
+            self._added.append(rows)
+
+    def remove(self, rows: np.ndarray) -> None:
+        with self._lock:
+            if self._added:
+                self._merge()
+            self._removed.append(rows)
+
+    def _merge(self) -> None:
+        with self._lock:
+            if not (self._added or self._removed):
+                return
+            spo: np.ndarray = self._perms[SPO]
+            if self._added:
+                spo = np.unique(np.concatenate([spo] + self._added), axis=0)
+            if self._removed:
+                spo = spo[~_isin_rows(spo, np.concatenate(self._removed))]
+            self._perms = {SPO: spo}
+            self._added, self._removed = list(), list()
+
+    @property
+    def rows(self) -> np.ndarray:
+        """all (s, p, o) id rows, sorted"""
+        return self._perm(SPO)
+
+    def _perm(self, order: Tuple[int, ...]) -> np.ndarray:
+        with self._lock:
+            self._merge()
+            perm = self._perms.get(order)
+            if perm is None:
+                perm = self._perms[order] = _sorted_rows(
+                    self._perms[SPO][:, order]
+                )
+            return perm
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def match(self, pattern: IdPattern) -> np.ndarray:
+        """the rows matching the pattern (None being a wildcard)
+
+        :param pattern: the (s, p, o) ids to match
+        :type pattern: IdPattern
+        :return: the matching (s, p, o) id rows
+        :rtype: np.ndarray
+        """
+        s, p, o = pattern
+        # pick the permutation in which the bound ids form a prefix
+        if s is not None:
+            order = OSP if p is None and o is not None else SPO
+        elif p is not None:
+            order = POS
+        elif o is not None:
+            order = OSP
+        else:
+            return self.rows
+        perm: np.ndarray = self._perm(order)
+        lo, hi = 0, len(perm)
+        for col, id in enumerate(pattern[i] for i in order):
+            if id is None:
+                break
+            column = perm[lo:hi, col]
+            lo, hi = (
+                lo + np.searchsorted(column, id, side="left"),
+                lo + np.searchsorted(column, id, side="right"),
+            )
+        return perm[lo:hi][:, np.argsort(order)]
+
+
+class ArrayStore(Store):
+    """rdflib Store keeping the quads in a TripleIndex per context,
+    so the rdflib sparql engine can query them
+    (with the basic graph patterns evaluated by vectorized joins)
+    """
+
+    context_aware = True
+    graph_aware = True
+    formula_aware = False
+    transaction_aware = False
+
+    def __init__(
+        self,
+        configuration=None,
+        identifier=None,
+        terms: Optional[TermDictionary] = None,
+        indexes: Optional[Dict[Node, TripleIndex]] = None,
+    ):
+        super().__init__(configuration, identifier)
+        self.terms = terms if terms is not None else TermDictionary()
+        self._indexes: Dict[Node, TripleIndex] = dict(indexes or {})
+        self._union: Optional[TripleIndex] = None
+        #: counts the changes, so views on the indexes can tell theirs apart
+        self.version: int = 0
+        self._lock = threading.RLock()
+
+    def index(self, context: Optional[Node]) -> Optional[TripleIndex]:
+        """the index of the context (identifier),
+        or of the union of all contexts if None
+        """
+        if context is not None:
+            return self._indexes.get(context)
+        # else
+        with self._lock:
+            if self._union is None:
+                rows = [index.rows for index in self._indexes.values()]
+                self._union = TripleIndex(
+                    np.unique(np.concatenate(rows), axis=0)
+                    if rows
+                    else _no_rows()
+                )
+            return self._union
+
+    def _changed(self, context: Node, create: bool = False) -> TripleIndex:
+        self._union = None
+        self.version += 1
+        if create and context not in self._indexes:
+            self._indexes[context] = TripleIndex()
+        return self._indexes.get(context)
+
+    def ids(self, triple: tuple) -> Optional[IdPattern]:
+        """the id pattern for the (s, p, o) pattern,
+        None if it holds a term that is not known (so nothing can match)
+        """
+        ids = tuple(
+            None if term is None else self.terms.lookup(term)
+            for term in triple
+        )
+        if any(i is None and t is not None for i, t in zip(ids, triple)):
+            return None
+        return ids
+
+    def add(self, triple, context, quoted=False) -> None:
+        self.addN([(*triple, context)])
+
+    def addN(self, quads) -> None:
+        grouped: Dict[Node, list] = defaultdict(list)
+        intern = self.terms.intern
+        with self._lock:
+            for s, p, o, c in quads:
+                ids = (intern(s), intern(p), intern(o))
+                grouped[getattr(c, "identifier", c)].append(ids)
+            for context, ids in grouped.items():
+                rows = np.array(ids, dtype=ID_DTYPE).reshape(-1, 3)
+                self._changed(context, create=True).add(rows)
+
+    def remove(self, triple, context=None) -> None:
+        context = getattr(context, "identifier", context)
+        with self._lock:
+            ids = self.ids(triple)
+            if ids is None:
+                return
+            contexts = list(self._indexes) if context is None else [context]
+            for context in contexts:
+                index = self._changed(context)
+                if index is None:
+                    continue
+                if None in ids:
+                    rows = index.match(ids)
+                else:  # no need to look up (nor merge) the single triple
+                    rows = np.array([ids], dtype=ID_DTYPE)
+                index.remove(rows)
+
+    def triples(self, triple_pattern, context=None):
+        context = getattr(context, "identifier", context)
+        index = self.index(context)
+        ids = self.ids(triple_pattern)
+        if index is None or ids is None:
+            return
+        rows = index.match(ids)
+        for (s, p, o), row in zip(self.terms.decode(rows), rows):
+            contexts = (
+                self._contexts_of(tuple(int(id) for id in row))
+                if context is None
+                else iter([self._context(context)])
+            )
+            yield (s, p, o), contexts
+
+    def _context(self, context: Node) -> Graph:
+        return Graph(store=self, identifier=context)
+
+    def _contexts_of(self, pattern: IdPattern) -> Iterator[Graph]:
+        for context, index in list(self._indexes.items()):
+            if len(index.match(pattern)):
+                yield self._context(context)
+
+    def __len__(self, context=None) -> int:
+        index = self.index(getattr(context, "identifier", context))
+        return len(index) if index is not None else 0
+
+    def contexts(self, triple=None) -> Iterator[Graph]:
+        if triple is not None:
+            ids = self.ids(triple)
+            if ids is not None:
+                yield from self._contexts_of(ids)
+            return
+        for context in list(self._indexes):
+            yield self._context(context)
+
+    def graph_rows(self) -> Iterator[Tuple[Node, np.ndarray]]:
+        """the (sorted) id rows of each context"""
+        for context, index in list(self._indexes.items()):
+            yield context, index.rows
+
+    def load_graph(self, context: Node, rows: np.ndarray) -> None:
+        """adds the id rows (as is, so not copying a sorted read-only
+        array) to the context
+        """
+        with self._lock:
+            index = self._indexes.get(context)
+            if index is None:
+                self._indexes[context] = TripleIndex(rows)
+            else:
+                index.add(rows)
+            self._union = None
+            self.version += 1
+
+    def add_graph(self, graph: Graph) -> None:
+        with self._lock:
+            self._changed(graph.identifier, create=True)
+
+    def remove_graph(self, graph: Graph) -> None:
+        with self._lock:
+            self._indexes.pop(graph.identifier, None)
+            self._union = None
+            self.version += 1
+
+
+def _join(
+    left: Dict[Node, np.ndarray],
+    left_size: int,
+    right: Dict[Node, np.ndarray],
+    right_size: int,
+) -> Tuple[Dict[Node, np.ndarray], int]:
+    """joins two tables of solutions (columns of ids per variable)
+    on their shared variables, by sorting and binary searching
+    """
+    shared = [var for var in right if var in left]
+    if not shared:  # cross product
+        left_idx = np.repeat(np.arange(left_size), right_size)
+        right_idx = np.tile(np.arange(right_size), left_size)
+    else:
+        if len(shared) == 1:
+            left_key, right_key = left[shared[0]], right[shared[0]]
+        else:
+            left_key, right_key = _row_keys(
+                np.stack([left[var] for var in shared], axis=1),
+                np.stack([right[var] for var in shared], axis=1),
+            )
+        order = np.argsort(right_key, kind="stable")
+        sorted_key = right_key[order]
+        lo = np.searchsorted(sorted_key, left_key, side="left")
+        counts = np.searchsorted(sorted_key, left_key, side="right") - lo
+        left_idx = np.repeat(np.arange(left_size), counts)
+        # position of each output row within the run of its left row
+        starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+        right_idx = order[np.arange(len(left_idx)) + starts]
+    joined = {var: column[left_idx] for var, column in left.items()}
+    for var, column in right.items():
+        joined.setdefault(var, column[right_idx])
+    return joined, len(left_idx)
+
+
+def _pattern_table(
+    ctx: QueryContext, store: ArrayStore, index: TripleIndex, triple: tuple
+) -> Optional[Tuple[Dict[Node, np.ndarray], int]]:
+    """the solutions (as columns of ids per variable) of one triple pattern,
+    None if it holds a term not in the store
+    """
+    bound = [ctx[term] for term in triple]  # None for the unbound variables
+    ids = store.ids(tuple(bound))
+    if ids is None:
+        return None
+    rows: np.ndarray = index.match(ids)
+    table: Dict[Node, np.ndarray] = dict()
+    for pos, (term, value) in enumerate(zip(triple, bound)):
+        if value is not None:
+            continue
+        if term in table:  # repeated variable, e.g. ?x ?p ?x
+            rows = rows[rows[:, pos] == table[term]]
+            table = {var: rows[:, triple.index(var)] for var in table}
+        else:
+            table[term] = rows[:, pos]
+    return table, len(rows)
+
+
+def _solve_bgp(
+    ctx: QueryContext, store: ArrayStore, index: TripleIndex, triples: list
+) -> Iterator[FrozenBindings]:
+    tables = list()
+    for triple in triples:
+        table = _pattern_table(ctx, store, index, triple)
+        if table is None or table[1] == 0:
+            return  # no solutions at all
+        tables.append(table)
+    # start from the smallest, then keep joining the smallest connected one
+    solutions, size = dict(), 1
+    while tables and size > 0:
+        connected = [
+            i for i, t in enumerate(tables) if set(t[0]) & set(solutions)
+        ]
+        pick = min(connected or range(len(tables)), key=lambda i: tables[i][1])
+        solutions, size = _join(solutions, size, *tables.pop(pick))
+    if size == 0:
+        return
+    base: FrozenBindings = ctx.solution()
+    terms = {var: store.terms.decode(ids) for var, ids in solutions.items()}
+    for row in zip(*terms.values()) if terms else [()] * size:
+        yield base.merge(dict(zip(terms, row)))
+
+
+def _eval_bgp(ctx: QueryContext, part: CompValue):
+    """custom sparql evaluation of the basic graph patterns on an
+    ArrayStore, leaving anything else to rdflib
+    """
+    if part.name != "BGP":
+        raise NotImplementedError()
+    if any(
+        not isinstance(term, Identifier)  # e.g. property paths
+        for triple in part.triples
+        for term in triple
+    ):
+        raise NotImplementedError()
+    graph = ctx.graph
+    store = getattr(graph, "store", None)
+    if not isinstance(store, ArrayStore):
+        raise NotImplementedError()
+    if isinstance(graph, ConjunctiveGraph):
+        default: Graph = (
+            graph.default_graph
+            if isinstance(graph, Dataset)
+            else graph.default_context
+        )
+        context = None if graph.default_union else default.identifier
+    else:
+        context = graph.identifier
+    index = store.index(context)
+    if index is None:
+        return iter(())
+    return _solve_bgp(ctx, store, index, part.triples)
+
+
+CUSTOM_EVALS["pyrdfstore.arrays"] = _eval_bgp
+
+
+class ArrayRDFStore(MemoryRDFStore):
+    """In memory store for (read-heavy) analytics over large graphs,
+    keeping the triples as dictionary-encoded numpy arrays.
+    Selects run on the rdflib sparql engine, with the triple patterns
+    looked up by binary search and their joins vectorized.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # the views per set of contexts, for the version they were made of
+        self._views: Tuple[int, Dict[frozenset, Dataset]] = (-1, dict())
+
+    def _backend(self) -> Store:
+        return ArrayStore()
+
+    def _narrowed(self, named_graphs: List[str]) -> Dataset:
+        # reused while the store is unchanged, so is their union index
+        store: ArrayStore = self._dataset.store
+        version, views = self._views
+        if version != store.version:
+            views = dict()
+            self._views = (store.version, views)
+        key = frozenset(self._context(ng) for ng in named_graphs)
+        view: Optional[Dataset] = views.get(key)
+        if view is None:
+            indexes = {context: store.index(context) for context in key}
+            view = Dataset(
+                store=ArrayStore(
+                    terms=store.terms,
+                    indexes={
+                        c: i for c, i in indexes.items() if i is not None
+                    },
+                ),
+                default_union=True,
+            )
+            if len(views) >= VIEWS_KEPT:
+                views.clear()
+            views[key] = view
+        return view
+
+    def save_snapshot(self, path: Union[str, Path]) -> None:
+        with self._reading() as dataset:
+            store: ArrayStore = dataset.store
+            # the (never changed in place) arrays of the current content,
+            # contexts interned up front, as the terms are written first
+            graphs = [
+                (store.terms.intern(context), rows)
+                for context, rows in store.graph_rows()
+            ]
+            terms: List[Node] = store.terms.terms
+
+        def quads() -> Iterator[bytes]:
+            for context, rows in graphs:
+                g = np.full((len(rows), 1), context)
+                yield np.hstack([g, rows]).astype("<i8").tobytes()
+
+        write_snapshot(
+            path,
+            terms,
+            quads(),
+            self._registry_entries(),
+            sorted_quads=True,
+        )
+
+    def load_snapshot(self, path: Union[str, Path]) -> None:
+        """replaces the content of the store, and its lastmod registry,
+        with that of a file written by save_snapshot.
+        The (sorted) triples are used in place in the memory-mapped file,
+        so they are loaded on demand, and shared with other processes.
+
+        :param path: the snapshot file to read
+        :type path: Union[str, Path]
+        :rtype: None
+        """
+        snapshot = Snapshot(path)
+        store = ArrayStore(terms=TermDictionary(snapshot.terms))
+        quads: np.ndarray = np.frombuffer(
+            snapshot.buffer,
+            dtype="<i8",
+            count=snapshot.n_quads * 4,
+            offset=snapshot.quads_offset,
+        ).reshape(-1, 4)
+        # split into the runs of each graph
+        starts = np.flatnonzero(np.diff(quads[:, 0])) + 1
+        for run in np.split(quads, starts):
+            if len(run) == 0:
+                continue
+            rows = run[:, 1:]
+            if not snapshot.sorted_quads:
+                rows = np.unique(rows, axis=0)
+            store.load_graph(snapshot.terms[run[0, 0]], rows)
+        self._load(union_dataset(store), snapshot)
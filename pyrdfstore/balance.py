@@ -0,0 +1,110 @@
+import logging
+import threading
+from itertools import count
+from time import monotonic
+from typing import Dict, Iterable, List, Optional
+
+log = logging.getLogger(__name__)
+
+BALANCE_STRATEGIES = ("round_robin", "least_outstanding")
+DEFAULT_EJECT_SECONDS: float = 30.0
+
+
+class ReadBalancer:
+    """Spreads the read requests over a set of equivalent endpoints.
+
+    Endpoints that fail (connection errors or server errors) are ejected
+    for a while, during which they are only used if no healthy ones remain.
+    """
+
+    def __init__(
+        self,
+        uris: Iterable[str],
+        strategy: str = "round_robin",
+        eject_seconds: Optional[float] = None,
+    ):
+        """constructor
+
+        :param uris: the uris of the (sparql query) endpoints
+        :type uris: Iterable[str]
+        :param strategy: (optional) how to pick the next endpoint,
+          one of 'round_robin' or 'least_outstanding' (i.e. the one with
+          the fewest requests in flight), defaults to 'round_robin'
+        :type strategy: str
+        :param eject_seconds: (optional) how long a failing endpoint is
+          avoided - defaults to 30
+        :type eject_seconds: float
+        """
+        self._uris: List[str] = list(uris)
+        assert len(self._uris) > 0, "at least one endpoint is required"
+        assert strategy in BALANCE_STRATEGIES, (
+            f"Unsupported balance {strategy=}. "
+            f"Should be one of {BALANCE_STRATEGIES}"
+        )
+        self._strategy: str = strategy
+        self._eject_seconds: float = eject_seconds or DEFAULT_EJECT_SECONDS
+        self._lock = threading.Lock()
+        self._turn = count()
+        self._outstanding: Dict[str, int] = {uri: 0 for uri in self._uris}
+        self._ejected: Dict[str, float] = dict()  # uri -> until (monotonic)
+
+    @property
+    def uris(self) -> List[str]:
+        return list(self._uris)
+
+    @property
+    def primary(self) -> str:
+        """the first endpoint, expected to be the one written to"""
+        return self._uris[0]
+
+    def healthy(self) -> List[str]:
+        """the endpoints that are currently not ejected"""
+        now: float = monotonic()
+        with self._lock:
+            return [u for u in self._uris if self._ejected.get(u, 0) <= now]
+
+    def acquire(self, prefer: Optional[str] = None, exclude=()) -> str:
+        """picks the endpoint for the next request, and counts it as
+        outstanding until it is released
+
+        :param prefer: (optional) endpoint to use if it is not ejected
+        :type prefer: str
+        :param exclude: (optional) endpoints not to use (e.g. already tried)
+        :type exclude: Iterable[str]
+        :return: the uri of the endpoint to use
+        :rtype: str
+        """
+        now: float = monotonic()
+        with self._lock:
+            candidates = [u for u in self._uris if u not in exclude]
+            assert candidates, "all endpoints were excluded"
+            healthy = [u for u in candidates if self._ejected.get(u, 0) <= now]
+            if prefer in healthy:
+                uri = prefer
+            elif not healthy:  # then try the one that was ejected first
+                uri = min(candidates, key=lambda u: self._ejected[u])
+            elif self._strategy == "least_outstanding":
+                # rotate the start, so ties do not always favour the first
+                turn: int = next(self._turn) % len(healthy)
+                rotated = healthy[turn:] + healthy[:turn]
+                uri = min(rotated, key=lambda u: self._outstanding[u])
+            else:  # round_robin
+                uri = healthy[next(self._turn) % len(healthy)]
+            self._outstanding[uri] += 1
+            return uri
+
+    def release(self, uri: str) -> None:
+        """marks the request to the endpoint as finished"""
+        with self._lock:
+            self._outstanding[uri] -= 1
+
+    def eject(self, uri: str) -> None:
+        """avoids the (failing) endpoint for the configured time"""
+        log.warning(f"ejecting read endpoint {uri} for {self._eject_seconds}s")
+        with self._lock:
+            self._ejected[uri] = monotonic() + self._eject_seconds
+
+    def outstanding(self, uri: str) -> int:
+        """the number of requests in flight to the endpoint"""
+        with self._lock:
+            return self._outstanding[uri]
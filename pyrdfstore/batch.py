@@ -0,0 +1,223 @@
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from rdflib import Graph, URIRef
+from rdflib.plugins.serializers.nt import _nt_row
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BATCH_TRIPLES: int = 10000
+DEFAULT_BATCH_BYTES: int = 4 * 1024 * 1024
+DEFAULT_UPLOAD_WORKERS: int = 4
+
+
+class BatchInsertError(Exception):
+    """Raised when some batches of a multi-batch insert failed to upload.
+    Batches that were not yet sent at the time of failure are not attempted.
+    """
+
+    def __init__(
+        self,
+        named_graph: Optional[str],
+        landed: List[int],
+        failed: Dict[int, Exception],
+    ):
+        """constructor
+
+        :param named_graph: the named_graph that was being inserted into
+        :type named_graph: str
+        :param landed: the (0-based) indexes of the batches that were inserted
+        :type landed: List[int]
+        :param failed: the exception per index of the batches that failed
+        :type failed: Dict[int, Exception]
+        """
+        self.named_graph: Optional[str] = named_graph
+        self.landed: List[int] = sorted(landed)
+        self.failed: Dict[int, Exception] = dict(sorted(failed.items()))
+        super().__init__(
+            f"insert into {named_graph=} failed for batches "
+            f"{list(self.failed)} while batches {self.landed} landed"
+        )
+
+
+def batch_triples_from_env() -> int:
+    """returns the max number of triples per batch configured in the
+    environment via RDFSTORE_BATCH_TRIPLES or else the DEFAULT_BATCH_TRIPLES
+    """
+    return int(os.getenv("RDFSTORE_BATCH_TRIPLES", DEFAULT_BATCH_TRIPLES))
+
+
+def batch_bytes_from_env() -> int:
+    """returns the max number of bytes per batch configured in the
+    environment via RDFSTORE_BATCH_BYTES or else the DEFAULT_BATCH_BYTES
+    """
+    return int(os.getenv("RDFSTORE_BATCH_BYTES", DEFAULT_BATCH_BYTES))
+
+
+def upload_workers_from_env() -> int:
+    """returns the number of concurrent batch uploads configured in the
+    environment via RDFSTORE_UPLOAD_WORKERS or else the DEFAULT_UPLOAD_WORKERS
+    """
+    return int(os.getenv("RDFSTORE_UPLOAD_WORKERS", DEFAULT_UPLOAD_WORKERS))
+
+
+def triple_lines(graph: Graph) -> Iterator[str]:
+    """serializes the triples in the graph into individual n-triples lines
+    these are valid both in a sparql INSERT DATA and as n-triples body
+    Note: the graph should be skolemized, as blank nodes are not supported
+
+    :param graph: the graph to serialize
+    :type graph: Graph
+    :return: one line (without line-ending) per triple
+    :rtype: Iterator[str]
+    """
+    for triple in graph.triples((None, None, None)):
+        yield _nt_row(triple).rstrip("\n")
+
+
+def batched(
+    lines: Iterable[str],
+    max_triples: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+) -> Iterator[List[str]]:
+    """groups the statement lines into batches that respect both the
+    max number of triples and the max (utf-8 encoded) size in bytes.
+    A single line that exceeds the max_bytes ends up in a batch of its own.
+
+    :param lines: the statement lines to group
+    :type lines: Iterable[str]
+    :param max_triples: (optional) max number of lines per batch
+    - defaults to the RDFSTORE_BATCH_TRIPLES env variable or else 10000
+    :type max_triples: int
+    :param max_bytes: (optional) max size in bytes per batch
+    - defaults to the RDFSTORE_BATCH_BYTES env variable or else 4MiB
+    :type max_bytes: int
+    :return: the successive batches
+    :rtype: Iterator[List[str]]
+    """
+    max_triples = max_triples or batch_triples_from_env()
+    max_bytes = max_bytes or batch_bytes_from_env()
+    assert max_triples > 0 and max_bytes > 0, (
+        "batch limits should be positive " f"{max_triples=}, {max_bytes=}"
+    )
+    batch: List[str] = list()
+    size: int = 0
+    for line in lines:
+        line_size = len(line.encode("utf-8")) + 1  # account for newline
+        if batch and (
+            len(batch) >= max_triples or size + line_size > max_bytes
+        ):
+            yield batch
+            batch, size = list(), 0
+        batch.append(line)
+        size += line_size
+    if batch:
+        yield batch
+
+
+def split(batch: List[str]) -> List[List[str]]:
+    """splits a batch in two halves (to retry after a too large error)"""
+    assert len(batch) > 1, "a single statement batch can not be split"
+    half: int = len(batch) // 2
+    return [batch[:half], batch[half:]]
+
+
+def _data_statement(
+    verb: str, batch: Iterable[str], named_graph: Optional[str]
+) -> str:
+    body: str = "\n".join(batch)
+    if named_graph is None:
+        return f"{verb} DATA {{\n{body}\n}}"
+    # else
+    graph: str = URIRef(named_graph).n3()  # refuses invalid (unsafe) iris
+    return f"{verb} DATA {{ GRAPH {graph} {{\n{body}\n}} }}"
+
+
+def insert_data(batch: Iterable[str], named_graph: Optional[str]) -> str:
+    """builds the sparql INSERT DATA statement for the batch
+
+    :param batch: the statement lines to insert
+    :type batch: Iterable[str]
+    :param named_graph: the named_graph to insert into,
+      None to target the default graph
+    :type named_graph: str
+    :return: the sparql update statement
+    :rtype: str
+    """
+    return _data_statement("INSERT", batch, named_graph)
+
+
+def delete_data(batch: Iterable[str], named_graph: Optional[str]) -> str:
+    """builds the sparql DELETE DATA statement for the batch
+
+    :param batch: the statement lines to delete
+    :type batch: Iterable[str]
+    :param named_graph: the named_graph to delete from,
+      None to target the default graph
+    :type named_graph: str
+    :return: the sparql update statement
+    :rtype: str
+    """
+    return _data_statement("DELETE", batch, named_graph)
+
+
+def upload(
+    batches: Iterable[List[str]],
+    send: Callable[[List[str]], None],
+    named_graph: Optional[str] = None,
+    workers: Optional[int] = None,
+) -> int:
+    """sends the batches in parallel on a bounded pool of threads
+    At most twice the number of workers batches are kept in flight,
+    so the batches are only consumed (and built) as they can be sent.
+    After the first failure no further batches are submitted.
+
+    :param batches: the batches to send
+    :type batches: Iterable[List[str]]
+    :param send: the function that sends one batch
+    :type send: Callable[[List[str]], None]
+    :param named_graph: (optional) the targeted named_graph, for reporting
+    :type named_graph: str
+    :param workers: (optional) the max number of concurrent uploads
+    - defaults to the RDFSTORE_UPLOAD_WORKERS env variable or else 4
+    :type workers: int
+    :return: the number of batches sent
+    :rtype: int
+    :raises BatchInsertError: if any of the batches failed
+    """
+    workers = workers or upload_workers_from_env()
+    assert (
+        workers > 0
+    ), f"number of upload workers should be positive {workers=}"
+    landed: List[int] = list()
+    failed: Dict[int, Exception] = dict()
+
+    def collect(done) -> None:
+        for future in done:
+            index: int = pending.pop(future)
+            error = future.exception()
+            if error is None:
+                landed.append(index)
+            else:
+                log.error(f"batch #{index} into {named_graph=} failed {error}")
+                failed[index] = error
+
+    pending: dict = dict()
+    with ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="rdfstore-upload"
+    ) as executor:
+        for index, batch in enumerate(batches):
+            collect([future for future in pending if future.done()])
+            while len(pending) >= 2 * workers:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            if failed:
+                break
+            pending[executor.submit(send, batch)] = index
+        collect(wait(pending).done)
+
+    if failed:
+        first: Exception = failed[min(failed)]
+        raise BatchInsertError(named_graph, landed, failed) from first
+    return len(landed)
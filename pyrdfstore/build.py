@@ -1,24 +1,41 @@
 import logging
 
+from pyrdfstore.shards import ShardedMemoryRDFStore
+from pyrdfstore.sqlite import SQLITE_SCHEME, SQLiteRDFStore, sqlite_path
 from pyrdfstore.store import MemoryRDFStore, RDFStore, URIRDFStore
 
 log = logging.getLogger(__name__)
 
+ARRAYS_URI = "arrays:"  # pseudo uri selecting the ArrayRDFStore
+SHARDS_URI = "shards:"  # pseudo uri selecting the ShardedMemoryRDFStore
 
-def create_rdf_store(*store_info) -> RDFStore:
+
+def create_rdf_store(*store_info, **store_kwargs) -> RDFStore:
     """Creates an rdf_store based on the passed non-None arguments.
     0 of those arguments, will yield a MemoryRDFStore,
-    1-2 will be passed as read_uri resp write_uri to URIRDFStore
+    1-3 will be passed as read_uri, write_uri resp gsp_uri to URIRDFStore
     Anything beyond is unacceptable
+    The single pseudo uri "arrays:" yields an ArrayRDFStore instead
+    (requiring numpy), "shards:" a ShardedMemoryRDFStore, and a single
+    "sqlite:///path" uri a SQLiteRDFStore in that database file
+    Any keyword arguments are passed on to the constructor of the store
     """
     store_info = [
         el for el in store_info if el is not None
     ]  # remove possible None values
     assert (
-        len(store_info) <= 2
+        len(store_info) <= 3
     ), "Too many arguments to create store {store_info=}"
 
     if len(store_info) == 0:
-        return MemoryRDFStore()
+        return MemoryRDFStore(**store_kwargs)
+    if store_info == [ARRAYS_URI]:
+        from pyrdfstore.arrays import ArrayRDFStore
+
+        return ArrayRDFStore(**store_kwargs)
+    if store_info == [SHARDS_URI]:
+        return ShardedMemoryRDFStore(**store_kwargs)
+    if len(store_info) == 1 and str(store_info[0]).startswith(SQLITE_SCHEME):
+        return SQLiteRDFStore(sqlite_path(store_info[0]), **store_kwargs)
     # else
-    return URIRDFStore(*store_info)
+    return URIRDFStore(*store_info, **store_kwargs)
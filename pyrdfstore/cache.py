@@ -0,0 +1,407 @@
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from datetime import datetime
+from hashlib import sha256
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple, Union
+
+from rdflib import Graph
+from rdflib.query import Result
+
+from .results import parse_json
+from .store import (
+    Binding,
+    Bindings,
+    RDFStore,
+    RDFStoreDecorator,
+    init_bindings,
+    narrowed_graphs,
+)
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CACHE_BYTES: int = 64 * 1024 * 1024
+UNNAMED = "__unnamed__"  # disk folder for selects without named_graph
+
+CacheKey = Tuple[str, Optional[str]]
+
+
+def cache_bytes_from_env() -> int:
+    """returns the max memory size of the cached results configured in the
+    environment via RDFSTORE_CACHE_BYTES or else the DEFAULT_CACHE_BYTES
+    """
+    return int(os.getenv("RDFSTORE_CACHE_BYTES", DEFAULT_CACHE_BYTES))
+
+
+def result_size(result: Result) -> int:
+    """estimates the memory held by the bindings of a select result
+
+    :param result: the result to measure
+    :type result: Result
+    :return: the approximate size in bytes
+    :rtype: int
+    """
+    return sys.getsizeof(result.bindings) + sum(
+        sys.getsizeof(row) + sum(sys.getsizeof(t) for t in row.values())
+        for row in result.bindings
+    )
+
+
+def _copy(result: Result) -> Result:
+    # fresh Result (sharing the immutable bindings) for every caller
+    copy = Result("SELECT")
+    copy.vars = result.vars
+    copy.bindings = result.bindings
+    return copy
+
+
+def _keyed(
+    sparql: str,
+    binding: Optional[Binding],
+    named_graphs: Optional[List[str]] = None,
+) -> str:
+    # the query text extended with the (sorted) named_graphs and binding
+    if named_graphs:
+        sparql = f"{sparql}\n# FROM {' '.join(sorted(named_graphs))}"
+    if not binding:
+        return sparql
+    bound = sorted(
+        f"{var.n3()}={term.n3()}"
+        for var, term in init_bindings(binding).items()
+    )
+    return f"{sparql}\n# {' '.join(bound)}"
+
+
+def _hashed(text: str) -> str:
+    return sha256(text.encode("utf-8")).hexdigest()
+
+
+class _CacheEntry:
+    def __init__(self, result: Result, lastmod: Optional[datetime]):
+        self.result: Result = result
+        self.lastmod: Optional[datetime] = lastmod
+        self.size: int = result_size(result)
+
+
+class CachingRDFStore(RDFStoreDecorator):
+    """Decorator memoizing the select results of the wrapped store
+    in a bounded LRU, optionally backed by an on-disk tier.
+
+    Cached results for a named_graph are invalidated by any insert,
+    drop_graph, replace_graph, sync_graph, forget_graph (or changing
+    replace_if_changed) passing through this decorator
+    (as are all results of selects without named_graph, or on a set of
+    named_graphs).
+    Writes made elsewhere are only noticed when check_lastmod is set,
+    hence the results kept on disk only survive a restart in that case
+    (and then only those of selects into a named_graph).
+    """
+
+    def __init__(
+        self,
+        store: RDFStore,
+        max_bytes: Optional[int] = None,
+        check_lastmod: bool = False,
+        cache_dir: Optional[Union[str, Path]] = None,
+    ):
+        """constructor
+
+        :param store: the actual store to wrap and decorate
+        :type store: RDFStore
+        :param max_bytes: (optional) max (estimated) memory size of the
+          cached results,
+        - defaults to the RDFSTORE_CACHE_BYTES env variable or else 64MiB
+        :type max_bytes: int
+        :param check_lastmod: (optional) verify the lastmod_ts of the
+          named_graph before serving a cached result, so writes made
+          outside this decorator are noticed - defaults to False
+        :type check_lastmod: bool
+        :param cache_dir: (optional) folder to keep the results in as well,
+          so they survive restarts when check_lastmod is set
+          (else the folder is emptied on start) - defaults to None
+        :type cache_dir: str
+        """
+        super().__init__(store)
+        self._max_bytes: int = max_bytes or cache_bytes_from_env()
+        assert (
+            self._max_bytes > 0
+        ), f"cache size should be positive {max_bytes=}"
+        self._check_lastmod: bool = check_lastmod
+        self._dir: Optional[Path] = Path(cache_dir) if cache_dir else None
+        if self._dir is not None:
+            # results kept before the restart can only be trusted when
+            # their lastmod is verified, i.e. not those without named_graph
+            if not check_lastmod:
+                shutil.rmtree(self._dir, ignore_errors=True)
+            shutil.rmtree(self._dir / UNNAMED, ignore_errors=True)
+            self._dir.mkdir(parents=True, exist_ok=True)
+        self._entries: "OrderedDict[CacheKey, _CacheEntry]" = OrderedDict()
+        self._size: int = 0
+        self._lock = threading.Lock()
+        # counts the invalidations, so a select that overlapped one
+        # does not keep its (possibly outdated) result
+        self._generation: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def size_bytes(self) -> int:
+        """the (estimated) memory size of the cached results"""
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def select(
+        self,
+        sparql: str,
+        named_graph: Optional[str] = None,
+        *,
+        bindings: Optional[Bindings] = None,
+        named_graphs: Optional[Iterable[str]] = None,
+    ) -> Union[Result, List[Result]]:
+        # selects on named_graphs are kept as if without named_graph,
+        # so any write invalidates them
+        named_graphs = narrowed_graphs(named_graph, named_graphs)
+        if bindings is not None and not isinstance(bindings, Mapping):
+            return self._select_many(
+                sparql, named_graph, list(bindings), named_graphs
+            )
+        # else
+        key: CacheKey = (_keyed(sparql, bindings, named_graphs), named_graph)
+        lastmod: Optional[datetime] = self._lastmod(named_graph)
+        entry = self._lookup(key, lastmod)
+        self._count(int(entry is not None), int(entry is None))
+        if entry is not None:
+            return _copy(entry.result)
+        # else
+        generation: int = self._generation  # see _remember
+        result: Result = self._core.select(
+            sparql, named_graph, bindings=bindings, named_graphs=named_graphs
+        )
+        return self._keep(key, result, lastmod, generation)
+
+    def _select_many(
+        self,
+        sparql: str,
+        named_graph: Optional[str],
+        bindings: List[Binding],
+        named_graphs: Optional[List[str]],
+    ) -> List[Result]:
+        """serves each binding from the cache where possible,
+        selecting the missing ones in one go
+        """
+        lastmod: Optional[datetime] = self._lastmod(named_graph)
+        keys = [
+            (_keyed(sparql, b, named_graphs), named_graph) for b in bindings
+        ]
+        results: List[Optional[Result]] = list()
+        for key in keys:
+            entry = self._lookup(key, lastmod)
+            results.append(_copy(entry.result) if entry is not None else None)
+        missing = [i for i, result in enumerate(results) if result is None]
+        self._count(len(keys) - len(missing), len(missing))
+        if missing:
+            generation: int = self._generation  # see _remember
+            selected: List[Result] = self._core.select(
+                sparql,
+                named_graph,
+                bindings=[bindings[i] for i in missing],
+                named_graphs=named_graphs,
+            )
+            for i, result in zip(missing, selected):
+                results[i] = self._keep(keys[i], result, lastmod, generation)
+        return results
+
+    def _lastmod(self, named_graph: Optional[str]) -> Optional[datetime]:
+        if self._check_lastmod and named_graph is not None:
+            # looked up before the select, so racing writes only cause
+            # an unneeded refresh later on, never a stale hit
+            return self._core.lastmod_ts(named_graph)
+        return None
+
+    def _count(self, hits: int, misses: int) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def _keep(
+        self,
+        key: CacheKey,
+        result: Result,
+        lastmod: Optional[datetime],
+        generation: int,
+    ) -> Result:
+        if result.type != "SELECT":
+            return result  # only select results are cached
+        # else
+        entry = _CacheEntry(_copy(result), lastmod)
+        if self._remember(key, entry, generation):
+            self._save(key, entry, generation)
+        return _copy(entry.result)
+
+    def _lookup(
+        self, key: CacheKey, lastmod: Optional[datetime]
+    ) -> Optional[_CacheEntry]:
+        with self._lock:
+            generation: int = self._generation
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            entry = self._load(key)
+            if entry is not None:
+                self._remember(key, entry, generation)
+        if entry is None or entry.lastmod == lastmod:
+            return entry
+        # else the named_graph was changed elsewhere
+        log.debug(f"cached result outdated by {lastmod=} for {key[1]=}")
+        self.invalidate(key[1])
+        return None
+
+    def _remember(
+        self, key: CacheKey, entry: _CacheEntry, generation: int
+    ) -> bool:
+        """keeps the entry in memory, unless an invalidation happened
+        since the generation it was selected (or loaded) in
+
+        :return: False if the entry is outdated by such invalidation
+        :rtype: bool
+        """
+        with self._lock:
+            if self._generation != generation:
+                log.debug(f"not keeping result outdated while selected {key}")
+                return False
+            # else
+            if entry.size > self._max_bytes:
+                log.debug(f"result too large to keep in memory {entry.size=}")
+                return True
+            # else
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous.size
+            self._entries[key] = entry
+            self._size += entry.size
+            while self._size > self._max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+        return True
+
+    def _path(self, key: CacheKey) -> Path:
+        sparql, named_graph = key
+        folder = _hashed(named_graph) if named_graph is not None else UNNAMED
+        return self._dir / folder / f"{_hashed(sparql)}.json"
+
+    def _save(
+        self, key: CacheKey, entry: _CacheEntry, generation: int
+    ) -> None:
+        if self._dir is None:
+            return
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        doc = dict(
+            lastmod=entry.lastmod.isoformat() if entry.lastmod else None,
+            result=json.loads(entry.result.serialize(format="json")),
+        )
+        # write aside and move into place, so readers never see half a file
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(doc), encoding="utf-8")
+        os.replace(tmp, path)
+        if self._generation != generation:
+            # invalidated while writing, the removal may have been missed
+            path.unlink(missing_ok=True)
+
+    def _load(self, key: CacheKey) -> Optional[_CacheEntry]:
+        if self._dir is None:
+            return None
+        path = self._path(key)
+        try:
+            doc = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            log.warning(f"ignoring unreadable cache file {path} :: {e}")
+            return None
+        lastmod = doc["lastmod"]
+        return _CacheEntry(
+            parse_json(json.dumps(doc["result"]).encode("utf-8")),
+            datetime.fromisoformat(lastmod) if lastmod else None,
+        )
+
+    def invalidate(self, named_graph: Optional[str] = None) -> None:
+        """forgets the cached results of selects into the named_graph,
+        and those of all selects without named_graph
+
+        :param named_graph: the named_graph that changed,
+          None if only the selects without named_graph are affected
+        :type named_graph: str
+        """
+        with self._lock:
+            self._generation += 1  # refuses the results of overlapping selects
+        if self._dir is not None:
+            shutil.rmtree(self._dir / UNNAMED, ignore_errors=True)
+        if self._dir is not None and named_graph is not None:
+            shutil.rmtree(self._dir / _hashed(named_graph), ignore_errors=True)
+        affected = {None, named_graph}
+        with self._lock:
+            # and again, as lookups may have loaded the removed files
+            self._generation += 1
+            for key in [k for k in self._entries if k[1] in affected]:
+                self._size -= self._entries.pop(key).size
+
+    def clear(self) -> None:
+        """forgets all cached results (in memory and on disk)"""
+        with self._lock:
+            self._generation += 1  # see invalidate
+        if self._dir is not None:
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._size = 0
+
+    def insert(self, graph: Graph, named_graph: Optional[str] = None):
+        try:
+            return self._core.insert(graph, named_graph)
+        finally:
+            self.invalidate(named_graph)
+
+    def drop_graph(self, named_graph: str) -> None:
+        try:
+            return self._core.drop_graph(named_graph)
+        finally:
+            self.invalidate(named_graph)
+
+    def replace_graph(self, graph: Graph, named_graph: str) -> None:
+        try:
+            return self._core.replace_graph(graph, named_graph)
+        finally:
+            self.invalidate(named_graph)
+
+    def sync_graph(self, graph: Graph, named_graph: str) -> bool:
+        try:
+            return self._core.sync_graph(graph, named_graph)
+        finally:
+            self.invalidate(named_graph)
+
+    def replace_if_changed(self, graph: Graph, named_graph: str) -> bool:
+        changed: bool = True
+        try:
+            changed = self._core.replace_if_changed(graph, named_graph)
+            return changed
+        finally:
+            if changed:
+                self.invalidate(named_graph)
+
+    def forget_graph(self, named_graph: str) -> None:
+        try:
+            return self._core.forget_graph(named_graph)
+        finally:
+            self.invalidate(named_graph)
@@ -0,0 +1,132 @@
+import logging
+from typing import Iterable, Optional
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+
+from rdflib import Graph
+
+from .pool import HTTPConnectionPool
+
+log = logging.getLogger(__name__)
+
+# supported wire formats mapped to their mime-type
+# Note: the uploaded bodies are always n-triples lines,
+# which are equally valid turtle for servers that only accept the latter
+GSP_FORMATS: dict = {
+    "nt": "application/n-triples",
+    "turtle": "text/turtle",
+}
+
+
+class GraphStoreClient:
+    """Client for the SPARQL 1.1 Graph Store HTTP Protocol
+    passing its requests through a shared HTTPConnectionPool
+    """
+
+    def __init__(
+        self, gsp_uri: str, pool: HTTPConnectionPool, format: str = "nt"
+    ):
+        """constructor
+
+        :param gsp_uri: the uri of the graph store protocol service
+        :type gsp_uri: str
+        :param pool: the pool of connections to use
+        :type pool: HTTPConnectionPool
+        :param format: (optional) the wire format, one of GSP_FORMATS
+        - defaults to 'nt'
+        :type format: str
+        """
+        assert format in GSP_FORMATS, (
+            f"Unsupported gsp {format=}. "
+            f"Should be one of {list(GSP_FORMATS)}"
+        )
+        self._uri: str = gsp_uri
+        self._pool: HTTPConnectionPool = pool
+        self._format: str = format
+
+    @property
+    def mime_type(self) -> str:
+        return GSP_FORMATS[self._format]
+
+    def graph_url(self, named_graph: Optional[str]) -> str:
+        """builds the url addressing the named_graph in the graph store
+
+        :param named_graph: the named_graph to address,
+          None to address the default graph
+        :type named_graph: str
+        :return: the url
+        :rtype: str
+        """
+        query = (
+            urlencode(dict(graph=named_graph))
+            if named_graph is not None
+            else "default"
+        )
+        sep = "&" if "?" in self._uri else "?"
+        return f"{self._uri}{sep}{query}"
+
+    def _upload(
+        self, method: str, lines: Iterable[str], named_graph: Optional[str]
+    ) -> None:
+        body: bytes = "\n".join(lines).encode("utf-8")
+        headers = {"Content-Type": f"{self.mime_type}; charset=utf-8"}
+        url = self.graph_url(named_graph)
+        self._pool.request(method, url, body, headers, compress=True)
+
+    def post(self, lines: Iterable[str], named_graph: Optional[str]) -> None:
+        """adds the triples to the named_graph
+
+        :param lines: the n-triples lines to add
+        :type lines: Iterable[str]
+        :param named_graph: the named_graph to add to
+        :type named_graph: str
+        """
+        self._upload("POST", lines, named_graph)
+
+    def put(self, lines: Iterable[str], named_graph: Optional[str]) -> None:
+        """replaces the content of the named_graph with the triples
+
+        :param lines: the n-triples lines forming the new content
+        :type lines: Iterable[str]
+        :param named_graph: the named_graph to replace
+        :type named_graph: str
+        """
+        self._upload("PUT", lines, named_graph)
+
+    def delete(self, named_graph: Optional[str]) -> None:
+        """deletes the named_graph, unknown graphs are silently ignored
+
+        :param named_graph: the named_graph to delete
+        :type named_graph: str
+        """
+        try:
+            self._pool.request("DELETE", self.graph_url(named_graph))
+        except HTTPError as e:
+            if e.code != 404:
+                raise
+            log.debug(f"ignoring delete of unknown {named_graph=}")
+
+    def get(self, named_graph: Optional[str]) -> Graph:
+        """retrieves the complete content of the named_graph
+
+        :param named_graph: the named_graph to get
+        :type named_graph: str
+        :return: the content, empty if the graph is unknown
+        :rtype: Graph
+        """
+        graph = Graph()
+        try:
+            resp = self._pool.request(
+                "GET",
+                self.graph_url(named_graph),
+                headers={"Accept": self.mime_type},
+            )
+        except HTTPError as e:
+            if e.code != 404:
+                raise
+            return graph  # unknown graphs are just empty
+        if resp.data:
+            graph.parse(
+                data=resp.data, format=resp.content_type or self.mime_type
+            )
+        return graph
@@ -0,0 +1,391 @@
+import gzip
+import logging
+import os
+import threading
+import zlib
+from email.message import Message
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.error import HTTPError
+from urllib.parse import urlencode, urlsplit
+
+from rdflib.plugins.stores.sparqlstore import SPARQLStore, SPARQLUpdateStore
+from rdflib.query import Result
+from rdflib.term import BNode
+
+from .balance import ReadBalancer
+
+log = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE: int = 8
+DEFAULT_TIMEOUT: float = 300.0
+# supported content-encodings of request and response bodies
+COMPRESSIONS = ("gzip", "deflate")
+COMPRESSION_LEVEL: int = 6  # favour speed, text still shrinks 10x or more
+COMPRESS_MIN_BYTES: int = 1024  # smaller bodies are not worth it
+# errors that indicate a kept-alive connection was closed by the server
+# while idling in the pool, and so (once) warrant a retry on a fresh one
+STALE_CONNECTION_ERRORS = (
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    HTTPException,
+)
+
+
+def pool_size_from_env() -> int:
+    """returns the pool size configured in the environment
+    via RDFSTORE_POOL_SIZE or else the DEFAULT_POOL_SIZE
+    """
+    return int(os.getenv("RDFSTORE_POOL_SIZE", DEFAULT_POOL_SIZE))
+
+
+def compression_from_env() -> Optional[str]:
+    """returns the content-encoding to apply as configured in the environment
+    via RDFSTORE_COMPRESSION (gzip or deflate) or else None
+    """
+    return os.getenv("RDFSTORE_COMPRESSION") or None
+
+
+def compress_body(data: bytes, encoding: str) -> bytes:
+    """compresses the data according to the content-encoding"""
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=COMPRESSION_LEVEL)
+    # else deflate, i.e. the zlib format
+    return zlib.compress(data, COMPRESSION_LEVEL)
+
+
+def decompress_body(data: bytes, encoding: Optional[str]) -> bytes:
+    """decompresses the data according to the content-encoding"""
+    encoding = (encoding or "").strip().lower()
+    if encoding in ("gzip", "x-gzip"):
+        return gzip.decompress(data)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(data)
+        except zlib.error:  # some servers send raw deflate data
+            return zlib.decompress(data, -zlib.MAX_WBITS)
+    # else identity
+    return data
+
+
+class PooledResponse:
+    """Fully read response from a request passed through the pool"""
+
+    def __init__(self, status: int, reason: str, headers: Message, data):
+        self.status: int = status
+        self.reason: str = reason
+        self.headers: Message = headers
+        self.data: bytes = data
+
+    @property
+    def content_type(self) -> str:
+        """the mime-type of the response (without the charset parameters)"""
+        return (self.headers.get("Content-Type") or "").split(";")[0].strip()
+
+
+class HTTPConnectionPool:
+    """Thread-safe pool of keep-alive http(s) connections.
+
+    Connections are kept per (scheme, host, port) so a single pool can serve
+    both the read and write endpoints of a store. The total number of
+    connections in use at any time is bounded by the maxsize, callers beyond
+    that wait for a connection to be released.
+    """
+
+    def __init__(
+        self,
+        maxsize: Optional[int] = None,
+        timeout: Optional[float] = None,
+        compression: Optional[str] = None,
+    ):
+        """constructor
+
+        :param maxsize: (optional) max number of simultaneous connections,
+        - defaults to the RDFSTORE_POOL_SIZE env variable or else 8
+        :type maxsize: int
+        :param timeout: (optional) socket timeout in seconds
+        - defaults to 300
+        :type timeout: float
+        :param compression: (optional) content-encoding ('gzip' or
+          'deflate') to apply on request bodies sent with compress=True,
+          and to accept on responses,
+        - defaults to the RDFSTORE_COMPRESSION env variable or else None
+        :type compression: str
+        """
+        self._maxsize: int = maxsize or pool_size_from_env()
+        assert self._maxsize > 0, f"pool size must be positive {maxsize=}"
+        self._timeout: float = timeout or DEFAULT_TIMEOUT
+        self._compression: Optional[str] = (
+            compression or compression_from_env()
+        )
+        assert self._compression in (None, *COMPRESSIONS), (
+            f"Unsupported {compression=}. " f"Should be one of {COMPRESSIONS}"
+        )
+        self._slots = threading.BoundedSemaphore(self._maxsize)
+        self._lock = threading.Lock()
+        self._idle: Dict[Tuple[str, str, int], List[HTTPConnection]] = dict()
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    @property
+    def compression(self) -> Optional[str]:
+        return self._compression
+
+    @property
+    def num_idle(self) -> int:
+        """the number of opened connections available for reuse"""
+        with self._lock:
+            return sum(len(conns) for conns in self._idle.values())
+
+    def _new_connection(self, scheme: str, host: str, port: int):
+        log.debug(f"opening new connection to {scheme}://{host}:{port}")
+        conn_cls = HTTPSConnection if scheme == "https" else HTTPConnection
+        return conn_cls(host, port, timeout=self._timeout)
+
+    def _checkout(self, origin: tuple) -> Tuple[HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(origin)
+            if idle:
+                return idle.pop(), True
+        return self._new_connection(*origin), False
+
+    def _checkin(self, origin: tuple, conn: HTTPConnection) -> None:
+        with self._lock:
+            self._idle.setdefault(origin, list()).append(conn)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        compress: bool = False,
+    ) -> PooledResponse:
+        """executes the http request on a pooled connection
+
+        :param method: the http method to use
+        :type method: str
+        :param url: the full url to send the request to
+        :type url: str
+        :param body: (optional) the request body
+        :type body: bytes
+        :param headers: (optional) the request headers
+        :type headers: Dict[str, str]
+        :param compress: (optional) apply the compression of the pool
+          (if any) to the body, defaults to False
+        :type compress: bool
+        :return: the fully read (and decompressed) response
+        :rtype: PooledResponse
+        :raises HTTPError: for any response with a status >= 400
+        """
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        origin = (scheme, parts.hostname, port)
+        target = parts.path or "/"
+        if parts.query:
+            target = f"{target}?{parts.query}"
+        headers = dict(headers or {})
+        if self._compression is not None:
+            headers.setdefault("Accept-Encoding", self._compression)
+            if compress and body and len(body) >= COMPRESS_MIN_BYTES:
+                body = compress_body(body, self._compression)
+                headers["Content-Encoding"] = self._compression
+
+        with self._slots:
+            conn, reused = self._checkout(origin)
+            try:
+                resp = self._send(conn, method, target, body, headers)
+            except STALE_CONNECTION_ERRORS as e:
+                conn.close()
+                if not reused:
+                    raise
+                # else the server dropped our idle connection, retry once
+                log.debug(f"retry on fresh connection after {e!r}")
+                conn = self._new_connection(*origin)
+                try:
+                    resp = self._send(conn, method, target, body, headers)
+                except Exception:
+                    conn.close()
+                    raise
+            except Exception:
+                conn.close()
+                raise
+
+            if resp.will_close:
+                conn.close()
+            else:
+                self._checkin(origin, conn)
+
+        data = decompress_body(resp.data, resp.headers.get("Content-Encoding"))
+        response = PooledResponse(resp.status, resp.reason, resp.headers, data)
+        if response.status >= 400:
+            raise HTTPError(
+                url,
+                response.status,
+                response.reason,
+                response.headers,
+                BytesIO(response.data),
+            )
+        return response
+
+    @staticmethod
+    def _send(conn, method, target, body, headers):
+        conn.request(method, target, body=body, headers=headers)
+        resp = conn.getresponse()
+        resp.data = resp.read()  # always read completely to allow reuse
+        return resp
+
+    def close(self) -> None:
+        """closes all idle connections.
+        The pool remains usable, new connections are opened on demand.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, dict()
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class PooledConnectorMixin:
+    """Replaces the per-request urlopen of the rdflib SPARQLConnector
+    with requests passed through a shared HTTPConnectionPool.
+
+    To be mixed in before SPARQLStore or SPARQLUpdateStore.
+    With a balancer, the queries are spread over its endpoints (rather
+    than sent to the query_endpoint), failing over to another endpoint on
+    connection or server errors.
+    """
+
+    def __init__(
+        self,
+        *args,
+        pool: HTTPConnectionPool,
+        balancer: Optional[ReadBalancer] = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self._pool: HTTPConnectionPool = pool
+        self._balancer: Optional[ReadBalancer] = balancer
+        # endpoint of the balancer to prefer for the next queries
+        self.prefer_endpoint: Optional[str] = None
+
+    def _query(
+        self,
+        query: str,
+        default_graph: Optional[str] = None,
+        named_graph: Optional[str] = None,
+    ) -> Result:
+        self._queries += 1
+        resp = self.query_response(query, default_graph)
+        return Result.parse(BytesIO(resp.data), content_type=resp.content_type)
+
+    def query_response(
+        self,
+        query: str,
+        default_graph: Union[str, List[str], None] = None,
+        accept: Optional[str] = None,
+    ) -> PooledResponse:
+        """executes the query and returns the (unparsed) response
+
+        :param query: the sparql query to execute
+        :type query: str
+        :param default_graph: (optional) uri of the graph to narrow to,
+          or a list of those to narrow to their union
+        :type default_graph: Union[str, List[str]]
+        :param accept: (optional) the accepted mime-type(s) of the results,
+          defaults to those supported by the rdflib result parsers
+        :type accept: str
+        :return: the fully read response
+        :rtype: PooledResponse
+        """
+        if self._balancer is None:
+            assert self.query_endpoint, "Query endpoint not set!"
+            return self._query_at(
+                self.query_endpoint, query, default_graph, accept
+            )
+        # else
+        tried: List[str] = list()
+        while True:
+            endpoint = self._balancer.acquire(self.prefer_endpoint, tried)
+            try:
+                return self._query_at(endpoint, query, default_graph, accept)
+            except HTTPError as e:
+                if e.code < 500:
+                    raise  # the query itself is at fault
+                self._failed(endpoint, tried, e)
+            except (OSError, HTTPException) as e:
+                self._failed(endpoint, tried, e)
+            finally:
+                self._balancer.release(endpoint)
+
+    def _failed(self, endpoint: str, tried: List[str], error: Exception):
+        log.warning(f"query on {endpoint} failed :: {error!r}")
+        self._balancer.eject(endpoint)
+        tried.append(endpoint)
+        if len(tried) >= len(self._balancer.uris):
+            raise error  # none left to try
+
+    def _query_at(
+        self,
+        endpoint: str,
+        query: str,
+        default_graph: Union[str, List[str], None],
+        accept: Optional[str],
+    ) -> PooledResponse:
+        params = dict(self.kwargs.get("params", {}))
+        # avoid useless (BNode) default graph URIs added by Graph().query()
+        if default_graph is not None and type(default_graph) is not BNode:
+            # (a list of graphs is sent as repeated params)
+            params["default-graph-uri"] = default_graph
+        headers = dict(self.kwargs.get("headers", {}))
+        headers["Accept"] = accept or self.response_mime_types()
+
+        url, body = endpoint, None
+        if self.method == "GET":
+            params["query"] = query
+            url = f"{url}?{urlencode(params, doseq=True)}"
+        elif self.method == "POST":
+            headers["Content-Type"] = "application/sparql-query"
+            url = f"{url}?{urlencode(params, doseq=True)}" if params else url
+            body = query.encode("utf-8")
+        else:  # POST_FORM
+            params["query"] = query
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            body = urlencode(params, doseq=True).encode("utf-8")
+
+        return self._pool.request(
+            "GET" if body is None else "POST", url, body, headers
+        )
+
+    def _update(self, update: str) -> None:
+        assert self.update_endpoint, "Update endpoint not set!"
+        self._updates += 1
+
+        params = dict(self.kwargs.get("params", {}))
+        headers = dict(self.kwargs.get("headers", {}))
+        headers["Accept"] = self.response_mime_types()
+        headers["Content-Type"] = "application/sparql-update; charset=UTF-8"
+        url = self.update_endpoint
+        if params:
+            url = f"{url}?{urlencode(params)}"
+        body = update.encode("utf-8")
+        self._pool.request("POST", url, body, headers, compress=True)
+
+
+class PooledSPARQLStore(PooledConnectorMixin, SPARQLStore):
+    """read-only SPARQLStore passing its requests through a pool"""
+
+
+class PooledSPARQLUpdateStore(PooledConnectorMixin, SPARQLUpdateStore):
+    """read-write SPARQLUpdateStore passing its requests through a pool"""
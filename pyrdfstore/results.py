@@ -0,0 +1,175 @@
+import csv
+import json
+import logging
+from io import BytesIO, StringIO
+from typing import List, Optional, Tuple, Union
+
+from rdflib import BNode, Literal, URIRef, Variable
+from rdflib.query import Result
+from rdflib.term import Node
+from rdflib.util import from_n3
+
+log = logging.getLogger(__name__)
+
+# supported sparql result formats mapped to their mime-type
+RESULT_FORMATS: dict = {
+    "tsv": "text/tab-separated-values",
+    "csv": "text/csv",
+    "json": "application/sparql-results+json",
+    "xml": "application/sparql-results+xml",
+}
+
+RawRows = List[Tuple[Optional[str], ...]]
+
+
+def _tsv_term(cell: str) -> Optional[Node]:
+    if not cell:
+        return None  # unbound
+    if cell[0] == "<" and cell[-1] == ">":  # fast path for the common uri
+        return URIRef(cell[1:-1])
+    # else literals, blank nodes, and the bare numbers and booleans
+    return from_n3(cell)
+
+
+def _csv_term(cell: str) -> Optional[Node]:
+    # csv carries no type info, so this follows the rdflib csv parser
+    if not cell:
+        return None  # unbound (or empty literal, csv can not tell)
+    if cell.startswith("_:"):
+        return BNode(cell[2:])
+    if cell.startswith("http://") or cell.startswith("https://"):
+        return URIRef(cell)
+    return Literal(cell)
+
+
+def _json_term(binding: dict) -> Node:
+    kind, value = binding["type"], binding["value"]
+    if kind == "uri":
+        return URIRef(value)
+    if kind == "bnode":
+        return BNode(value)
+    datatype = binding.get("datatype")
+    return Literal(
+        value,
+        lang=binding.get("xml:lang"),
+        datatype=URIRef(datatype) if datatype else None,
+    )
+
+
+def _select_result(vars: List[str], rows: list) -> Result:
+    result = Result("SELECT")
+    result.vars = [Variable(var) for var in vars]
+    result.bindings = [
+        {var: term for var, term in zip(result.vars, row) if term is not None}
+        for row in rows
+    ]
+    return result
+
+
+def parse_tsv(data: bytes, raw: bool = False) -> Union[Result, RawRows]:
+    """parses sparql tsv results by plain line and tab splitting
+
+    :param data: the tsv response body
+    :type data: bytes
+    :param raw: (optional) return the cells as undecoded strings
+      (i.e. in their turtle encoding), defaults to False
+    :type raw: bool
+    :return: the parsed result, or the list of raw row tuples
+    :rtype: Union[Result, RawRows]
+    """
+    # only "\n" ends a line, literals may hold other line breaks as is
+    lines = [line.rstrip("\r") for line in data.decode("utf-8").split("\n")]
+    if lines[-1] == "":
+        lines.pop()  # after the final newline
+    if not lines:
+        return list() if raw else _select_result(list(), list())
+    vars = [var.lstrip("?$") for var in lines[0].split("\t")]
+    cells = (line.split("\t") for line in lines[1:])
+    if raw:
+        return [tuple(cell or None for cell in row) for row in cells]
+    # else
+    rows = [tuple(_tsv_term(cell) for cell in row) for row in cells]
+    return _select_result(vars, rows)
+
+
+def parse_csv(data: bytes, raw: bool = False) -> Union[Result, RawRows]:
+    """parses sparql csv results with the standard library csv module
+    Note: csv results do not distinguish uris from literals
+    nor hold datatypes or languages
+
+    :param data: the csv response body
+    :type data: bytes
+    :param raw: (optional) return the cells as plain strings,
+      defaults to False
+    :type raw: bool
+    :return: the parsed result, or the list of raw row tuples
+    :rtype: Union[Result, RawRows]
+    """
+    reader = csv.reader(StringIO(data.decode("utf-8"), newline=""))
+    vars = next(reader, list())
+    if raw:
+        return [tuple(cell or None for cell in row) for row in reader]
+    # else
+    rows = [tuple(_csv_term(cell) for cell in row) for row in reader]
+    return _select_result(vars, rows)
+
+
+def parse_json(data: bytes, raw: bool = False) -> Union[Result, RawRows]:
+    """parses sparql json results with the standard library json module
+
+    :param data: the json response body
+    :type data: bytes
+    :param raw: (optional) return the plain values as strings,
+      defaults to False
+    :type raw: bool
+    :return: the parsed result, or the list of raw row tuples
+    :rtype: Union[Result, RawRows]
+    """
+    doc = json.loads(data)
+    vars: List[str] = doc["head"].get("vars", list())
+    bindings: List[dict] = doc["results"]["bindings"]
+    if raw:
+        return [
+            tuple(b[var]["value"] if var in b else None for var in vars)
+            for b in bindings
+        ]
+    # else
+    rows = [
+        tuple(_json_term(b[var]) if var in b else None for var in vars)
+        for b in bindings
+    ]
+    return _select_result(vars, rows)
+
+
+def parse_results(
+    data: bytes, content_type: str, raw: bool = False
+) -> Union[Result, RawRows]:
+    """parses the sparql select results according to their content_type
+
+    :param data: the response body
+    :type data: bytes
+    :param content_type: the mime-type of the response
+    :type content_type: str
+    :param raw: (optional) return undecoded rows, defaults to False
+    :type raw: bool
+    :return: the parsed result, or the list of raw row tuples
+    :rtype: Union[Result, RawRows]
+    """
+    parsers: dict = {
+        RESULT_FORMATS["tsv"]: parse_tsv,
+        RESULT_FORMATS["csv"]: parse_csv,
+        RESULT_FORMATS["json"]: parse_json,
+    }
+    parser = parsers.get(content_type)
+    if parser is not None:
+        return parser(data, raw)
+    # else fallback to the rdflib parsers (e.g. for xml)
+    log.debug(f"no fast path to parse {content_type=}")
+    result: Result = Result.parse(BytesIO(data), content_type=content_type)
+    if not raw:
+        return result
+    # else
+    return [
+        tuple(str(term) if term is not None else None for term in row)
+        for row in result
+    ]
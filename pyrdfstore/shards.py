@@ -0,0 +1,519 @@
+"""Sharded in memory store.
+
+The named_graphs are hashed over a number of worker processes, each
+holding a MemoryRDFStore of its own, so the sparql evaluation of
+different shards runs on different cores (rather than on one, held by
+the GIL). Selects on a named_graph go to the shard owning it, as do
+selects on a set of named_graphs all owned by one shard. Other selects
+over the union of (a set of) graphs are either scattered to the shards
+(when all solutions come from one graph, i.e. GRAPH ?g { ... } queries)
+or gather the triples matching the patterns of the query from the
+shards and evaluate it on those.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from collections.abc import Mapping
+from contextlib import ExitStack
+from datetime import datetime
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+from zlib import crc32
+
+from rdflib import Dataset, Graph, Literal, URIRef, Variable
+from rdflib.plugins.sparql.parserutils import CompValue
+from rdflib.plugins.sparql.sparql import Query
+from rdflib.query import Result, ResultRow
+from rdflib.term import Node
+
+from .results import _select_result
+from .store import (
+    Bindings,
+    GraphNameMapper,
+    MemoryRDFStore,
+    PreparedQueries,
+    RDFStore,
+    g_cfg_kwargs,
+    narrowed_graphs,
+    select_bindings,
+    union_dataset,
+)
+
+log = logging.getLogger(__name__)
+
+DEFAULT_SHARDS: int = os.cpu_count() or 1
+# the methods (of the shard) taking graphs, by the position of those
+GRAPH_ARGS: Dict[str, Tuple[int, ...]] = {
+    "insert": (0,),
+    "replace_graph": (0,),
+    "replace_if_changed": (0,),
+    "sync_graph": (0,),
+}
+
+Pattern = Tuple[Optional[Node], Optional[Node], Optional[Node]]
+
+
+def shards_from_env() -> int:
+    """returns the number of shards (worker processes) configured in the
+    environment via RDFSTORE_SHARDS or else the number of cpus
+    """
+    return int(os.getenv("RDFSTORE_SHARDS", DEFAULT_SHARDS))
+
+
+def _match_quads(
+    store: MemoryRDFStore,
+    patterns: List[Pattern],
+    named_graphs: Optional[List[str]] = None,
+) -> List[Tuple[Node, list]]:
+    """the triples (per context) of the store matching any of the patterns,
+    only in the named_graphs if given
+    """
+    matched = list()
+    with store._reading(named_graphs=named_graphs) as dataset:
+        for graph in dataset.store.contexts():
+            triples = set()
+            for pattern in patterns:
+                triples.update(graph.triples(pattern))
+            if triples:
+                matched.append((graph.identifier, list(triples)))
+    return matched
+
+
+def _serve(
+    conn, touch_unchanged: Optional[bool], query_cache_size: Optional[int]
+) -> None:
+    """the loop of a shard (worker process), calling the requested methods
+    on its store until it receives None
+    """
+    # the cleaning already happened before sending the graphs
+    store = MemoryRDFStore(
+        cleaner=lambda graph: graph,
+        touch_unchanged=touch_unchanged,
+        query_cache_size=query_cache_size,
+    )
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        method, args = request
+        try:
+            if method == "select":
+                sparql, named_graph, bindings, named_graphs = args
+                results = store.select(
+                    sparql,
+                    named_graph,
+                    bindings=bindings,
+                    named_graphs=named_graphs,
+                )
+                reply = (
+                    [_rows(result) for result in results]
+                    if isinstance(results, list)
+                    else _rows(results)
+                )
+            elif method == "match_quads":
+                reply = _match_quads(store, *args)
+            else:
+                args = [
+                    _graph(arg) if i in GRAPH_ARGS.get(method, ()) else arg
+                    for i, arg in enumerate(args)
+                ]
+                reply = getattr(store, method)
+                reply = reply(*args) if callable(reply) else reply
+                if isinstance(reply, Graph):
+                    reply = list(reply)
+            conn.send((True, reply))
+        except Exception as e:
+            try:
+                conn.send((False, e))
+            except Exception:  # e.g. not picklable
+                conn.send((False, RuntimeError(repr(e))))
+    conn.close()
+
+
+def _rows(result: Result) -> Tuple[List[str], List[tuple]]:
+    return [str(v) for v in result.vars], list(map(tuple, result))
+
+
+def _results(reply: Any, single: bool) -> Union[Result, List[Result]]:
+    """the result(s) of the (select) reply of one shard"""
+    if single:
+        return _select_result(*reply)
+    return [_select_result(*rows) for rows in reply]
+
+
+def _merged(replies: List[tuple], distinct: bool) -> Result:
+    """the result holding the rows of the (select) replies of all shards"""
+    rows = [row for _, shard_rows in replies for row in shard_rows]
+    if distinct:
+        rows = list(dict.fromkeys(rows))
+    return _select_result(replies[0][0], rows)
+
+
+def _graph(triples: Iterable[tuple]) -> Graph:
+    graph = Graph(**g_cfg_kwargs)
+    for triple in triples:
+        graph.add(triple)
+    return graph
+
+
+def _pattern(triple: tuple) -> Pattern:
+    # variables (and the blank nodes standing in for them) match anything
+    return tuple(
+        term if isinstance(term, (URIRef, Literal)) else None
+        for term in triple
+    )
+
+
+def triple_patterns(part: Any, patterns: Set[Pattern]) -> Set[Pattern]:
+    """collects the triple patterns in the (algebra of a) query,
+    with the variables replaced by None
+
+    :param part: the algebra (or any part of it) to walk
+    :type part: Any
+    :param patterns: the patterns found so far, extended in place
+    :type patterns: Set[Pattern]
+    :return: the patterns
+    :rtype: Set[Pattern]
+    """
+    if isinstance(part, CompValue):
+        if part.name == "BGP":
+            for triple in part.triples:
+                if not isinstance(triple[1], (URIRef, Variable)):
+                    # a property path, its hops could match anything
+                    patterns.add((None, None, None))
+                else:
+                    patterns.add(_pattern(triple))
+        for value in part.values():
+            triple_patterns(value, patterns)
+    elif isinstance(part, (list, tuple)):
+        for value in part:
+            triple_patterns(value, patterns)
+    return patterns
+
+
+def per_graph(algebra: CompValue) -> Optional[bool]:
+    """checks if all solutions of the select query come from one graph,
+    i.e. if it is of the form SELECT ... WHERE { GRAPH ?g { ... } }
+
+    :param algebra: the algebra of the query
+    :type algebra: CompValue
+    :return: None if not, else if the solutions should be distinct
+    :rtype: Optional[bool]
+    """
+    if algebra.name != "SelectQuery" or algebra.datasetClause:
+        return None
+    distinct: bool = False
+    part = algebra.p
+    while part.name in ("Project", "Distinct", "Reduced"):
+        distinct = distinct or part.name != "Project"
+        part = part.p
+    if part.name == "Graph" and isinstance(part.term, Variable):
+        return distinct
+    return None
+
+
+class ShardedMemoryRDFStore(RDFStore):
+    """In memory store spreading the named_graphs over worker processes
+    (each holding a MemoryRDFStore), so selects on different shards,
+    and the pattern matching of selects over all graphs, use more cores.
+    Graphs are cleaned before being sent to their shard.
+    """
+
+    def __init__(
+        self,
+        shards: Optional[int] = None,
+        *,
+        cleaner: Callable = None,
+        mapper: GraphNameMapper = None,
+        touch_unchanged: Optional[bool] = None,
+        query_cache_size: Optional[int] = None,
+    ):
+        """constructor
+
+        :param shards: (optional) the number of worker processes,
+          defaults to the RDFSTORE_SHARDS env variable or else the number
+          of cpus
+        :type shards: int
+        :param query_cache_size: (optional) the max number of prepared
+          queries to keep, in each shard and in this process
+          (see PreparedQueries)
+        :type query_cache_size: int
+        """
+        super().__init__(
+            cleaner=cleaner, mapper=mapper, touch_unchanged=touch_unchanged
+        )
+        n: int = shards or shards_from_env()
+        assert n > 0, f"at least one shard is required {shards=}"
+        # spawn, as forking a process holding threads (and locks) is unsafe
+        context = multiprocessing.get_context("spawn")
+        self._conns = list()
+        self._workers = list()
+        for _ in range(n):
+            conn, worker_conn = context.Pipe()
+            worker = context.Process(
+                target=_serve,
+                args=(worker_conn, self._touch_unchanged, query_cache_size),
+                daemon=True,
+            )
+            worker.start()
+            worker_conn.close()
+            self._conns.append(conn)
+            self._workers.append(worker)
+        self._locks = [threading.Lock() for _ in range(n)]
+        #: the prepared queries over all graphs, with their hits and misses
+        self.query_cache = PreparedQueries(query_cache_size)
+
+    @property
+    def shards(self) -> int:
+        return len(self._conns)
+
+    def shard_of(self, named_graph: Optional[str]) -> int:
+        """the shard owning the named_graph (the default graph being in 0)"""
+        if named_graph is None:
+            return 0
+        return crc32(str(named_graph).encode("utf-8")) % self.shards
+
+    def _scatter(self, calls: Dict[int, tuple]) -> Dict[int, Any]:
+        """calls the methods on the shards, all running at the same time
+
+        :param calls: the method name and args per shard
+        :type calls: Dict[int, tuple]
+        :return: the reply per shard
+        :rtype: Dict[int, Any]
+        """
+        shards = sorted(calls)  # locking in order, so never deadlocking
+        replies: Dict[int, tuple] = dict()
+        errors: List[BaseException] = list()
+        with ExitStack() as stack:
+            for shard in shards:
+                stack.enter_context(self._locks[shard])
+            sent: List[int] = list()
+            for shard in shards:
+                method, *args = calls[shard]
+                try:
+                    self._conns[shard].send((method, args))
+                except BaseException as e:
+                    self._failed(shard, e)
+                    errors.append(e)
+                    break
+                sent.append(shard)
+            # every reply is read, else it is taken for that of a later call
+            for shard in sent:
+                try:
+                    replies[shard] = self._conns[shard].recv()
+                except BaseException as e:
+                    self._failed(shard, e)
+                    errors.append(e)
+        if errors:
+            raise errors[0]
+        for ok, reply in replies.values():
+            if not ok:
+                raise reply
+        return {shard: reply for shard, (_, reply) in replies.items()}
+
+    def _failed(self, shard: int, error: BaseException) -> None:
+        """closes the connection to the shard if the error left it
+        out of step (part of a request or reply sent), so it is not used
+        """
+        if isinstance(error, (OSError, EOFError)):
+            log.error(f"connection to shard {shard} lost: {error!r}")
+            self._conns[shard].close()
+
+    def _call(self, named_graph: Optional[str], method: str, *args) -> Any:
+        """calls the method on the shard owning the named_graph"""
+        shard: int = self.shard_of(named_graph)
+        return self._scatter({shard: (method, *args)})[shard]
+
+    def _grouped(self, named_graphs: Iterable[str]) -> Dict[int, List[str]]:
+        """the named_graphs per shard owning them"""
+        grouped: Dict[int, List[str]] = dict()
+        for ng in named_graphs:
+            grouped.setdefault(self.shard_of(ng), list()).append(ng)
+        return grouped
+
+    def _broadcast(self, method: str, *args) -> List[Any]:
+        """calls the method on all shards"""
+        replies = self._scatter(
+            {shard: (method, *args) for shard in range(self.shards)}
+        )
+        return [replies[shard] for shard in range(self.shards)]
+
+    def close(self) -> None:
+        for lock, conn, worker in zip(self._locks, self._conns, self._workers):
+            with lock:
+                if not conn.closed:
+                    try:
+                        conn.send(None)
+                    except OSError:
+                        pass  # already gone
+                    conn.close()
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+
+    def select(
+        self,
+        sparql: str,
+        named_graph: Optional[str] = None,
+        *,
+        bindings: Optional[Bindings] = None,
+        named_graphs: Optional[Iterable[str]] = None,
+    ) -> Union[Result, List[Result]]:
+        single: bool = bindings is None or isinstance(bindings, Mapping)
+        named_graphs = narrowed_graphs(named_graph, named_graphs)
+        if named_graph is not None:
+            reply = self._call(
+                named_graph, "select", sparql, named_graph, bindings, None
+            )
+            return _results(reply, single)
+        # else the named_graphs (or all of them) per shard
+        grouped: Dict[int, Optional[List[str]]] = (
+            self._grouped(named_graphs)
+            if named_graphs is not None
+            else {shard: None for shard in range(self.shards)}
+        )
+        if named_graphs is not None and len(grouped) == 1:
+            # all in one shard, which has the whole union
+            ((shard, ngs),) = grouped.items()
+            reply = self._scatter(
+                {shard: ("select", sparql, None, bindings, ngs)}
+            )[shard]
+            return _results(reply, single)
+        # else
+        query: Query = self.query_cache.get(sparql)
+        distinct: Optional[bool] = per_graph(query.algebra)
+        if distinct is not None:  # every shard has whole solutions
+            replies = list(
+                self._scatter(
+                    {
+                        shard: ("select", sparql, None, bindings, ngs)
+                        for shard, ngs in grouped.items()
+                    }
+                ).values()
+            )
+            if single:
+                return _merged(replies, distinct)
+            return [
+                _merged([reply[i] for reply in replies], distinct)
+                for i in range(len(bindings))
+            ]
+        # else evaluate on the matching triples of all shards
+        patterns = list(triple_patterns(query.algebra, set()))
+        if (None, None, None) in patterns:
+            patterns = [(None, None, None)]
+        dataset: Dataset = union_dataset()
+        matches = self._scatter(
+            {
+                shard: ("match_quads", patterns, ngs)
+                for shard, ngs in grouped.items()
+            }
+        )
+        for matched in matches.values():
+            for context, triples in matched:
+                graph: Graph = dataset.graph(context)
+                for triple in triples:
+                    graph.add(triple)
+        return select_bindings(dataset, query, bindings)
+
+    def select_iter(
+        self,
+        sparql: str,
+        named_graph: Optional[str] = None,
+        page_size: Optional[int] = None,
+        *,
+        named_graphs: Optional[Iterable[str]] = None,
+    ) -> Iterator[ResultRow]:
+        """executes a sparql select query, see RDFStore.select_iter
+
+        Unlike the paged stores, the whole result is materialised first:
+        paging would re-evaluate the whole query for every page, so this
+        does not limit the memory used.
+        """
+        yield from self.select(sparql, named_graph, named_graphs=named_graphs)
+
+    def insert(self, graph: Graph, named_graph: Optional[str] = None):
+        self._call(named_graph, "insert", list(self.clean(graph)), named_graph)
+
+    def replace_graph(self, graph: Graph, named_graph: str) -> None:
+        assert named_graph is not None, "only named_graphs can be replaced"
+        self._call(
+            named_graph,
+            "replace_graph",
+            list(self.clean(graph)),
+            named_graph,
+        )
+
+    def replace_if_changed(self, graph: Graph, named_graph: str) -> bool:
+        return self._call(
+            named_graph,
+            "replace_if_changed",
+            list(self.clean(graph)),
+            named_graph,
+        )
+
+    def sync_graph(self, graph: Graph, named_graph: str) -> bool:
+        assert named_graph is not None, "only named_graphs can be synced"
+        return self._call(
+            named_graph, "sync_graph", list(self.clean(graph)), named_graph
+        )
+
+    def fingerprint(self, named_graph: str) -> Optional[Tuple[str, int]]:
+        return self._call(named_graph, "fingerprint", named_graph)
+
+    def _refresh_lastmod(
+        self, named_graph: str, fingerprint: Tuple[str, int]
+    ) -> None:
+        self._call(named_graph, "_refresh_lastmod", named_graph, fingerprint)
+
+    def lastmod_ts(self, named_graph: str) -> datetime:
+        return self._call(named_graph, "lastmod_ts", named_graph)
+
+    def lastmod_ts_many(
+        self, named_graphs: Iterable[str]
+    ) -> Dict[str, Optional[datetime]]:
+        named_graphs = list(named_graphs)
+        lastmods: Dict[str, Optional[datetime]] = dict()
+        replies = self._scatter(
+            {
+                shard: ("lastmod_ts_many", ngs)
+                for shard, ngs in self._grouped(named_graphs).items()
+            }
+        )
+        for reply in replies.values():
+            lastmods.update(reply)
+        return {ng: lastmods.get(ng) for ng in named_graphs}
+
+    def stale_named_graphs(
+        self, age_minutes: int = 0, reference_time: datetime = None
+    ) -> Iterable[str]:
+        replies = self._broadcast(
+            "stale_named_graphs", age_minutes, reference_time
+        )
+        return [ng for reply in replies for ng in reply]
+
+    def fetch_graph(self, named_graph: str) -> Graph:
+        return _graph(self._call(named_graph, "fetch_graph", named_graph))
+
+    def drop_graph(self, named_graph: str) -> None:
+        self._call(named_graph, "drop_graph", named_graph)
+
+    def forget_graph(self, named_graph: str) -> None:
+        self._call(named_graph, "forget_graph", named_graph)
+
+    @property
+    def named_graphs(self) -> Iterable[str]:
+        return [
+            ng for reply in self._broadcast("named_graphs") for ng in reply
+        ]
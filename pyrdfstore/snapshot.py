@@ -0,0 +1,192 @@
+"""Binary snapshots of the content of the in memory stores.
+
+A snapshot file holds (in this order, each section 8-byte aligned)
+  - a header: magic, version, flags, number of terms and of quads
+  - the term dictionary: a kind byte per term, and for the value,
+    datatype and language columns the int64 (character) offsets of each
+    term into one utf-8 text
+  - the quads: int64 (graph, subject, predicate, object) term ids,
+    little endian, grouped per graph (and with SORTED_QUADS in the flags
+    sorted within the graph)
+  - the admin registry: lastmod and fingerprint per named_graph, as json
+
+The file is read through a read-only mmap. The "arrays:" store uses the
+quads in place (so these pages are shared by all processes mapping the same
+file), the memory store still adds every quad to its own indexes.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from rdflib.term import Node
+
+from .terms import key_term, term_key
+
+log = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"PYRDFSNP"
+SNAPSHOT_VERSION = 1
+SORTED_QUADS = 1  # flag: the triples of each graph are sorted (s, p, o)
+HEADER = struct.Struct("<8sIIQQ")
+LENGTH = struct.Struct("<Q")
+ALIGN = 8
+
+RegistryEntry = Tuple[Optional[datetime], Optional[Tuple[str, int]]]
+
+
+def _padding(size: int) -> bytes:
+    return b"\0" * (-size % ALIGN)
+
+
+def _text_column(values: Sequence[str]) -> bytes:
+    offsets = array("q", [0])
+    for value in values:
+        offsets.append(offsets[-1] + len(value))
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    text: bytes = "".join(values).encode("utf-8")
+    return (
+        offsets.tobytes() + LENGTH.pack(len(text)) + text + _padding(len(text))
+    )
+
+
+def packed(ids: array) -> bytes:
+    """the int64 ids as little endian bytes"""
+    if sys.byteorder != "little":
+        ids = array("q", ids)
+        ids.byteswap()
+    return ids.tobytes()
+
+
+def write_snapshot(
+    path: Union[str, Path],
+    terms: Sequence[Node],
+    quads: Iterable[bytes],
+    registry: Dict[str, RegistryEntry],
+    sorted_quads: bool = False,
+) -> None:
+    """writes the snapshot file
+
+    :param path: the file to write, replaced as a whole
+    :type path: Union[str, Path]
+    :param terms: the term dictionary, the id of a term being its position
+    :type terms: Sequence[Node]
+    :param quads: the packed little endian int64 (g, s, p, o) term ids,
+      grouped per graph, in chunks (written as they come)
+    :type quads: Iterable[bytes]
+    :param registry: the lastmod and fingerprint per named_graph
+    :type registry: Dict[str, RegistryEntry]
+    :param sorted_quads: (optional) the triples of each graph are sorted,
+      defaults to False
+    :type sorted_quads: bool
+    """
+    path = Path(path)
+    keys = [term_key(term) for term in terms]
+    kinds: bytes = "".join(key[0] for key in keys).encode("ascii")
+    doc = {
+        ng: [
+            lastmod.isoformat() if lastmod else None,
+            *(fingerprint or (None, None)),
+        ]
+        for ng, (lastmod, fingerprint) in registry.items()
+    }
+    # write aside and move into place, so readers never see half a file
+    tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        flags: int = SORTED_QUADS if sorted_quads else 0
+
+        def header(n_quads: int) -> bytes:
+            return HEADER.pack(
+                SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags, len(terms), n_quads
+            )
+
+        f.write(header(0))  # the number of quads is only known at the end
+        f.write(kinds + _padding(len(kinds)))
+        for column in (1, 2, 3):
+            f.write(_text_column([key[column] for key in keys]))
+        size: int = 0
+        for chunk in quads:
+            f.write(chunk)
+            size += len(chunk)
+        assert size % 32 == 0, "quads should be 4 int64 ids each"
+        f.write(json.dumps(doc).encode("utf-8"))
+        f.seek(0)
+        f.write(header(size // 32))
+    os.replace(tmp, path)
+
+
+class Snapshot:
+    """the content of a snapshot file, mapped into memory"""
+
+    def __init__(self, path: Union[str, Path]):
+        """reads the snapshot file
+
+        :param path: the snapshot file to read
+        :type path: Union[str, Path]
+        """
+        with open(path, "rb") as f:
+            # the map stays valid after closing the file
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.flags, n_terms, n_quads = HEADER.unpack_from(
+            self.buffer
+        )
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"not a (version {SNAPSHOT_VERSION}) snapshot")
+        view = memoryview(self.buffer)
+        pos: int = HEADER.size
+        kinds: str = view[pos:][:n_terms].tobytes().decode("ascii")
+        pos += n_terms + len(_padding(n_terms))
+        columns: List[List[str]] = list()
+        for _ in range(3):
+            offsets = self._ints(view, pos, n_terms + 1)
+            pos += (n_terms + 1) * 8
+            (size,) = LENGTH.unpack_from(self.buffer, pos)
+            pos += LENGTH.size
+            text: str = view[pos:][:size].tobytes().decode("utf-8")
+            pos += size + len(_padding(size))
+            bounds = zip(offsets[:-1], offsets[1:])
+            columns.append([text[start:end] for start, end in bounds])
+        self.terms: List[Node] = [
+            key_term(*key) for key in zip(kinds, *columns)
+        ]
+        #: the offset of the quads (int64 ids) in the buffer
+        self.quads_offset: int = pos
+        self.n_quads: int = n_quads
+        pos += n_quads * 32
+        doc: dict = json.loads(view[pos:].tobytes().decode("utf-8"))
+        self.registry: Dict[str, RegistryEntry] = {
+            ng: (
+                datetime.fromisoformat(lastmod) if lastmod else None,
+                (sha, count) if sha is not None else None,
+            )
+            for ng, (lastmod, sha, count) in doc.items()
+        }
+
+    @staticmethod
+    def _ints(view: memoryview, pos: int, count: int) -> Sequence[int]:
+        ints = view[pos:][: count * 8]
+        if sys.byteorder == "little":
+            return ints.cast("q")  # no copy
+        # else
+        swapped = array("q", ints.tobytes())
+        swapped.byteswap()
+        return swapped
+
+    @property
+    def sorted_quads(self) -> bool:
+        return bool(self.flags & SORTED_QUADS)
+
+    @property
+    def quads(self) -> Sequence[int]:
+        """the flat sequence of (g, s, p, o) term ids"""
+        view = memoryview(self.buffer)
+        return self._ints(view, self.quads_offset, self.n_quads * 4)
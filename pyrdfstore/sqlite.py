@@ -0,0 +1,577 @@
+"""Embedded persistent store on the standard library sqlite3.
+
+The terms are kept once in a dictionary table, the quads as rows of their
+term ids (with covering indexes for every lookup order), and the admin
+registry (lastmod and fingerprint per named_graph) as a table of its own.
+The database runs in WAL mode, so readers do not block the writer.
+"""
+
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from rdflib import Dataset, Graph, URIRef
+from rdflib.graph import DATASET_DEFAULT_GRAPH_ID
+from rdflib.namespace import NamespaceManager
+from rdflib.query import Result, ResultRow
+from rdflib.store import Store
+from rdflib.term import Node
+
+from .store import (
+    LASTMOD_LOOKUP_CHUNK,
+    Bindings,
+    GraphNameMapper,
+    RDFStore,
+    content_fingerprint,
+    de_skolemized,
+    g_cfg_kwargs,
+    narrowed_graphs,
+    select_bindings,
+    timestamp,
+)
+from .terms import TermKey, key_term, term_key
+
+log = logging.getLogger(__name__)
+
+SQLITE_SCHEME = "sqlite:///"
+DEFAULT_TIMEOUT: float = 30.0  # seconds to wait for a locked database
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,  -- 'u'ri, 'b'lank node or 'l'iteral
+    value TEXT NOT NULL,
+    datatype TEXT NOT NULL DEFAULT '',
+    lang TEXT NOT NULL DEFAULT '',
+    UNIQUE (kind, value, datatype, lang)
+);
+CREATE TABLE IF NOT EXISTS quads (
+    g INTEGER NOT NULL,
+    s INTEGER NOT NULL,
+    p INTEGER NOT NULL,
+    o INTEGER NOT NULL,
+    PRIMARY KEY (g, s, p, o)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS quads_gpos ON quads (g, p, o, s);
+CREATE INDEX IF NOT EXISTS quads_gosp ON quads (g, o, s, p);
+CREATE INDEX IF NOT EXISTS quads_spog ON quads (s, p, o, g);
+CREATE INDEX IF NOT EXISTS quads_posg ON quads (p, o, s, g);
+CREATE INDEX IF NOT EXISTS quads_ospg ON quads (o, s, p, g);
+CREATE TABLE IF NOT EXISTS registry (
+    named_graph TEXT PRIMARY KEY,
+    lastmod TEXT NOT NULL,
+    sha256 TEXT,
+    triples INTEGER
+);
+"""
+
+SELECT_TERM_ID = (
+    "SELECT id FROM terms"
+    " WHERE kind = ? AND value = ? AND datatype = ? AND lang = ?"
+)
+TERM_ID = f"({SELECT_TERM_ID})"
+INSERT_TERM = (
+    "INSERT OR IGNORE INTO terms (kind, value, datatype, lang)"
+    " VALUES (?, ?, ?, ?)"
+)
+INSERT_QUAD = (
+    "INSERT OR IGNORE INTO quads (g, s, p, o)"
+    f" VALUES ({TERM_ID}, {TERM_ID}, {TERM_ID}, {TERM_ID})"
+)
+DELETE_QUAD = (
+    f"DELETE FROM quads WHERE g = {TERM_ID}"
+    f" AND s = {TERM_ID} AND p = {TERM_ID} AND o = {TERM_ID}"
+)
+UPSERT_REGISTRY = (
+    "INSERT INTO registry (named_graph, lastmod, sha256, triples)"
+    " VALUES (?, ?, ?, ?) ON CONFLICT (named_graph) DO UPDATE SET"
+    " lastmod = excluded.lastmod,"
+    " sha256 = excluded.sha256, triples = excluded.triples"
+)
+
+
+def sqlite_path(uri: str) -> str:
+    """the file path in a sqlite:/// uri,
+    following the usual convention that sqlite:///relative/path.db is
+    relative and sqlite:////absolute/path.db is absolute
+    """
+    assert uri.startswith(SQLITE_SCHEME), f"not a sqlite uri {uri=}"
+    return uri.partition(SQLITE_SCHEME)[2]
+
+
+@contextmanager
+def transaction(con: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """wraps the block in one (write) transaction on the connection,
+    or just joins the one already running
+    """
+    if con.in_transaction:
+        yield con
+        return
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        yield con
+    except BaseException:
+        con.rollback()
+        raise
+    con.commit()
+
+
+def _quad_params(graph_key: TermKey, triples: Iterable) -> Iterator[tuple]:
+    for s, p, o in triples:
+        yield graph_key + term_key(s) + term_key(p) + term_key(o)
+
+
+def insert_triples(
+    con: sqlite3.Connection, triples: Iterable, context: Node
+) -> None:
+    """adds the triples into the context, in bulk"""
+    triples = list(triples)
+    keys = {term_key(t) for triple in triples for t in triple}
+    keys.add(term_key(context))
+    con.executemany(INSERT_TERM, keys)
+    con.executemany(INSERT_QUAD, _quad_params(term_key(context), triples))
+
+
+def delete_triples(
+    con: sqlite3.Connection, triples: Iterable, context: Node
+) -> None:
+    """removes the triples from the context, in bulk"""
+    con.executemany(DELETE_QUAD, _quad_params(term_key(context), triples))
+
+
+class SQLiteStore(Store):
+    """rdflib Store over the sqlite tables, so the rdflib sparql engine
+    can query them (each triple pattern becoming one indexed select)
+    """
+
+    context_aware = True
+    graph_aware = True
+    formula_aware = False
+    transaction_aware = False
+
+    def __init__(
+        self,
+        connect: Callable[[], sqlite3.Connection],
+        contexts: Optional[Iterable[Node]] = None,
+    ):
+        """constructor
+
+        :param connect: provides the connection to use (for this thread)
+        :type connect: Callable[[], sqlite3.Connection]
+        :param contexts: (optional) the only contexts to see,
+          defaults to all of them
+        :type contexts: Iterable[Node]
+        """
+        super().__init__()
+        self._connect = connect
+        self._contexts: Optional[Set[Node]] = (
+            set(contexts) if contexts is not None else None
+        )
+
+    def _id(self, term: Node) -> Optional[int]:
+        row = (
+            self._connect().execute(SELECT_TERM_ID, term_key(term)).fetchone()
+        )
+        return row[0] if row else None
+
+    def _where(
+        self, triple: tuple, context: Optional[Node]
+    ) -> Optional[Tuple[str, list]]:
+        """the sql conditions (and their params) matching the pattern,
+        None if it holds a term that is not known (so nothing can match)
+        """
+        conditions, params = ["1 = 1"], list()
+        if self._contexts is not None:
+            if context is not None and context not in self._contexts:
+                return None
+            if context is None:  # narrowed to the known ones
+                ids = [self._id(c) for c in self._contexts]
+                ids = [id for id in ids if id is not None]
+                conditions.append(f"g IN ({', '.join('?' * len(ids))})")
+                params.extend(ids)
+        pattern = zip(("g", "s", "p", "o"), (context, *triple))
+        for column, term in pattern:
+            if term is None:
+                continue
+            id = self._id(term)
+            if id is None:
+                return None
+            conditions.append(f"{column} = ?")
+            params.append(id)
+        return " AND ".join(conditions), params
+
+    def triples(self, triple_pattern, context=None):
+        context = getattr(context, "identifier", context)
+        where = self._where(triple_pattern, context)
+        if where is None:
+            return
+        conditions, params = where
+        # the union of all contexts only holds each triple once
+        distinct = "DISTINCT" if context is None else ""
+        sql = (
+            "SELECT q.s, q.p, q.o,"
+            " ts.kind, ts.value, ts.datatype, ts.lang,"
+            " tp.kind, tp.value, tp.datatype, tp.lang,"
+            " tob.kind, tob.value, tob.datatype, tob.lang"
+            f" FROM (SELECT {distinct} s, p, o FROM quads"
+            f" WHERE {conditions}) AS q"
+            " JOIN terms ts ON ts.id = q.s"
+            " JOIN terms tp ON tp.id = q.p"
+            " JOIN terms tob ON tob.id = q.o"
+        )
+        for row in self._connect().execute(sql, params):
+            triple = (
+                key_term(*row[3:7]),
+                key_term(*row[7:11]),
+                key_term(*row[11:15]),
+            )
+            contexts = (
+                self._contexts_of(row[0:3])
+                if context is None
+                else iter([Graph(store=self, identifier=context)])
+            )
+            yield triple, contexts
+
+    def _contexts_of(self, ids: tuple) -> Iterator[Graph]:
+        sql = (
+            "SELECT t.kind, t.value, t.datatype, t.lang"
+            " FROM quads JOIN terms t ON t.id = quads.g"
+            " WHERE s = ? AND p = ? AND o = ?"
+        )
+        for row in self._connect().execute(sql, ids).fetchall():
+            context = key_term(*row)
+            if self._contexts is None or context in self._contexts:
+                yield Graph(store=self, identifier=context)
+
+    def __len__(self, context=None) -> int:
+        context = getattr(context, "identifier", context)
+        where = self._where((None, None, None), context)
+        if where is None:
+            return 0
+        conditions, params = where
+        distinct = "DISTINCT" if context is None else ""
+        sql = (
+            f"SELECT count(*) FROM (SELECT {distinct} s, p, o FROM quads"
+            f" WHERE {conditions})"
+        )
+        return self._connect().execute(sql, params).fetchone()[0]
+
+    def contexts(self, triple=None) -> Iterator[Graph]:
+        where = self._where(triple or (None, None, None), None)
+        if where is None:
+            return
+        conditions, params = where
+        sql = (
+            "SELECT t.kind, t.value, t.datatype, t.lang FROM terms t"
+            f" WHERE t.id IN (SELECT DISTINCT g FROM quads WHERE {conditions})"
+        )
+        for row in self._connect().execute(sql, params).fetchall():
+            yield Graph(store=self, identifier=key_term(*row))
+
+    def add(self, triple, context, quoted=False) -> None:
+        self.addN([(*triple, context)])
+
+    def addN(self, quads) -> None:
+        grouped: Dict[Node, list] = dict()
+        for s, p, o, c in quads:
+            grouped.setdefault(c.identifier, list()).append((s, p, o))
+        with transaction(self._connect()) as con:
+            for context, triples in grouped.items():
+                insert_triples(con, triples, context)
+
+    def remove(self, triple, context=None) -> None:
+        context = getattr(context, "identifier", context)
+        where = self._where(triple, context)
+        if where is None:
+            return
+        conditions, params = where
+        with transaction(self._connect()) as con:
+            con.execute(f"DELETE FROM quads WHERE {conditions}", params)
+
+    def add_graph(self, graph: Graph) -> None:
+        pass  # graphs only exist through their quads
+
+    def remove_graph(self, graph: Graph) -> None:
+        self.remove((None, None, None), graph)
+
+
+class SQLiteRDFStore(RDFStore):
+    """Persistent embedded store in a sqlite database file.
+    Selects run on the rdflib sparql engine (over a SQLiteStore),
+    within one read transaction, so they see a consistent snapshot.
+    Writes each run in a single transaction.
+
+    :param path: the file of the database, created if needed
+    :type path: Union[str, Path]
+    :param timeout: seconds to wait for the database to be unlocked
+      by other writers, defaults to 30
+    :type timeout: Optional[float]
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        *,
+        cleaner: Callable = None,
+        mapper: GraphNameMapper = None,
+        touch_unchanged: Optional[bool] = None,
+        timeout: Optional[float] = None,
+    ):
+        super().__init__(
+            cleaner=cleaner, mapper=mapper, touch_unchanged=touch_unchanged
+        )
+        self._path: str = str(path)
+        assert self._path and self._path != ":memory:", (
+            "the database should be a file, "
+            "use the MemoryRDFStore to not persist anything"
+        )
+        self._timeout: float = timeout or DEFAULT_TIMEOUT
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = list()
+        self._lock = threading.Lock()
+        self._sql_store = SQLiteStore(self._connection)
+        self._dataset: Dataset = Dataset(
+            store=self._sql_store, default_union=True
+        )
+        self._dataset.namespace_manager = NamespaceManager(
+            self._dataset, **g_cfg_kwargs
+        )
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """the connection of the current thread"""
+        con: Optional[sqlite3.Connection] = getattr(self._local, "con", None)
+        if con is None:
+            # autocommit, transactions are started explicitly
+            # (and only close() touches it from another thread)
+            con = sqlite3.connect(
+                self._path,
+                timeout=self._timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            con.execute("PRAGMA journal_mode = WAL")
+            con.execute("PRAGMA synchronous = NORMAL")
+            self._local.con = con
+            with self._lock:
+                self._connections.append(con)
+        return con
+
+    def close(self) -> None:
+        """closes the connections to the database
+        Note: the store remains usable, connections get reopened on demand
+        """
+        with self._lock:
+            connections, self._connections = self._connections, list()
+        for con in connections:
+            con.close()
+        self._local = threading.local()
+
+    def _graph(self, named_graph: Optional[str]) -> Graph:
+        return Graph(
+            store=self._sql_store,
+            identifier=(
+                URIRef(named_graph)
+                if named_graph is not None
+                else DATASET_DEFAULT_GRAPH_ID
+            ),
+            **g_cfg_kwargs,
+        )
+
+    def _narrowed(self, named_graphs: List[str]) -> Dataset:
+        """the dataset over just the named_graphs (their union being
+        the default graph)
+        """
+        contexts = [URIRef(ng) for ng in named_graphs]
+        dataset = Dataset(
+            store=SQLiteStore(self._connection, contexts), default_union=True
+        )
+        dataset.namespace_manager = NamespaceManager(dataset, **g_cfg_kwargs)
+        return dataset
+
+    @contextmanager
+    def _reading(self) -> Iterator[sqlite3.Connection]:
+        """one read transaction (i.e. snapshot) on the connection"""
+        con = self._connection()
+        if con.in_transaction:
+            yield con
+            return
+        con.execute("BEGIN")
+        try:
+            yield con
+        finally:
+            con.commit()
+
+    def select(
+        self,
+        sparql: str,
+        named_graph: Optional[str] = None,
+        *,
+        bindings: Optional[Bindings] = None,
+        named_graphs: Optional[Iterable[str]] = None,
+    ) -> Union[Result, List[Result]]:
+        named_graphs = narrowed_graphs(named_graph, named_graphs)
+        if named_graphs is not None:
+            target: Graph = self._narrowed(named_graphs)
+        elif named_graph is not None:
+            target = self._graph(named_graph)
+        else:
+            target = self._dataset
+        with self._reading():
+            results = select_bindings(target, sparql, bindings)
+            for result in results if isinstance(results, list) else [results]:
+                if result.type == "SELECT":
+                    result.bindings  # evaluated within the snapshot
+        return results
+
+    def select_iter(
+        self,
+        sparql: str,
+        named_graph: Optional[str] = None,
+        page_size: Optional[int] = None,
+        *,
+        named_graphs: Optional[Iterable[str]] = None,
+    ) -> Iterator[ResultRow]:
+        """executes a sparql select query, see RDFStore.select_iter
+
+        Unlike the paged stores, the whole result is materialised first:
+        paging would re-evaluate the whole query for every page, so this
+        does not limit the memory used.
+        """
+        yield from self.select(sparql, named_graph, named_graphs=named_graphs)
+
+    def _register(
+        self,
+        con: sqlite3.Connection,
+        named_graph: str,
+        fingerprint: Optional[Tuple[str, int]] = None,
+    ) -> None:
+        sha, count = fingerprint or (None, None)
+        con.execute(
+            UPSERT_REGISTRY,
+            (named_graph, timestamp().isoformat(), sha, count),
+        )
+
+    def insert(self, graph: Graph, named_graph: Optional[str] = None):
+        graph = self.clean(graph)
+        context = (
+            URIRef(named_graph)
+            if named_graph is not None
+            else DATASET_DEFAULT_GRAPH_ID
+        )
+        with transaction(self._connection()) as con:
+            insert_triples(con, graph, context)
+            if named_graph is not None:
+                self._register(con, named_graph)
+
+    def replace_graph(self, graph: Graph, named_graph: str) -> None:
+        assert named_graph is not None, "only named_graphs can be replaced"
+        replacement: Graph = self.clean(graph)
+        self._replace_cleaned(
+            replacement,
+            named_graph,
+            content_fingerprint(replacement, named_graph),
+        )
+
+    def _replace_cleaned(
+        self, graph: Graph, named_graph: str, fingerprint: Tuple[str, int]
+    ) -> None:
+        context = URIRef(named_graph)
+        with transaction(self._connection()) as con:
+            self._sql_store.remove_graph(self._graph(named_graph))
+            insert_triples(con, graph, context)
+            self._register(con, named_graph, fingerprint)
+
+    def _apply_diff(
+        self,
+        named_graph: str,
+        removed: Graph,
+        added: Graph,
+        fingerprint: Tuple[str, int],
+    ) -> None:
+        added = de_skolemized(added, named_graph)  # keeps blank nodes
+        context = URIRef(named_graph)
+        with transaction(self._connection()) as con:
+            delete_triples(con, removed, context)
+            insert_triples(con, added, context)
+            self._register(con, named_graph, fingerprint)
+
+    def fingerprint(self, named_graph: str) -> Optional[Tuple[str, int]]:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT sha256, triples FROM registry WHERE named_graph = ?",
+                (named_graph,),
+            )
+            .fetchone()
+        )
+        if row is None or row[0] is None:
+            return None
+        return row[0], row[1]
+
+    def _refresh_lastmod(
+        self, named_graph: str, fingerprint: Tuple[str, int]
+    ) -> None:
+        with transaction(self._connection()) as con:
+            self._register(con, named_graph, fingerprint)
+
+    def lastmod_ts(self, named_graph: str) -> datetime:
+        return self.lastmod_ts_many([named_graph])[named_graph]
+
+    def lastmod_ts_many(
+        self, named_graphs: Iterable[str]
+    ) -> Dict[str, Optional[datetime]]:
+        names: List[str] = list(dict.fromkeys(named_graphs))
+        found: Dict[str, datetime] = dict()
+        with self._reading() as con:
+            for start in range(0, len(names), LASTMOD_LOOKUP_CHUNK):
+                end: int = start + LASTMOD_LOOKUP_CHUNK
+                chunk: List[str] = names[start:end]
+                marks: str = ", ".join("?" * len(chunk))
+                rows = con.execute(
+                    "SELECT named_graph, lastmod FROM registry"
+                    f" WHERE named_graph IN ({marks})",
+                    chunk,
+                )
+                found.update(
+                    (ng, datetime.fromisoformat(lastmod))
+                    for ng, lastmod in rows
+                )
+        return {ng: found.get(ng) for ng in names}
+
+    def fetch_graph(self, named_graph: str) -> Graph:
+        graph = Graph(**g_cfg_kwargs)
+        with self._reading():
+            graph += self._graph(named_graph)
+        return graph
+
+    def drop_graph(self, named_graph: str) -> None:
+        assert named_graph is not None, "only named_graphs can be dropped"
+        with transaction(self._connection()) as con:
+            self._sql_store.remove_graph(self._graph(named_graph))
+            self._register(con, named_graph)
+
+    def forget_graph(self, named_graph: str) -> None:
+        with transaction(self._connection()) as con:
+            con.execute(
+                "DELETE FROM registry WHERE named_graph = ?", (named_graph,)
+            )
+
+    @property
+    def named_graphs(self) -> Iterable[str]:
+        rows = self._connection().execute("SELECT named_graph FROM registry")
+        return [ng for (ng,) in rows]
@@ -1,15 +1,51 @@
 import logging
+import os
+import re
+import threading
 from abc import ABC, abstractmethod
-from collections.abc import Iterable
+from array import array
+from collections import OrderedDict
+from collections.abc import Iterable, Mapping
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
-from typing import Any, Callable, Optional
-from urllib.parse import unquote
-
-from rdflib import Graph, Literal, Namespace, URIRef
-from rdflib.plugins.stores.sparqlstore import SPARQLStore, SPARQLUpdateStore
-from rdflib.query import Result
-
+from hashlib import sha256
+from io import BytesIO
+from itertools import chain, islice
+from pathlib import Path
+from time import monotonic
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.error import HTTPError
+from urllib.parse import unquote, urlparse
+
+from rdflib import BNode, Dataset, Graph, Literal, Namespace, URIRef, Variable
+from rdflib.compare import _TripleCanonicalizer
+from rdflib.graph import DATASET_DEFAULT_GRAPH_ID
+from rdflib.namespace import NamespaceManager
+from rdflib.plugins.sparql import prepareQuery
+from rdflib.plugins.sparql.sparql import Query
+from rdflib.query import Result, ResultRow
+from rdflib.store import Store
+from rdflib.term import Node
+
+from .balance import ReadBalancer
+from .batch import (
+    batch_bytes_from_env,
+    batched,
+    delete_data,
+    insert_data,
+    split,
+    triple_lines,
+    upload,
+)
 from .clean import clean_uri_str, default_cleaner
+from .gsp import GraphStoreClient
+from .pool import (
+    HTTPConnectionPool,
+    PooledSPARQLStore,
+    PooledSPARQLUpdateStore,
+)
+from .results import RESULT_FORMATS, RawRows, parse_results
+from .snapshot import RegistryEntry, Snapshot, packed, write_snapshot
 
 log = logging.getLogger(__name__)
 
@@ -18,13 +54,483 @@ NIL_NS = "urn:_:nil"
 ADMIN_NAMED_GRAPH = "urn:py-rdf-store:admin"
 SCHEMA = Namespace("https://schema.org/")
 SCHEMA_DATEMODIFIED = SCHEMA.dateModified
+SCHEMA_SHA256 = SCHEMA.sha256
+VOID = Namespace("http://rdfs.org/ns/void#")
+VOID_TRIPLES = VOID.triples
 g_cfg_kwargs = dict(bind_namespaces="none")
+CONSTRUCT_ALL_SPO = "CONSTRUCT { ?s ?p ?o } WHERE { ?s ?p ?o . }"
+LASTMOD_LOOKUP_CHUNK = 500  # max named_graphs per VALUES lookup query
+DEFAULT_PAGE_SIZE = 10000  # rows per page of a paged select
+SOLUTION_MODIFIERS = ("Slice", "Distinct", "Reduced", "Project", "OrderBy")
+DEFAULT_QUERY_CACHE_SIZE = 256  # prepared queries kept per in memory store
+VALUES_CHUNK = 500  # max bindings folded into one VALUES block
+SKOLEM_GENID = "/.well-known/genid/"  # the path of skolem iris
+# the tokens of a sparql query, those that may hold braces (or keywords)
+# first, so no strings, iris or comments are taken for syntax
+SPARQL_TOKENS = re.compile(
+    r"#[^\n]*"
+    r'|"""(?:[^"\\]|\\.|"(?!""))*"""'
+    r"|'''(?:[^'\\]|\\.|'(?!''))*'''"
+    r'|"(?:[^"\\\n]|\\.)*"'
+    r"|'(?:[^'\\\n]|\\.)*'"
+    r'|<[^<>"{}|^`\\\x00-\x20]*>'
+    r"|[?$]\w+"
+    r"|(?:[^\W\d][\w.-]*)?:[\w.:%-]*"
+    r"|\w+"
+    r"|\S"
+)
+
+Binding = Mapping[Union[str, Variable], Any]
+Bindings = Union[Binding, List[Binding]]
 
 
 def timestamp():
     return datetime.now(UTC_tz)
 
 
+def is_younger(
+    lastmod: Optional[datetime],
+    age_minutes: int = 0,
+    reference_time: datetime = None,
+) -> bool:
+    """checks if the lastmod is not aged older than a certain amount of
+    minutes versus the reference_time (defaults to now())
+    Note: an unknown (None) lastmod is never young enough
+    """
+    if lastmod is None:
+        return False
+    lastmod = lastmod.astimezone(UTC_tz)
+    reference_time = reference_time or timestamp()
+    timelapsed: timedelta = reference_time - lastmod
+    return bool(timelapsed.total_seconds() <= age_minutes * 60)
+
+
+def _genid_base(named_graph: Optional[str]) -> str:
+    # the path of the stable skolem iris, scoped to the named_graph
+    scope: str = sha256(str(named_graph).encode("utf-8")).hexdigest()[:16]
+    return f"{SKOLEM_GENID}{scope}/"
+
+
+def _canonical_skolems(
+    graph: Graph, named_graph: Optional[str]
+) -> Iterator[Tuple[tuple, tuple]]:
+    """yields each triple of the graph with its stable skolemized form"""
+    basepath: str = _genid_base(named_graph)
+    # canonical_triples yields in the order of iterating the graph
+    canonical = _TripleCanonicalizer(graph).canonical_triples()
+    for triple, labelled in zip(graph, canonical):
+        yield triple, tuple(
+            (
+                term.skolemize(basepath=basepath)
+                if isinstance(term, BNode)
+                else term
+            )
+            for term in labelled
+        )
+
+
+def stable_skolemized(graph: Graph, named_graph: Optional[str]) -> Graph:
+    """replaces the blank nodes in the graph with skolem iris that only
+    depend on the content of the graph (and the named_graph it goes into),
+    so that the same content always yields the same triples
+
+    :param graph: the graph to skolemize
+    :type graph: Graph
+    :param named_graph: the named_graph the content is meant for,
+      keeping equally shaped blank nodes in other graphs apart
+    :type named_graph: str
+    :return: the skolemized graph (or the graph itself if without bnodes)
+    :rtype: Graph
+    """
+    if not any(isinstance(node, BNode) for triple in graph for node in triple):
+        return graph
+    # else label the bnodes canonically (i.e. from their surroundings)
+    skolemized = Graph(**g_cfg_kwargs)
+    for _, triple in _canonical_skolems(graph, named_graph):
+        skolemized.add(triple)
+    return skolemized
+
+
+def stable_relabelled(
+    graph: Graph, named_graph: Optional[str]
+) -> Tuple[Graph, Dict[Node, Node]]:
+    """skolemizes the stored content of a named_graph as stable_skolemized
+    does, treating the skolem iris in it as blank nodes too
+    (as stores skolemize blank nodes on insert)
+
+    :param graph: the stored content to skolemize
+    :type graph: Graph
+    :param named_graph: the named_graph the content is stored in
+    :type named_graph: str
+    :return: the skolemized graph, and per stable skolem iri
+      the (blank node or skolem iri) term actually stored
+    :rtype: Tuple[Graph, Dict[Node, Node]]
+    """
+    blanks: Dict[Node, BNode] = dict()  # skolem iri -> blank node
+
+    def blanked(term: Node) -> Node:
+        if isinstance(term, URIRef) and is_skolem(term):
+            return blanks.setdefault(term, BNode())
+        return term
+
+    blank_graph = Graph(**g_cfg_kwargs)
+    for triple in graph:
+        blank_graph.add(tuple(blanked(term) for term in triple))
+    if not any(
+        isinstance(node, BNode) for triple in blank_graph for node in triple
+    ):
+        return blank_graph, dict()
+    # else
+    stored: Dict[Node, Node] = {blank: iri for iri, blank in blanks.items()}
+    skolemized = Graph(**g_cfg_kwargs)
+    originals: Dict[Node, Node] = dict()
+    for triple, skolem_triple in _canonical_skolems(blank_graph, named_graph):
+        skolemized.add(skolem_triple)
+        for term, skolem in zip(triple, skolem_triple):
+            if isinstance(term, BNode):
+                originals[skolem] = stored.get(term, term)
+    return skolemized, originals
+
+
+def _as_stored(graph: Graph, stored: Dict[Node, Node]) -> Graph:
+    # the triples with the stable skolem iris of stored terms replaced
+    result = Graph(**g_cfg_kwargs)
+    for triple in graph:
+        result.add(tuple(stored.get(term, term) for term in triple))
+    return result
+
+
+def is_skolem(iri: URIRef) -> bool:
+    """tells if the iri is a skolem iri (standing in for a blank node)"""
+    return SKOLEM_GENID in iri and urlparse(iri).path.startswith(SKOLEM_GENID)
+
+
+def de_skolemized(graph: Graph, named_graph: Optional[str]) -> Graph:
+    """replaces the stable skolem iris of the named_graph
+    (see stable_skolemized) with blank nodes again, for stores keeping
+    blank nodes as such
+
+    :param graph: the graph to de-skolemize
+    :type graph: Graph
+    :param named_graph: the named_graph the content is meant for
+    :type named_graph: str
+    :return: the graph with blank nodes (labelled after the skolem iris)
+    :rtype: Graph
+    """
+    basepath: str = _genid_base(named_graph)
+    scope: str = basepath.split("/")[-2]
+
+    def blank(term: Node) -> Node:
+        if isinstance(term, URIRef) and basepath in term:
+            path: str = urlparse(term).path
+            if path.startswith(basepath):
+                return BNode(scope + path.partition(basepath)[2])
+        return term
+
+    blanked = Graph(**g_cfg_kwargs)
+    for triple in graph:
+        blanked.add(tuple(blank(term) for term in triple))
+    return blanked
+
+
+def content_fingerprint(
+    graph: Graph, named_graph: Optional[str] = None
+) -> Tuple[str, int]:
+    """computes a canonical hash and the triple count of the content
+    The hash does not depend on the order of the triples, nor on the
+    labels of blank nodes (see stable_skolemized)
+
+    :param graph: the (cleaned) content to fingerprint
+    :type graph: Graph
+    :param named_graph: (optional) the named_graph the content is meant for
+    :type named_graph: str
+    :return: the hex sha256 based hash and the number of triples
+    :rtype: Tuple[str, int]
+    """
+    total: int = 0
+    count: int = 0
+    for line in triple_lines(stable_skolemized(graph, named_graph)):
+        total += int.from_bytes(sha256(line.encode("utf-8")).digest(), "big")
+        count += 1
+    return f"{total % (1 << 256):064x}", count
+
+
+def paging_order(sparql: str) -> str:
+    """determines the ORDER BY clause to append to the select query
+    to get a stable order for paging through its results
+
+    :param sparql: the select query to page through
+    :type sparql: str
+    :return: the ORDER BY clause over all projected variables,
+      or an empty string if the query is already ordered
+    :rtype: str
+    """
+    algebra = prepareQuery(sparql).algebra
+    assert algebra.name == "SelectQuery", "only select queries can be paged"
+    # walk the solution modifiers on top of the actual pattern
+    modifier = algebra.p
+    while getattr(modifier, "name", None) in SOLUTION_MODIFIERS:
+        assert (
+            modifier.name != "Slice"
+        ), "queries with LIMIT or OFFSET can not be paged"
+        if modifier.name == "OrderBy":
+            return ""
+        modifier = modifier.get("p")
+    return "ORDER BY " + " ".join(var.n3() for var in algebra.PV)
+
+
+def sparql_tokens(sparql: str) -> Iterator[Tuple[int, str]]:
+    """splits the sparql query into its tokens, skipping the comments
+
+    :param sparql: the query
+    :type sparql: str
+    :return: the offset and text of each token
+    :rtype: Iterator[Tuple[int, str]]
+    """
+    for match in SPARQL_TOKENS.finditer(sparql):
+        if not match.group().startswith("#"):
+            yield match.start(), match.group()
+
+
+def trailing_values(sparql: str) -> Optional[int]:
+    """finds the VALUES block trailing the query (after its solution
+    modifiers), the only one outside all braces
+
+    :param sparql: the query
+    :type sparql: str
+    :return: the offset of its VALUES keyword, None if there is none
+    :rtype: Optional[int]
+    """
+    depth: int = 0
+    for offset, token in sparql_tokens(sparql):
+        if token == "{":
+            depth += 1
+        elif token == "}":
+            depth -= 1
+        elif depth == 0 and token.upper() == "VALUES":
+            return offset
+    return None
+
+
+def paged_select(sparql: str, order: str, limit: int, offset: int) -> str:
+    """adds the paging solution modifiers to the select query,
+    in front of the VALUES block trailing it (if any)
+
+    :param sparql: the select query to page through
+    :type sparql: str
+    :param order: the ORDER BY clause to add, see paging_order
+    :type order: str
+    :param limit: the number of rows per page
+    :type limit: int
+    :param offset: the number of rows to skip
+    :type offset: int
+    :return: the select query for the page
+    :rtype: str
+    """
+    modifiers: str = f"\n{order} LIMIT {limit} OFFSET {offset}\n"
+    at: Optional[int] = trailing_values(sparql)
+    if at is None:
+        return sparql + modifiers
+    return sparql[:at] + modifiers + sparql[at:]
+
+
+def init_bindings(
+    binding: Optional[Binding],
+) -> Optional[Dict[Variable, Node]]:
+    """converts the binding of a select to rdflib initBindings,
+    i.e. with Variable keys (with or without the leading '?'),
+    and plain python values as Literal
+
+    :param binding: the value per variable (name)
+    :type binding: Binding
+    :return: the initBindings, None if no binding
+    :rtype: Dict[Variable, Node]
+    """
+    if binding is None:
+        return None
+    return {
+        Variable(str(var).lstrip("?")): (
+            value if isinstance(value, Node) else Literal(value)
+        )
+        for var, value in binding.items()
+    }
+
+
+def select_bindings(
+    graph: Graph, query: Union[str, Query], bindings: Optional[Bindings]
+) -> Union[Result, List[Result]]:
+    """evaluates the query on the graph for the bindings (see
+    RDFStore.select) passing them as initBindings
+
+    :param graph: the graph (or dataset) to query
+    :type graph: Graph
+    :param query: the (prepared) query
+    :type query: Union[str, Query]
+    :param bindings: None, a binding, or a list of those
+    :type bindings: Optional[Bindings]
+    :return: the result, or the list of results for a list of bindings
+    :rtype: Union[Result, List[Result]]
+    """
+    if bindings is None or isinstance(bindings, Mapping):
+        return graph.query(query, initBindings=init_bindings(bindings))
+    # else
+    return [
+        graph.query(query, initBindings=init_bindings(binding))
+        for binding in bindings
+    ]
+
+
+def values_sparql(
+    sparql: str,
+    query: Query,
+    variables: List[Variable],
+    rows: List[Tuple[Node, ...]],
+    project: bool = True,
+) -> str:
+    """folds the rows of values for the variables into the select query,
+    as a VALUES block opening its WHERE clause (so joined before any
+    aggregates, limits or offsets apply), also adding the variables to
+    the projection if not there yet (so the result rows tell what values
+    they belong to)
+
+    :param sparql: the select query
+    :type sparql: str
+    :param query: the same query, prepared
+    :type query: Query
+    :param variables: the bound variables
+    :type variables: List[Variable]
+    :param rows: the values per binding, in the order of the variables
+    :type rows: List[Tuple[Node, ...]]
+    :param project: (optional) add the variables to the projection,
+      defaults to True
+    :type project: bool
+    :return: the select query for all the bindings at once
+    :rtype: str
+    """
+    assert query.algebra.name == "SelectQuery", "only selects take bindings"
+    assert not any(
+        isinstance(value, BNode) for row in rows for value in row
+    ), "blank nodes can not be bound"
+    tokens = sparql_tokens(sparql)
+    # past the prologue (iris and prefixed names being single tokens)
+    # the first SELECT keyword is the outer one
+    select = next((t for t in tokens if t[1].upper() == "SELECT"), None)
+    assert select is not None, "no SELECT clause found"
+    end: int = select[0] + len(select[1])  # after the keyword (modifier)
+    star: bool = False
+    depth: int = 0  # of the parentheses around projected expressions
+    for i, (offset, token) in enumerate(tokens):
+        if i == 0 and token.upper() in ("DISTINCT", "REDUCED"):
+            end = offset + len(token)
+        elif depth == 0 and token == "*":
+            star = True
+        elif depth == 0 and token == "{":  # opens the WHERE clause
+            where: int = offset + 1
+            break
+        depth += {"(": 1, ")": -1}.get(token, 0)
+    else:
+        assert False, "no WHERE clause found"
+    missing = [var for var in variables if var not in query.algebra.PV]
+    if project and missing and not star:
+        projection: str = " ".join(var.n3() for var in missing)
+        sparql = sparql[:end] + " " + projection + sparql[end:]
+        where += len(projection) + 1
+    header: str = " ".join(var.n3() for var in variables)
+    data: str = " ".join(
+        "(" + " ".join(value.n3() for value in row) + ")" for row in rows
+    )
+    values: str = f" VALUES ({header}) {{ {data} }}"
+    return sparql[:where] + values + sparql[where:]
+
+
+def foldable(query: Query) -> bool:
+    """checks if the select query gives the same solutions per binding
+    when all bindings are folded into one VALUES block,
+    i.e. if it has no LIMIT, OFFSET or aggregates (working across them)
+
+    :param query: the prepared select query
+    :type query: Query
+    :return: True if the bindings can be folded
+    :rtype: bool
+    """
+    part = query.algebra.p
+    # (a HAVING clause shows as a Filter on top of the aggregates)
+    while getattr(part, "name", None) in (
+        *SOLUTION_MODIFIERS,
+        "Extend",
+        "Filter",
+    ):
+        if part.name == "Slice":
+            return False
+        part = part.p
+    return getattr(part, "name", None) != "AggregateJoin"
+
+
+def narrowed_graphs(
+    named_graph: Optional[str], named_graphs: Optional[Iterable[str]]
+) -> Optional[List[str]]:
+    """checks a select is narrowed to either one named_graph, or a set of
+    named_graphs (or neither)
+
+    :param named_graph: the one named_graph of the select
+    :type named_graph: Optional[str]
+    :param named_graphs: the named_graphs of the select
+    :type named_graphs: Optional[Iterable[str]]
+    :return: the named_graphs (without duplicates), None if not given
+    :rtype: Optional[List[str]]
+    """
+    if named_graphs is None:
+        return None
+    assert named_graph is None, "narrow to named_graph or named_graphs"
+    named_graphs = list(dict.fromkeys(str(ng) for ng in named_graphs))
+    assert named_graphs, "named_graphs should hold at least one named_graph"
+    return named_graphs
+
+
+def lastmod_update_sparql(
+    named_graph: str,
+    lastmod: datetime = None,
+    fingerprint: Optional[Tuple[str, int]] = None,
+) -> str:
+    """builds the single sparql update statement that replaces
+    the lastmod (and content fingerprint) of the named_graph in the admin-graph
+
+    :param named_graph: the named_graph to register the lastmod for
+    :type named_graph: str
+    :param lastmod: the new lastmod timestamp for this named_graph,
+      if None (or not provided) the named_graph is removed from the registry
+    :type lastmod: datetime
+    :param fingerprint: (optional) the hash and triple count of the content
+      of the named_graph, if None any recorded fingerprint is removed
+    :type fingerprint: Tuple[str, int]
+    :return: the sparql update statement
+    :rtype: str
+    """
+    adm: str = URIRef(ADMIN_NAMED_GRAPH).n3()
+    ng: str = URIRef(named_graph).n3()
+    olds: List[str] = [
+        f"{ng} {SCHEMA_DATEMODIFIED.n3()} ?lastmod",
+        f"{ng} {SCHEMA_SHA256.n3()} ?hash",
+        f"{ng} {VOID_TRIPLES.n3()} ?count",
+    ]
+    old: str = f"GRAPH {adm} {{ {' . '.join(olds)} }}"
+    where: str = " ".join(
+        f"OPTIONAL {{ GRAPH {adm} {{ {o} }} }}" for o in olds
+    )
+    if lastmod is None:
+        return f"DELETE {{ {old} }}\nWHERE {{ {where} }}"
+    # else
+    news: List[str] = [
+        f"{ng} {SCHEMA_DATEMODIFIED.n3()} {Literal(lastmod).n3()}"
+    ]
+    if fingerprint is not None:
+        hash, count = fingerprint
+        news.append(f"{ng} {SCHEMA_SHA256.n3()} {Literal(hash).n3()}")
+        news.append(f"{ng} {VOID_TRIPLES.n3()} {Literal(count).n3()}")
+    new: str = f"GRAPH {adm} {{ {' . '.join(news)} }}"
+    return f"DELETE {{ {old} }}\nINSERT {{ {new} }}\nWHERE {{ {where} }}"
+
+
 class GraphNameMapper:
     """Helper class to convert external keys objects into graph-names."""
 
@@ -71,10 +577,19 @@ class GraphNameMapper:
         :returns: list of str representation sof identifier key objects found
         :rtype: List[str]
         """
+        return self.named_graphs_to_keys(store.named_graphs)
+
+    def named_graphs_to_keys(self, ngs: Iterable[str]) -> Iterable[str]:
+        """selects those named graphs under our base
+        and converts them into travharv config names
+
+        :param ngs: the named_graphs to filter and convert
+        :type ngs: Iterable[str]
+        :returns: list of str representation sof identifier key objects found
+        :rtype: List[str]
+        """
         return [
-            self.ng_to_key(ng)
-            for ng in store.named_graphs
-            if ng.startswith(self._base)
+            self.ng_to_key(ng) for ng in ngs if ng.startswith(self._base)
         ]  # filter and convert the named_graphs to config names we handle
 
 
@@ -87,12 +602,19 @@ class RDFStore(ABC):
     """
 
     def __init__(
-        self, *, cleaner: Callable = None, mapper: GraphNameMapper = None
+        self,
+        *,
+        cleaner: Callable = None,
+        mapper: GraphNameMapper = None,
+        touch_unchanged: Optional[bool] = None,
     ):
         """Constructor
         :param cleaner: function to clean graphs before insert
         :param mapper: helper class to convert custom key types of any type
         to/from valid named_graph uri-strings
+        :param touch_unchanged: refresh the lastmod when an insert_for_key
+        with if_changed is skipped for unchanged content,
+        defaults to the RDFSTORE_TOUCH_UNCHANGED env variable or else True
         """
         # TODO reconsider the default below as soon as upper layers start
         # dealing with cleaning config themselves
@@ -101,6 +623,11 @@ class RDFStore(ABC):
         # always ensure a no-op callable
         self._cleaner: Callable = cleaner or (lambda graph: graph)
         self._nmapper: GraphNameMapper = mapper or GraphNameMapper()
+        self._touch_unchanged: bool = (
+            touch_unchanged
+            if touch_unchanged is not None
+            else touch_unchanged_from_env()
+        )
 
     def clean(self, graph: Graph) -> Graph:
         """Cleans the graph as suggested by the constructor setting"""
@@ -113,7 +640,9 @@ class RDFStore(ABC):
         """
         return self._nmapper.key_to_ng(key)
 
-    def insert_for_key(self, graph: Graph, key: str) -> None:
+    def insert_for_key(
+        self, graph: Graph, key: str, if_changed: bool = False
+    ) -> Optional[bool]:
         """inserts the triples from the passed graph
         into a graph tied to the key
 
@@ -121,11 +650,47 @@ class RDFStore(ABC):
         :type graph: Graph
         :param key: the identifier key
         :type key: str
-        :rtype: None
+        :param if_changed: (optional) only upload if the content differs
+          from the fingerprint recorded for the graph, in which case the
+          graph replaces the current content (see replace_if_changed),
+          defaults to False
+        :type if_changed: bool
+        :return: None, or if_changed indication if the content was uploaded
+        :rtype: Optional[bool]
         """
         ng: str = self.named_graph_for_key(key)
+        if if_changed:
+            return self.replace_if_changed(graph, ng)
+        # else
         return self.insert(graph, ng)
 
+    def replace_for_key(self, graph: Graph, key: Any) -> None:
+        """replaces the content of the graph tied to the key
+        with the triples from the passed graph
+
+        :param graph: the graph of triples forming the new content
+        :type graph: Graph
+        :param key: the identifier key
+        :type key: Any
+        :rtype: None
+        """
+        ng: str = self.named_graph_for_key(key)
+        return self.replace_graph(graph, ng)
+
+    def sync_graph_for_key(self, graph: Graph, key: Any) -> bool:
+        """makes the content of the graph tied to the key equal to
+        the passed graph, by only sending the triples that changed
+
+        :param graph: the graph of triples forming the new content
+        :type graph: Graph
+        :param key: the identifier key
+        :type key: Any
+        :return: True if anything changed
+        :rtype: bool
+        """
+        ng: str = self.named_graph_for_key(key)
+        return self.sync_graph(graph, ng)
+
     def verify_max_age_of_key(
         self, key: Any, age_minutes: int = 0, reference_time: datetime = None
     ) -> bool:
@@ -152,6 +717,34 @@ class RDFStore(ABC):
             ng, age_minutes=age_minutes, reference_time=reference_time
         )
 
+    def verify_max_age_of_keys(
+        self,
+        keys: Iterable[Any],
+        age_minutes: int = 0,
+        reference_time: datetime = None,
+    ) -> Dict[Any, bool]:
+        """bulk variant of verify_max_age_of_key for many keys at once
+
+        :param keys: the identifier keys to check
+        :type keys: Iterable[Any]
+        :param age_minutes: the max acceptable age in minutes
+         - optional, defaults to 0
+        :type age_minutes: int
+        :param reference_time: the basis for the comparison
+         - optional, defaults to now()
+        :type reference_time: datetime
+        :return: per key True if its associated graph has aged less than
+        the passed number of minutes versus the reference_time, else False
+        :rtype: Dict[Any, bool]
+        """
+        ng_per_key = {key: self.named_graph_for_key(key) for key in keys}
+        young = self.verify_max_age_many(
+            ng_per_key.values(),
+            age_minutes=age_minutes,
+            reference_time=reference_time,
+        )
+        return {key: young[ng] for key, ng in ng_per_key.items()}
+
     @property
     def keys(self) -> Iterable[str]:
         """returns the known & managed identifier keys in the store
@@ -162,6 +755,26 @@ class RDFStore(ABC):
         """
         return self._nmapper.get_keys_in_store(self)
 
+    def stale_keys(
+        self, age_minutes: int = 0, reference_time: datetime = None
+    ) -> Iterable[str]:
+        """returns the known & managed identifier keys in the store
+        whose graph has aged more than the age_minutes versus the
+        reference_time, i.e. those not passing verify_max_age_of_key
+
+        :param age_minutes: the max acceptable age in minutes
+         - optional, defaults to 0
+        :type age_minutes: int
+        :param reference_time: the basis for the comparison
+         - optional, defaults to now()
+        :type reference_time: datetime
+        :return: the list of identifier keys in need of a refresh
+        :rtype: List[str]
+        """
+        return self._nmapper.named_graphs_to_keys(
+            self.stale_named_graphs(age_minutes, reference_time)
+        )
+
     def drop_graph_for_key(self, key: Any) -> None:
         """drops the content in graph associated to specified identifier key
         (and all its contents)
@@ -186,8 +799,27 @@ class RDFStore(ABC):
         ng: str = self.named_graph_for_key(key)
         return self.forget_graph(ng)
 
+    def close(self) -> None:
+        """releases any resources (like connections) held by the store
+        Note: the base implementation has nothing to release
+        """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
     @abstractmethod
-    def select(self, sparql: str, named_graph: Optional[str]) -> Result:
+    def select(
+        self,
+        sparql: str,
+        named_graph: Optional[str],
+        *,
+        bindings: Optional[Bindings] = None,
+        named_graphs: Optional[Iterable[str]] = None,
+    ) -> Union[Result, List[Result]]:
         """executes a sparql select query, possibly narrowed to
         the named_grap it represents
 
@@ -196,11 +828,65 @@ class RDFStore(ABC):
         :param named_graph: the uri describing the named_graph into which
           the select should be narrowed
         :type named_graph: str
-        :return: the result of the query
-        :rtype: Result
+        :param bindings: (optional) values for variables of the query,
+          as one dict (variable name to rdflib term, or plain python value
+          taken as Literal), or a list of those to run the query for each
+          of them, which implementations may evaluate in one go
+        :type bindings: Optional[Bindings]
+        :param named_graphs: (optional) the uris of the named_graphs into
+          which the select should be narrowed (instead of named_graph),
+          their union being the default graph of the query
+        :type named_graphs: Optional[Iterable[str]]
+        :return: the result of the query, or the list of results (one per
+          binding, in their order) for a list of bindings
+        :rtype: Union[Result, List[Result]]
         """
         pass  # pragma: no cover
 
+    def select_iter(
+        self,
+        sparql: str,
+        named_graph: Optional[str] = None,
+        page_size: Optional[int] = None,
+        *,
+        named_graphs: Optional[Iterable[str]] = None,
+    ) -> Iterator[ResultRow]:
+        """executes a sparql select query, possibly narrowed to
+        the named_graph, yielding the result rows page by page.
+        The query gets a stable ORDER BY (if it had none) and is executed
+        with a LIMIT and increasing OFFSET, so only one page of rows is
+        held in memory at any time.
+
+        :param sparql: the select query to execute,
+          it should not have its own LIMIT or OFFSET
+        :type sparql: str
+        :param named_graph: the uri describing the named_graph into which
+          the select should be narrowed
+        :type named_graph: str
+        :param page_size: (optional) the number of rows per page
+         - defaults to 10000
+        :type page_size: int
+        :param named_graphs: (optional) the named_graphs into which the
+          select should be narrowed, see select
+        :type named_graphs: Optional[Iterable[str]]
+        :return: the rows of the result
+        :rtype: Iterator[ResultRow]
+        """
+        page_size = page_size or DEFAULT_PAGE_SIZE
+        order: str = paging_order(sparql)
+        offset: int = 0
+        if named_graphs is not None:
+            named_graphs = list(named_graphs)  # iterated for every page
+        while True:
+            paged = paged_select(sparql, order, page_size, offset)
+            page: Result = self.select(
+                paged, named_graph, named_graphs=named_graphs
+            )
+            yield from page
+            if len(page) < page_size:
+                return
+            offset += page_size
+
     @abstractmethod
     def insert(self, graph: Graph, named_graph: Optional[str] = None) -> None:
         """inserts the triples from the passed graph into
@@ -215,6 +901,146 @@ class RDFStore(ABC):
         """
         pass  # pragma: no cover
 
+    def replace_graph(self, graph: Graph, named_graph: str) -> None:
+        """replaces the content of the named_graph with the triples
+        from the passed graph, leaving one lastmod trail in the admin-graph
+        Note: the base implementation simply drops and inserts,
+        implementations should override this to make it atomic
+
+        :param graph: the graph of triples forming the new content
+        :type graph: Graph
+        :param named_graph: the uri describing the named_graph to replace
+        :type named_graph: str
+        :rtype: None
+        """
+        self.drop_graph(named_graph)
+        self.insert(graph, named_graph)
+
+    def fingerprint(self, named_graph: str) -> Optional[Tuple[str, int]]:
+        """returns the content fingerprint recorded in the admin-graph
+        when the named_graph was last replaced or synced
+        Note: the base implementation records nothing, and so returns None
+
+        :param named_graph: the uri describing the named_graph
+        :type named_graph: str
+        :return: the hash and triple count (see content_fingerprint),
+          None if no fingerprint of the current content is known
+        :rtype: Optional[Tuple[str, int]]
+        """
+        return None
+
+    def replace_if_changed(self, graph: Graph, named_graph: str) -> bool:
+        """replaces the content of the named_graph with the triples
+        from the passed graph, unless its fingerprint matches the recorded
+        one. In that case nothing is uploaded, and the lastmod is refreshed
+        or left alone depending on the touch_unchanged setting.
+
+        :param graph: the graph of triples forming the new content
+        :type graph: Graph
+        :param named_graph: the uri describing the named_graph to replace
+        :type named_graph: str
+        :return: True if the content was uploaded
+        :rtype: bool
+        """
+        replacement: Graph = self.clean(graph)
+        fingerprint = content_fingerprint(replacement, named_graph)
+        if fingerprint != self.fingerprint(named_graph):
+            self._replace_cleaned(replacement, named_graph, fingerprint)
+            return True
+        # else
+        log.debug(f"skipping upload of unchanged content to {named_graph=}")
+        if self._touch_unchanged:
+            self._refresh_lastmod(named_graph, fingerprint)
+        return False
+
+    def _replace_cleaned(
+        self, graph: Graph, named_graph: str, fingerprint: Tuple[str, int]
+    ) -> None:
+        """replaces the content of the named_graph with the already cleaned
+        graph, of which the fingerprint is known
+        Note: the base implementation calls replace_graph (so cleans and
+        fingerprints again), implementations should override this
+        """
+        self.replace_graph(graph, named_graph)
+
+    def _refresh_lastmod(
+        self, named_graph: str, fingerprint: Tuple[str, int]
+    ) -> None:
+        """sets the lastmod to now, keeping the fingerprint
+        Note: implementations recording fingerprints should override this
+        """
+        pass  # pragma: no cover
+
+    def sync_graph(self, graph: Graph, named_graph: str) -> bool:
+        """makes the content of the named_graph equal to the passed graph
+        by comparing it to the current content, and then only removing
+        and adding the triples that differ.
+        The lastmod is only updated if anything actually changed.
+        Blank nodes (and the skolem iris stores make of them) are
+        skolemized to stable iris on both sides (see stable_relabelled)
+        so unchanged blank node content yields no difference. Stores that
+        keep blank nodes get the added ones as blank nodes again.
+
+        :param graph: the graph of triples forming the new content
+        :type graph: Graph
+        :param named_graph: the uri describing the named_graph to sync
+        :type named_graph: str
+        :return: True if anything changed
+        :rtype: bool
+        """
+        assert named_graph is not None, "only named_graphs can be synced"
+        incoming, _ = stable_relabelled(self.clean(graph), named_graph)
+        fingerprint = content_fingerprint(incoming, named_graph)
+        if fingerprint == self.fingerprint(named_graph):
+            log.debug(f"unchanged fingerprint of {named_graph=}")
+            return False
+        # else compare with the actual content, labelled alike
+        current, stored = stable_relabelled(
+            self.fetch_graph(named_graph), named_graph
+        )
+        removed: Graph = _as_stored(current - incoming, stored)
+        added: Graph = _as_stored(incoming - current, stored)
+        if len(removed) == 0 and len(added) == 0:
+            log.debug(f"no changes to sync into {named_graph=}")
+            return False
+        # else
+        log.debug(
+            f"syncing {len(removed)=} and {len(added)=} into {named_graph=}"
+        )
+        self._apply_diff(named_graph, removed, added, fingerprint)
+        return True
+
+    def _apply_diff(
+        self,
+        named_graph: str,
+        removed: Graph,
+        added: Graph,
+        fingerprint: Tuple[str, int],
+    ) -> None:
+        """removes and adds the triples to the named_graph,
+        and updates its lastmod and fingerprint
+        Note: the base implementation replaces the complete content,
+        implementations should override this to only send the diff
+        """
+        content: Graph = self.fetch_graph(named_graph)
+        content -= removed
+        content += added
+        self.replace_graph(content, named_graph)
+
+    def fetch_graph(self, named_graph: str) -> Graph:
+        """retrieves the complete content of the named_graph
+
+        :param named_graph: the uri describing the named_graph to fetch
+        :type named_graph: str
+        :return: the triples in the named_graph, empty if it is unknown
+        :rtype: Graph
+        """
+        result: Result = self.select(CONSTRUCT_ALL_SPO, named_graph)
+        graph = Graph(**g_cfg_kwargs)
+        for triple in result:
+            graph.add(triple)
+        return graph
+
     def verify_max_age(
         self,
         named_graph: str,
@@ -240,13 +1066,74 @@ class RDFStore(ABC):
         minutes in the argument versus the reference_time, else False
         :rtype: bool
         """
-        named_graph_lastmod = self.lastmod_ts(named_graph)
-        if named_graph_lastmod is None:
-            return False
-        named_graph_lastmod = named_graph_lastmod.astimezone(UTC_tz)
+        return is_younger(
+            self.lastmod_ts(named_graph), age_minutes, reference_time
+        )
+
+    def verify_max_age_many(
+        self,
+        named_graphs: Iterable[str],
+        age_minutes: int = 0,
+        reference_time: datetime = None,
+    ) -> Dict[str, bool]:
+        """bulk variant of verify_max_age for many named_graphs at once
+
+        :param named_graphs: the uris describing the named_graphs to check
+        :type named_graphs: Iterable[str]
+        :param age_minutes: the max acceptable age in minutes
+         - optional, defaults to 0
+        :type age_minutes: int
+        :param reference_time: the basis for the comparison
+         - optional, defaults to now()
+        :type reference_time: datetime
+        :return: per named_graph True if it has aged less than the passed
+        number of minutes versus the reference_time, else False
+        :rtype: Dict[str, bool]
+        """
         reference_time = reference_time or timestamp()
-        timelapsed: timedelta = reference_time - named_graph_lastmod
-        return bool(timelapsed.total_seconds() <= age_minutes * 60)
+        return {
+            ng: is_younger(lastmod, age_minutes, reference_time)
+            for ng, lastmod in self.lastmod_ts_many(named_graphs).items()
+        }
+
+    def stale_named_graphs(
+        self, age_minutes: int = 0, reference_time: datetime = None
+    ) -> Iterable[str]:
+        """returns the known & managed named_graphs in the store
+        that have aged more than the age_minutes versus the reference_time,
+        i.e. those not passing verify_max_age
+        Note: the base implementation compares all lastmods locally,
+        implementations should override this with a more efficient lookup
+
+        :param age_minutes: the max acceptable age in minutes
+         - optional, defaults to 0
+        :type age_minutes: int
+        :param reference_time: the basis for the comparison
+         - optional, defaults to now()
+        :type reference_time: datetime
+        :return: the list of named_graphs in need of a refresh
+        :rtype: List[str]
+        """
+        young = self.verify_max_age_many(
+            self.named_graphs, age_minutes, reference_time
+        )
+        return [ng for ng, is_young in young.items() if not is_young]
+
+    def lastmod_ts_many(
+        self, named_graphs: Iterable[str]
+    ) -> Dict[str, Optional[datetime]]:
+        """bulk variant of lastmod_ts for many named_graphs at once
+        Note: the base implementation simply asks them one by one,
+        implementations should override this with a more efficient lookup
+
+        :param named_graphs: the uris describing the named_graphs to get
+          the lastmod timestamp of
+        :type named_graphs: Iterable[str]
+        :return: the time of last modification per named_graph,
+          None for unknown named_graphs
+        :rtype: Dict[str, Optional[datetime]]
+        """
+        return {ng: self.lastmod_ts(ng) for ng in named_graphs}
 
     @abstractmethod
     def lastmod_ts(self, named_graph: str) -> datetime:
@@ -308,42 +1195,285 @@ class RDFStore(ABC):
         pass  # pragma: no cover
 
 
+def touch_unchanged_from_env() -> bool:
+    """returns if the lastmod of unchanged content should be refreshed
+    as configured in the environment via RDFSTORE_TOUCH_UNCHANGED (0 or 1)
+    or else True
+    """
+    return bool(int(os.getenv("RDFSTORE_TOUCH_UNCHANGED", 1)))
+
+
+def registry_ttl_from_env() -> Optional[float]:
+    """returns the time-to-live (in seconds) of the admin-registry cache
+    configured in the environment via RDFSTORE_REGISTRY_TTL
+    or else None, indicating not to cache at all
+    """
+    ttl = os.getenv("RDFSTORE_REGISTRY_TTL", None)
+    return float(ttl) if ttl else None
+
+
+class LastmodCache:
+    """Thread-safe in-process copy of the lastmod registry (admin-graph)
+    Updated as a side effect of the writes made by this process,
+    and completely reloaded once older than the time-to-live,
+    so writes made by other processes eventually show up as well.
+    """
+
+    def __init__(self, loader: Callable[[], Dict[str, datetime]], ttl: float):
+        """constructor
+
+        :param loader: function loading the complete registry
+        :type loader: Callable[[], Dict[str, datetime]]
+        :param ttl: time-to-live in seconds before reloading
+        :type ttl: float
+        """
+        self._loader = loader
+        self._ttl: float = ttl
+        self._lock = threading.Lock()
+        self._lastmods: Optional[Dict[str, datetime]] = None
+        self._expires: float = 0
+
+    def _current(self) -> Dict[str, datetime]:
+        # to be called holding the lock
+        if self._lastmods is None or monotonic() >= self._expires:
+            log.debug("(re)loading the lastmod registry cache")
+            self._lastmods = self._loader()
+            self._expires = monotonic() + self._ttl
+        return self._lastmods
+
+    def get(self, named_graph: str) -> Optional[datetime]:
+        """the lastmod of the named_graph, None if unknown"""
+        with self._lock:
+            return self._current().get(named_graph)
+
+    def get_many(
+        self, named_graphs: Iterable[str]
+    ) -> Dict[str, Optional[datetime]]:
+        """the lastmod per named_graph, None for the unknown ones"""
+        with self._lock:
+            lastmods = self._current()
+            return {ng: lastmods.get(ng) for ng in named_graphs}
+
+    def snapshot(self) -> Dict[str, datetime]:
+        """a copy of the complete lastmod registry"""
+        with self._lock:
+            return dict(self._current())
+
+    def set(self, named_graph: str, lastmod: Optional[datetime]) -> None:
+        """writes through the change of lastmod for the named_graph
+        a None lastmod removes (forgets) the named_graph
+        """
+        with self._lock:
+            if self._lastmods is None:
+                return  # nothing loaded yet, so nothing to update
+            if lastmod is None:
+                self._lastmods.pop(named_graph, None)
+            else:
+                self._lastmods[named_graph] = lastmod
+
+    def invalidate(self) -> None:
+        """forces a reload on the next access"""
+        with self._lock:
+            self._lastmods = None
+
+
+def query_cache_size_from_env() -> int:
+    """returns the max number of prepared queries to keep, configured in
+    the environment via RDFSTORE_QUERY_CACHE_SIZE or else the
+    DEFAULT_QUERY_CACHE_SIZE
+    """
+    return int(
+        os.getenv("RDFSTORE_QUERY_CACHE_SIZE", DEFAULT_QUERY_CACHE_SIZE)
+    )
+
+
+class PreparedQueries:
+    """Thread-safe bounded LRU of prepared queries (i.e. parsed and
+    translated to sparql algebra) keyed by their text, so repeated
+    selects skip straight to the evaluation.
+    The hits and misses are counted to help sizing it.
+    """
+
+    def __init__(self, max_size: Optional[int] = None):
+        """constructor
+
+        :param max_size: (optional) the max number of queries to keep,
+          defaults to the RDFSTORE_QUERY_CACHE_SIZE env variable or else 256
+        :type max_size: int
+        """
+        self.max_size: int = max_size or query_cache_size_from_env()
+        assert self.max_size > 0, f"size should be positive {max_size=}"
+        self._queries: "OrderedDict[str, Query]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self) -> int:
+        return len(self._queries)
+
+    def get(self, sparql: str) -> Query:
+        """the prepared query for the sparql, preparing it if not cached
+
+        :param sparql: the text of the query
+        :type sparql: str
+        :return: the prepared query
+        :rtype: Query
+        """
+        with self._lock:
+            query: Optional[Query] = self._queries.get(sparql)
+            if query is not None:
+                self._queries.move_to_end(sparql)
+                self.hits += 1
+                return query
+            self.misses += 1
+        # prepare outside the lock, not blocking the hits meanwhile
+        query = prepareQuery(sparql)
+        with self._lock:
+            self._queries[sparql] = query
+            while len(self._queries) > self.max_size:
+                self._queries.popitem(last=False)
+        return query
+
+    def clear(self) -> None:
+        with self._lock:
+            self._queries.clear()
+
+
 class URIRDFStore(RDFStore):
     """This class is used to connect to a SPARQL endpoint and execute
     SPARQL queries
 
-    :param read_uri: The URI of the SPARQL endpoint to read from
-    :type read_uri: str
+    :param read_uri: The URI of the SPARQL endpoint to read from,
+      or a list of URIs of equivalent (replicated) endpoints to spread the
+      reads over. The first of these is considered the primary, i.e. the
+      one backed by the write_uri.
+    :type read_uri: Union[str, List[str]]
     :param write_uri: The URI of the SPARQL endpoint to write to.
       If not provided, the store can only be read from, not updated.
     :type write_uri: Optional[str]
+    :param gsp_uri: The URI of the SPARQL 1.1 Graph Store HTTP Protocol
+      service. If provided, it is used to insert, drop and fetch whole
+      named_graphs, the admin-graph is still managed via the write_uri.
+    :type gsp_uri: Optional[str]
+    :param gsp_format: the wire format for the graph store protocol,
+      one of 'nt' or 'turtle', defaults to 'nt'
+    :type gsp_format: str
+    :param pool_size: max number of simultaneous keep-alive connections
+      shared by all threads using this store,
+      defaults to the RDFSTORE_POOL_SIZE env variable or else 8
+    :type pool_size: Optional[int]
+    :param batch_triples: max number of triples sent per insert request,
+      defaults to the RDFSTORE_BATCH_TRIPLES env variable or else 10000
+    :type batch_triples: Optional[int]
+    :param batch_bytes: max size in bytes of the triples per insert request,
+      defaults to the RDFSTORE_BATCH_BYTES env variable or else 4MiB
+    :type batch_bytes: Optional[int]
+    :param upload_workers: max number of insert batches sent in parallel,
+      defaults to the RDFSTORE_UPLOAD_WORKERS env variable or else 4
+    :type upload_workers: Optional[int]
+    :param registry_ttl: time-to-live in seconds of an in-process cache of
+      the admin-graph, defaults to the RDFSTORE_REGISTRY_TTL env variable
+      or else None, meaning the registry is not cached (as does 0)
+    :type registry_ttl: Optional[float]
+    :param touch_unchanged: refresh the lastmod when an insert_for_key
+      with if_changed is skipped for unchanged content, defaults to the
+      RDFSTORE_TOUCH_UNCHANGED env variable or else True
+    :type touch_unchanged: Optional[bool]
+    :param compression: content-encoding ('gzip' or 'deflate') of the
+      bodies of update and graph store requests, also accepted on
+      responses, defaults to the RDFSTORE_COMPRESSION env variable
+      or else None, meaning no compression
+    :type compression: Optional[str]
+    :param balance: how to spread reads over multiple read_uri,
+      one of 'round_robin' or 'least_outstanding', defaults to 'round_robin'
+    :type balance: str
+    :param eject_seconds: how long a failing read endpoint is avoided,
+      defaults to 30
+    :type eject_seconds: Optional[float]
+    :param read_your_writes: window in seconds after a write to a
+      named_graph in which its reads are routed to the primary read_uri,
+      defaults to None, meaning reads are always spread
+    :type read_your_writes: Optional[float]
     """
 
     def __init__(
         self,
-        read_uri: str,
+        read_uri: Union[str, List[str]],
         write_uri: Optional[str] = None,
+        gsp_uri: Optional[str] = None,
         *,
         cleaner: Callable = None,
         mapper: GraphNameMapper = None,
+        gsp_format: str = "nt",
+        pool_size: Optional[int] = None,
+        batch_triples: Optional[int] = None,
+        batch_bytes: Optional[int] = None,
+        upload_workers: Optional[int] = None,
+        registry_ttl: Optional[float] = None,
+        touch_unchanged: Optional[bool] = None,
+        compression: Optional[str] = None,
+        balance: str = "round_robin",
+        eject_seconds: Optional[float] = None,
+        read_your_writes: Optional[float] = None,
     ):
-        super().__init__(cleaner=cleaner, mapper=mapper)
+        super().__init__(
+            cleaner=cleaner, mapper=mapper, touch_unchanged=touch_unchanged
+        )
         self.allows_update = False
+        read_uris: List[str] = (
+            [read_uri] if isinstance(read_uri, str) else list(read_uri)
+        )
+        read_uri = read_uris[0]
+        self._balancer: Optional[ReadBalancer] = (
+            ReadBalancer(read_uris, balance, eject_seconds)
+            if len(read_uris) > 1
+            else None
+        )
+        self._read_your_writes: Optional[float] = read_your_writes
+        self._written: Dict[Optional[str], float] = dict()
+        # parsed (locally) to fold the bindings of selects
+        self._queries = PreparedQueries()
+        self._batch_triples = batch_triples
+        self._batch_bytes = batch_bytes
+        self._upload_workers = upload_workers
+        if registry_ttl is None:  # an explicit 0 disables the cache
+            registry_ttl = registry_ttl_from_env()
+        self._registry_cache: Optional[LastmodCache] = (
+            LastmodCache(self._load_registry, registry_ttl)
+            if registry_ttl
+            else None
+        )
+        self._pool = HTTPConnectionPool(
+            maxsize=pool_size, compression=compression
+        )
+        self._gsp: Optional[GraphStoreClient] = None
+        if gsp_uri is not None:
+            assert (
+                write_uri is not None
+            ), "a gsp_uri requires a write_uri to manage the admin-graph"
+            self._gsp = GraphStoreClient(gsp_uri, self._pool, gsp_format)
+        self._local = threading.local()  # holds the per-thread store
         self._store_constr = None  # we will delay creating independent stores
         if write_uri is None:
 
             def store_constr_ro():
-                return SPARQLStore(query_endpoint=read_uri)
+                return PooledSPARQLStore(
+                    query_endpoint=read_uri,
+                    pool=self._pool,
+                    balancer=self._balancer,
+                )
 
             self._store_constr = store_constr_ro
         else:
 
             def store_constr_rw():
-                return SPARQLUpdateStore(
+                return PooledSPARQLUpdateStore(
                     query_endpoint=read_uri,
                     update_endpoint=write_uri,
                     method="POST",
                     autocommit=True,
+                    pool=self._pool,
+                    balancer=self._balancer,
                 )
 
             self.allows_update = True
@@ -351,37 +1481,412 @@ class URIRDFStore(RDFStore):
 
     @property
     def sparql_store(self):  # dynamically (delayed) build of the instance
-        return self._store_constr()
+        # rdflib stores keep per-instance edit-state, so each thread gets
+        # its own instance, while they all share the connections in the pool
+        store = getattr(self._local, "sparql_store", None)
+        if store is None:
+            store = self._store_constr()
+            self._local.sparql_store = store
+        return store
+
+    @contextmanager
+    def _reading(self, named_graph: Union[str, List[str], None] = None):
+        """routes the reads in this context to the primary endpoint,
+        if the named_graph (or any of a list of them, or with None: any
+        graph) was written recently
+        """
+        store = self.sparql_store
+        previous: Optional[str] = store.prefer_endpoint
+        graphs = (
+            named_graph if isinstance(named_graph, list) else [named_graph]
+        )
+        if previous is None and any(map(self._recently_written, graphs)):
+            store.prefer_endpoint = self._balancer.primary
+        try:
+            yield
+        finally:
+            store.prefer_endpoint = previous
+
+    def _recently_written(self, named_graph: Optional[str]) -> bool:
+        if self._balancer is None or not self._read_your_writes:
+            return False
+        # else
+        written: Optional[float] = self._written.get(named_graph)
+        return written is not None and (
+            monotonic() - written < self._read_your_writes
+        )
 
-    def select(self, sparql: str, named_graph: Optional[str] = None) -> Result:
-        log.debug(f"exec select {sparql=} into {named_graph=}")
-        if named_graph is not None:
-            select_graph = Graph(
-                store=self.sparql_store, identifier=named_graph, **g_cfg_kwargs
+    def _wrote(self, named_graph: str) -> None:
+        if self._balancer is None or not self._read_your_writes:
+            return
+        # else
+        now: float = monotonic()
+        self._written[named_graph] = now
+        self._written[None] = now  # i.e. the last write to any graph
+        if len(self._written) > 1024:  # forget what is out of the window
+            cutoff: float = now - self._read_your_writes
+            for ng, written in list(self._written.items()):
+                if written < cutoff:
+                    self._written.pop(ng, None)
+
+    def close(self) -> None:
+        """closes the pooled connections to the endpoints
+        Note: the store remains usable, connections get reopened on demand
+        """
+        self._pool.close()
+
+    def select(
+        self,
+        sparql: str,
+        named_graph: Optional[str] = None,
+        result_format: Optional[str] = None,
+        raw: bool = False,
+        *,
+        bindings: Optional[Bindings] = None,
+        named_graphs: Optional[Iterable[str]] = None,
+    ) -> Union[Result, RawRows, List[Result]]:
+        """executes a sparql select query, possibly narrowed to
+        the named_grap it represents
+
+        :param sparql: the query-statement to execute
+        :type sparql: str
+        :param named_graph: the uri describing the named_graph into which
+          the select should be narrowed
+        :type named_graph: str
+        :param result_format: (optional) the results format to request
+          from the endpoint, one of 'tsv', 'csv', 'json' or 'xml'.
+          The tsv, csv and json formats are parsed with a fast path.
+          If not provided (and not raw) rdflib negotiates and parses.
+        :type result_format: str
+        :param raw: (optional) return the rows as tuples of undecoded
+          strings, rather than a Result of rdflib terms,
+          defaults to False, if True the result_format defaults to 'tsv'
+        :type raw: bool
+        :param bindings: (optional) values for variables of the query,
+          see RDFStore.select. These are sent as a VALUES block, a list of
+          bindings folding into one block per request (of up to 500)
+        :type bindings: Optional[Bindings]
+        :param named_graphs: (optional) the named_graphs into which the
+          select should be narrowed, all sent (as default-graph-uri) in
+          one request, see RDFStore.select
+        :type named_graphs: Optional[Iterable[str]]
+        :return: the result of the query
+        :rtype: Result (or RawRows if raw, or a list of results)
+        """
+        named_graphs = narrowed_graphs(named_graph, named_graphs)
+        if bindings is not None:
+            assert not raw, "bindings need the parsed results"
+            return self._select_bindings(
+                sparql, named_graph, result_format, bindings, named_graphs
             )
-        else:
-            select_graph = Graph(store=self.sparql_store, **g_cfg_kwargs)
-        result: Result = select_graph.query(sparql)
+        log.debug(f"exec select {sparql=} into {named_graph=} {named_graphs=}")
+        with self._reading(named_graphs or named_graph):
+            if result_format is not None or raw or named_graphs is not None:
+                return self._select_as(
+                    sparql, named_graphs or named_graph, result_format, raw
+                )
+            # else
+            if named_graph is not None:
+                select_graph = Graph(
+                    store=self.sparql_store,
+                    identifier=named_graph,
+                    **g_cfg_kwargs,
+                )
+            else:
+                select_graph = Graph(store=self.sparql_store, **g_cfg_kwargs)
+            result: Result = select_graph.query(sparql)
         assert isinstance(result, Result), (
             "Failed getting proper result for:" f"{sparql=}, got {result=}"
         )
         log.debug(f"Result from SPARQLStore :: {type(result)=} -> {result=}")
         return result
 
+    def _select_bindings(
+        self,
+        sparql: str,
+        named_graph: Optional[str],
+        result_format: Optional[str],
+        bindings: Bindings,
+        named_graphs: Optional[List[str]],
+    ) -> Union[Result, List[Result]]:
+        single: bool = isinstance(bindings, Mapping)
+        binds = [
+            init_bindings(b) for b in ([bindings] if single else bindings)
+        ]
+        if not binds:
+            return list()
+        variables: List[Variable] = list(binds[0])
+        assert all(
+            set(bind) == set(variables) for bind in binds
+        ), "all bindings should bind the same variables"
+        query: Query = self._queries.get(sparql)
+        rows = [tuple(bind[var] for var in variables) for bind in binds]
+        # the positions of each (distinct) binding in the list
+        positions: Dict[tuple, List[int]] = dict()
+        for i, row in enumerate(rows):
+            positions.setdefault(row, list()).append(i)
+        projected: List[Variable] = query.algebra.PV
+        results: List[List[dict]] = [list() for _ in binds]
+        distinct: List[tuple] = list(positions)
+        if not foldable(query):  # their solutions would mix (aggregates)
+            for row in distinct:
+                folded = values_sparql(
+                    sparql, query, variables, [row], project=False
+                )
+                result = self.select(
+                    folded,
+                    named_graph,
+                    result_format,
+                    named_graphs=named_graphs,
+                )
+                for i in positions[row]:
+                    results[i] = result.bindings
+            distinct = list()
+        for start in range(0, len(distinct), VALUES_CHUNK):
+            chunk = distinct[start:][:VALUES_CHUNK]
+            folded: str = values_sparql(sparql, query, variables, chunk)
+            result: Result = self.select(
+                folded, named_graph, result_format, named_graphs=named_graphs
+            )
+            for solution in result.bindings:
+                key = tuple(solution.get(var) for var in variables)
+                solution = {
+                    var: term
+                    for var, term in solution.items()
+                    if var in projected
+                }
+                assert key in positions, f"solution {key=} of no binding"
+                for i in positions[key]:
+                    results[i].append(solution)
+        selects: List[Result] = list()
+        for solutions in results:
+            select = Result("SELECT")
+            select.vars = list(projected)
+            select.bindings = solutions
+            selects.append(select)
+        return selects[0] if single else selects
+
+    def _select_as(
+        self,
+        sparql: str,
+        default_graph: Union[str, List[str], None],
+        result_format: Optional[str],
+        raw: bool,
+    ) -> Union[Result, RawRows]:
+        if result_format is None and not raw:  # negotiated, as by rdflib
+            resp = self.sparql_store.query_response(sparql, default_graph)
+            return Result.parse(
+                BytesIO(resp.data), content_type=resp.content_type
+            )
+        # else
+        result_format = result_format or "tsv"
+        assert result_format in RESULT_FORMATS, (
+            f"Unsupported {result_format=}. "
+            f"Should be one of {list(RESULT_FORMATS)}"
+        )
+        resp = self.sparql_store.query_response(
+            sparql, default_graph, accept=RESULT_FORMATS[result_format]
+        )
+        return parse_results(resp.data, resp.content_type, raw)
+
     def insert(self, graph: Graph, named_graph: Optional[str] = NIL_NS):
-        graph = self.clean(graph)
+        self._write(self.clean(graph), named_graph)
+
+    def replace_graph(self, graph: Graph, named_graph: str) -> None:
+        assert named_graph is not None, "only named_graphs can be replaced"
+        replacement: Graph = self.clean(graph)
+        self._replace_cleaned(
+            replacement,
+            named_graph,
+            content_fingerprint(replacement, named_graph),
+        )
+
+    def _replace_cleaned(
+        self, graph: Graph, named_graph: str, fingerprint: Tuple[str, int]
+    ) -> None:
+        self._write(graph, named_graph, replace=True, fingerprint=fingerprint)
+
+    def _write(
+        self,
+        graph: Graph,
+        named_graph: Optional[str],
+        replace: bool = False,
+        fingerprint: Optional[Tuple[str, int]] = None,
+    ) -> None:
+        """inserts the (cleaned) graph, optionally replacing the current
+        content (of which the fingerprint is then registered).
+        When all fits in one batch, data and lastmod registry are written
+        in one request (i.e. atomically). Else the first batch (replacing
+        the content) is sent first, the others concurrently after that,
+        and the lastmod is only registered once all batches made it.
+        """
         assert (
             self.allows_update
         ), "data can not be inserted into a store if no write_uri is provided"
+        assert replace or fingerprint is None, "only replaced content"
         log.debug(f"insertion of {len(graph)=} into ({named_graph=})")
-        store_graph = Graph(
-            store=self.sparql_store, identifier=named_graph, **g_cfg_kwargs
+        batches = self._batched(triple_lines(graph.skolemize()))
+        heads = [b for b in (next(batches, None), next(batches, None)) if b]
+        if len(heads) < 2 and self._gsp is None and named_graph is not None:
+            # all fits in one request, together with the lastmod registry
+            lastmod = timestamp()
+            registry = lastmod_update_sparql(named_graph, lastmod, fingerprint)
+            if heads:
+                self._insert_batch(heads[0], named_graph, registry, replace)
+            else:
+                self._update(registry, drop=named_graph if replace else None)
+            return self._registered(named_graph, lastmod)
+        # else
+        if replace:
+            first = heads.pop(0) if heads else list()
+            self._insert_batch(first, named_graph, replace=True)
+        upload(
+            chain(heads, batches),
+            lambda batch: self._insert_batch(batch, named_graph),
+            named_graph,
+            self._upload_workers,
+        )
+        if named_graph is not None:
+            self._update_registry_lastmod(
+                named_graph, timestamp(), fingerprint
+            )
+
+    def _insert_batch(
+        self,
+        batch: List[str],
+        named_graph: Optional[str],
+        registry: Optional[str] = None,
+        replace: bool = False,
+    ):
+        """sends one batch of triples in a single request
+        when the endpoint rejects it as too large (HTTP 413)
+        the batch is split in halves which are retried separately
+
+        :param batch: the serialized triples to insert
+        :type batch: List[str]
+        :param named_graph: the uri describing the named_graph into which
+          the batch should be inserted
+        :type named_graph: str
+        :param registry: (optional) sparql update of the lastmod registry
+          to send along in the same request
+        :type registry: str
+        :param replace: (optional) indicates the batch should replace
+          the current content of the named_graph, defaults to False
+        :type replace: bool
+        """
+        try:
+            self._send_batch(batch, named_graph, registry, replace)
+        except HTTPError as e:
+            if e.code != 413 or len(batch) < 2:
+                raise
+            log.warning(f"splitting rejected too large {len(batch)=}")
+            first, second = split(batch)
+            self._insert_batch(first, named_graph, replace=replace)
+            self._insert_batch(second, named_graph)
+            if registry is not None:
+                self._update(registry)
+
+    def _send_batch(
+        self,
+        batch: List[str],
+        named_graph: Optional[str],
+        registry: Optional[str] = None,
+        replace: bool = False,
+    ):
+        if self._gsp is not None:
+            if replace:
+                self._gsp.put(batch, named_graph)
+            else:
+                self._gsp.post(batch, named_graph)
+            if registry is not None:
+                self._update(registry)
+            return
+        # else use sparql INSERT DATA
+        statements = [insert_data(batch, named_graph)] if batch else []
+        if registry is not None:
+            statements.append(registry)
+        drop = named_graph if replace else None
+        self._update(" ;\n".join(statements), drop=drop)
+
+    def _apply_diff(
+        self,
+        named_graph: str,
+        removed: Graph,
+        added: Graph,
+        fingerprint: Tuple[str, int],
+    ) -> None:
+        """sends the removed and added triples as DELETE DATA and INSERT DATA
+        A diff that fits in one batch is sent in one request together with
+        the lastmod registry. Larger ones are sent concurrently in batches
+        (removed and added triples are disjoint, so their order is of no
+        importance), and the lastmod is registered after they all landed.
+        """
+        changes = chain(
+            ((delete_data, b) for b in self._batched(triple_lines(removed))),
+            ((insert_data, b) for b in self._batched(triple_lines(added))),
+        )
+        heads = list(islice(changes, 3))
+        size: int = sum(len(line) + 1 for _, b in heads for line in b)
+        max_bytes: int = self._batch_bytes or batch_bytes_from_env()
+        if len(heads) < 3 and size <= max_bytes:
+            lastmod = timestamp()
+            statements = [build(b, named_graph) for build, b in heads]
+            statements.append(
+                lastmod_update_sparql(named_graph, lastmod, fingerprint)
+            )
+            self._update(" ;\n".join(statements))
+            return self._registered(named_graph, lastmod)
+        # else
+        upload(
+            chain(heads, changes),
+            lambda change: self._diff_batch(*change, named_graph),
+            named_graph,
+            self._upload_workers,
         )
-        store_graph += graph.skolemize()
-        self._update_registry_lastmod(named_graph, timestamp())
+        self._update_registry_lastmod(named_graph, timestamp(), fingerprint)
+
+    def _batched(self, lines: Iterable[str]) -> Iterator[List[str]]:
+        return batched(lines, self._batch_triples, self._batch_bytes)
+
+    def _diff_batch(
+        self, build: Callable, batch: List[str], named_graph: str
+    ) -> None:
+        """sends one batch of the diff, splitting it when rejected as
+        too large (HTTP 413), like _insert_batch does for inserts
+        """
+        try:
+            self._update(build(batch, named_graph))
+        except HTTPError as e:
+            if e.code != 413 or len(batch) < 2:
+                raise
+            log.warning(f"splitting rejected too large {len(batch)=}")
+            for half in split(batch):
+                self._diff_batch(build, half, named_graph)
+
+    def _update(self, sparql: str, drop: Optional[str] = None) -> None:
+        """executes the sparql update statement in one request
+
+        :param sparql: the update statement(s) to execute
+        :type sparql: str
+        :param drop: (optional) named_graph to drop in the same request,
+          before executing the sparql
+        :type drop: str
+        """
+        if drop is not None:
+            drop_sparql = f"DROP SILENT GRAPH {URIRef(drop).n3()}"
+            sparql = f"{drop_sparql} ;\n{sparql}" if sparql else drop_sparql
+        sparql_store = self.sparql_store
+        try:
+            sparql_store.update(sparql)
+        except Exception:
+            sparql_store.rollback()  # avoid resending the failed statement
+            raise
 
     def _update_registry_lastmod(
-        self, named_graph: str, lastmod: datetime = None
+        self,
+        named_graph: str,
+        lastmod: datetime = None,
+        fingerprint: Optional[Tuple[str, int]] = None,
     ) -> Iterable[str]:
         """Consults and changes the admin-graph of lastmod entries
         per named_graph.
@@ -392,60 +1897,139 @@ class URIRDFStore(RDFStore):
         :param lastmod: the new lastmod timestamp for this named_graph,
           if None (or not provided) this will 'forget' the named_graph
         :type lastmod: datetime
+        :param fingerprint: (optional) the content fingerprint to record
+        :type fingerprint: Tuple[str, int]
         :return: the list of named_graphs in management
         :rtype: Iterable[str]
         """
-        graph_subject = (
-            URIRef(named_graph) if named_graph is not None else None
-        )
-        response = [named_graph] if named_graph is not None else None
-
+        if named_graph is not None:
+            self._update(
+                lastmod_update_sparql(named_graph, lastmod, fingerprint)
+            )
+            self._registered(named_graph, lastmod)
+            return [named_graph]
+        # else
+        if self._registry_cache is not None:
+            return list(self._registry_cache.snapshot())
+        # else
         adm_graph = Graph(
             store=self.sparql_store,
             identifier=ADMIN_NAMED_GRAPH,
             **g_cfg_kwargs,
         )
-
-        # construct what we are matching for
-        pattern = tuple(
-            (graph_subject, SCHEMA_DATEMODIFIED, None)
-        )  # missing subject or object functions as pattern
-        # remove any previous triple for this graph if it is specified
-        if graph_subject is not None:
-            adm_graph.remove(pattern)
-        else:
-            response = [
-                str(sub) for (sub, pred, obj) in adm_graph.triples(pattern)
-            ]
-
-        # insert the new data if provided
-        if graph_subject is not None and lastmod is not None:
-            triple = tuple(
-                (graph_subject, SCHEMA_DATEMODIFIED, Literal(lastmod))
-            )
-            adm_graph.add(triple)
-
-        return response
+        pattern = tuple((None, SCHEMA_DATEMODIFIED, None))
+        with self._reading(None):
+            triples = list(adm_graph.triples(pattern))
+        return [str(sub) for (sub, pred, obj) in triples]
+
+    def _registered(self, named_graph: str, lastmod: Optional[datetime]):
+        """writes through a successful change of the lastmod registry"""
+        if self._registry_cache is not None:
+            self._registry_cache.set(named_graph, lastmod)
+        self._wrote(named_graph)
+
+    def _load_registry(self) -> Dict[str, datetime]:
+        """loads the complete lastmod registry in one query"""
+        sparql = (
+            "SELECT ?g ?lastmod WHERE { "
+            f"GRAPH {URIRef(ADMIN_NAMED_GRAPH).n3()} {{ "
+            f"?g {SCHEMA_DATEMODIFIED.n3()} ?lastmod "
+            "} }"
+        )
+        return {str(row.g): row.lastmod.value for row in self.select(sparql)}
 
     def lastmod_ts(self, named_graph: str) -> datetime:
+        if self._registry_cache is not None:
+            return self._registry_cache.get(named_graph)
+        # else
         adm_graph = Graph(
             store=self.sparql_store,
             identifier=ADMIN_NAMED_GRAPH,
             **g_cfg_kwargs,
         )
-        lastmod: Literal = adm_graph.value(
-            URIRef(named_graph), SCHEMA_DATEMODIFIED
-        )
+        with self._reading(named_graph):
+            lastmod: Literal = adm_graph.value(
+                URIRef(named_graph), SCHEMA_DATEMODIFIED
+            )
         # above is None if nothing found,
         # else convert the literal to actual .value (datetime)
         return lastmod.value if lastmod is not None else None
 
-    def drop_graph(self, named_graph: str) -> None:
-        store_graph = Graph(
-            store=self.sparql_store, identifier=named_graph, **g_cfg_kwargs
+    def fingerprint(self, named_graph: str) -> Optional[Tuple[str, int]]:
+        ng: str = URIRef(named_graph).n3()
+        sparql = (
+            "SELECT ?sha256 ?triples WHERE { "
+            f"GRAPH {URIRef(ADMIN_NAMED_GRAPH).n3()} {{ "
+            f"{ng} {SCHEMA_SHA256.n3()} ?sha256 ; "
+            f"{VOID_TRIPLES.n3()} ?triples "
+            "} }"
         )
-        self.sparql_store.remove_graph(store_graph)
-        self._update_registry_lastmod(named_graph, timestamp())
+        for row in self.select(sparql):
+            return str(row.sha256), int(row.triples)
+        return None
+
+    def _refresh_lastmod(
+        self, named_graph: str, fingerprint: Tuple[str, int]
+    ) -> None:
+        self._update_registry_lastmod(named_graph, timestamp(), fingerprint)
+
+    def lastmod_ts_many(
+        self, named_graphs: Iterable[str]
+    ) -> Dict[str, Optional[datetime]]:
+        if self._registry_cache is not None:
+            return self._registry_cache.get_many(named_graphs)
+        # else
+        lastmods: Dict[str, Optional[datetime]] = {
+            ng: None for ng in named_graphs
+        }
+        names: List[str] = list(lastmods)
+        for start in range(0, len(names), LASTMOD_LOOKUP_CHUNK):
+            end: int = start + LASTMOD_LOOKUP_CHUNK
+            chunk = names[start:end]
+            values = " ".join(URIRef(ng).n3() for ng in chunk)
+            sparql = (
+                "SELECT ?g ?lastmod WHERE { "
+                f"GRAPH {URIRef(ADMIN_NAMED_GRAPH).n3()} {{ "
+                f"VALUES ?g {{ {values} }} "
+                f"?g {SCHEMA_DATEMODIFIED.n3()} ?lastmod "
+                "} }"
+            )
+            for row in self.select(sparql):
+                lastmods[str(row.g)] = row.lastmod.value
+        return lastmods
+
+    def stale_named_graphs(
+        self, age_minutes: int = 0, reference_time: datetime = None
+    ) -> Iterable[str]:
+        if self._registry_cache is not None:  # compare locally
+            return super().stale_named_graphs(age_minutes, reference_time)
+        # else
+        reference_time = reference_time or timestamp()
+        cutoff = reference_time - timedelta(minutes=age_minutes)
+        sparql = (
+            "SELECT ?g WHERE { "
+            f"GRAPH {URIRef(ADMIN_NAMED_GRAPH).n3()} {{ "
+            f"?g {SCHEMA_DATEMODIFIED.n3()} ?lastmod "
+            f"FILTER(?lastmod < {Literal(cutoff.astimezone(UTC_tz)).n3()}) "
+            "} }"
+        )
+        return [str(row.g) for row in self.select(sparql)]
+
+    def drop_graph(self, named_graph: str) -> None:
+        lastmod = timestamp()
+        registry = lastmod_update_sparql(named_graph, lastmod)
+        if self._gsp is not None:
+            self._gsp.delete(named_graph)
+            self._update(registry)
+        else:  # drop and register in one request
+            self._update(registry, drop=named_graph)
+        self._registered(named_graph, lastmod)
+
+    def fetch_graph(self, named_graph: str) -> Graph:
+        if self._gsp is not None:
+            return self._gsp.get(named_graph)
+        # else
+        return super().fetch_graph(named_graph)
 
     def forget_graph(self, named_graph: str) -> None:
         self._update_registry_lastmod(named_graph, None)
@@ -455,51 +2039,441 @@ class URIRDFStore(RDFStore):
         return self._update_registry_lastmod(None)
 
 
+class ReadWriteLock:
+    """Lock shared by any number of readers, or held by a single writer.
+    Waiting writers go first, so a steady flow of readers can not
+    starve them. Not reentrant.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers: int = 0
+        self._writing: bool = False
+        self._writers_waiting: int = 0
+
+    @contextmanager
+    def reading(self) -> Iterator[None]:
+        """holds the lock shared with other readers during the block"""
+        with self._condition:
+            while self._writing or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        """holds the lock exclusively during the block"""
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class NarrowedStore(Store):
+    """Read-only rdflib Store over some of the contexts of another
+    (context aware) store, so sparql can query just these as one dataset.
+    The default graph is their union, holding each triple once.
+    """
+
+    context_aware = True
+    graph_aware = True
+    formula_aware = False
+    transaction_aware = False
+
+    def __init__(self, store: Store, contexts: Iterable[Node]):
+        """constructor
+
+        :param store: the store holding the quads
+        :type store: Store
+        :param contexts: the identifiers of the contexts to keep
+        :type contexts: Iterable[Node]
+        """
+        super().__init__()
+        self._store: Store = store
+        self._contexts: frozenset = frozenset(contexts)
+
+    def _context(self, context: Node) -> Graph:
+        return Graph(store=self._store, identifier=context)
+
+    def triples(self, triple_pattern, context=None):
+        context = getattr(context, "identifier", context)
+        if context is not None:
+            if context in self._contexts:
+                yield from self._store.triples(
+                    triple_pattern, self._context(context)
+                )
+            return
+        # else the union, in which the backing store has each triple once
+        for triple, contexts in self._store.triples(triple_pattern):
+            kept = [
+                ctx
+                for ctx in contexts
+                if getattr(ctx, "identifier", ctx) in self._contexts
+            ]
+            if kept:
+                yield triple, iter(kept)
+
+    def __len__(self, context=None) -> int:
+        return sum(1 for _ in self.triples((None, None, None), context))
+
+    def contexts(self, triple=None) -> Iterator[Graph]:
+        for context in self._store.contexts(triple):
+            if getattr(context, "identifier", context) in self._contexts:
+                yield context
+
+    def add_graph(self, graph: Graph) -> None:
+        pass  # only the contexts of the backing store are known
+
+    def add(self, triple, context, quoted=False) -> None:
+        raise TypeError("the narrowed store is read-only")
+
+    def remove(self, triple, context=None) -> None:
+        raise TypeError("the narrowed store is read-only")
+
+
+def union_dataset(store: Union[str, Store] = "default") -> Dataset:
+    """a dataset on the rdflib store (or plugin name),
+    with the union of its graphs as the default graph
+
+    :param store: (optional) the store, defaults to a new in memory one
+    :type store: Union[str, Store]
+    :return: the dataset
+    :rtype: Dataset
+    """
+    dataset = Dataset(store=store, default_union=True)
+    dataset.namespace_manager = NamespaceManager(dataset, **g_cfg_kwargs)
+    return dataset
+
+
 class MemoryRDFStore(RDFStore):
-    # check if rdflib.Dataset could not help out here,
-    # such would allign more logically and elegantly?
+    """In memory store, keeping all named_graphs in one quad-indexed
+    rdflib Dataset. Selects without named_graph run over the live union
+    of all graphs, so no triple is held more than once.
+    Selects share a lock that writes hold exclusively, while applying
+    their (already prepared) changes. So a select sees any write either
+    completely or not at all, and gets its result complete before any
+    later write starts.
+    """
+
     def __init__(
-        self, *, cleaner: Callable = None, mapper: GraphNameMapper = None
+        self,
+        *,
+        cleaner: Callable = None,
+        mapper: GraphNameMapper = None,
+        touch_unchanged: Optional[bool] = None,
+        query_cache_size: Optional[int] = None,
     ):
-        super().__init__(cleaner=cleaner, mapper=mapper)
-        self._all: Graph = Graph(**g_cfg_kwargs)
-        self._named_graphs = dict()
+        """constructor
+
+        :param query_cache_size: (optional) the max number of prepared
+          queries to keep (see PreparedQueries), defaults to the
+          RDFSTORE_QUERY_CACHE_SIZE env variable or else 256
+        :type query_cache_size: int
+        """
+        super().__init__(
+            cleaner=cleaner, mapper=mapper, touch_unchanged=touch_unchanged
+        )
+        #: the prepared queries, with their hits and misses
+        self.query_cache = PreparedQueries(query_cache_size)
+        self._dataset: Dataset = union_dataset(self._backend())
+        self._lock = ReadWriteLock()
+        self._registry_lock = threading.Lock()
         self._admin_registry = dict()
+        self._fingerprints: Dict[str, Tuple[str, int]] = dict()
 
-    def select(self, sparql: str, named_graph: Optional[str] = None) -> Result:
-        target = (
-            self._named_graphs[named_graph]
-            if named_graph is not None
-            else self._all
+    def _backend(self) -> Union[str, Store]:
+        """the rdflib store (or plugin name) to keep the quads in"""
+        return "default"
+
+    @staticmethod
+    def _context(named_graph: Optional[str]) -> Node:
+        if named_graph is None:
+            return DATASET_DEFAULT_GRAPH_ID
+        return URIRef(named_graph)
+
+    def _graph(self, named_graph: Optional[str]) -> Graph:
+        """the live (read-write) view on the named_graph in the dataset,
+        or the default graph if None
+        """
+        if named_graph is None:
+            return self._dataset.default_graph
+        # else
+        return Graph(
+            store=self._dataset.store,
+            identifier=URIRef(named_graph),
+            **g_cfg_kwargs,
         )
-        return target.query(sparql)
 
-    def insert(self, graph: Graph, named_graph: Optional[str] = None):
-        graph = self.clean(graph)
-        named_graph_graph = None
-        if named_graph is not None:
-            if named_graph not in self._named_graphs:
-                self._named_graphs[named_graph] = Graph(**g_cfg_kwargs)
-            named_graph_graph: Graph = self._named_graphs[named_graph]
-            named_graph_graph += graph
+    def _narrowed(self, named_graphs: List[str]) -> Dataset:
+        """the read-only view on just the named_graphs in the dataset,
+        with their union as default graph
+        """
+        contexts = [self._context(ng) for ng in named_graphs]
+        return union_dataset(NarrowedStore(self._dataset.store, contexts))
+
+    @contextmanager
+    def _reading(
+        self,
+        named_graph: Optional[str] = None,
+        named_graphs: Optional[List[str]] = None,
+    ) -> Iterator[Graph]:
+        """holds the read lock while the block reads the named_graph,
+        (or the view on the named_graphs, or else the whole dataset)
+
+        :param named_graph: (optional) the named_graph to read
+        :type named_graph: str
+        :param named_graphs: (optional) the named_graphs to read
+        :type named_graphs: List[str]
+        :return: the graph (or dataset) to read
+        :rtype: Iterator[Graph]
+        """
+        with self._lock.reading():
+            if named_graphs is not None:
+                yield self._narrowed(named_graphs)
+            elif named_graph is not None:
+                yield self._graph(named_graph)
+            else:
+                yield self._dataset
+
+    def _write(
+        self,
+        named_graph: Optional[str],
+        added: Optional[Graph] = None,
+        removed: Optional[Graph] = None,
+        fresh: bool = False,
+    ) -> None:
+        """applies the changes to the named_graph (or the default graph
+        if None) while holding the write lock
+
+        :param named_graph: the named_graph to change
+        :type named_graph: Optional[str]
+        :param added: (optional) the triples to add
+        :type added: Graph
+        :param removed: (optional) the triples to remove (before adding)
+        :type removed: Graph
+        :param fresh: (optional) drop the current triples first,
+          defaults to False
+        :type fresh: bool
+        """
+        with self._lock.writing():
+            target: Graph = self._graph(named_graph)
+            if fresh:
+                # only removes the triples from this graph, not from others
+                self._dataset.remove_graph(target)
+            if removed is not None:
+                target -= removed
+            if added is not None:
+                target += added
+
+    def _registered(
+        self,
+        named_graph: Optional[str],
+        fingerprint: Optional[Tuple[str, int]] = None,
+    ) -> None:
+        if named_graph is None:
+            return
+        with self._registry_lock:
             self._admin_registry[named_graph] = timestamp()
-        self._all += graph
+            if fingerprint is not None:
+                self._fingerprints[named_graph] = fingerprint
+            else:
+                self._fingerprints.pop(named_graph, None)
+
+    def select(
+        self,
+        sparql: str,
+        named_graph: Optional[str] = None,
+        *,
+        bindings: Optional[Bindings] = None,
+        named_graphs: Optional[Iterable[str]] = None,
+    ) -> Union[Result, List[Result]]:
+        query: Query = self.query_cache.get(sparql)
+        named_graphs = narrowed_graphs(named_graph, named_graphs)
+        with self._reading(named_graph, named_graphs) as target:
+            result = select_bindings(target, query, bindings)
+            for each in result if isinstance(result, list) else [result]:
+                each.bindings  # evaluated before any later write
+        return result
+
+    def select_iter(
+        self,
+        sparql: str,
+        named_graph: Optional[str] = None,
+        page_size: Optional[int] = None,
+        *,
+        named_graphs: Optional[Iterable[str]] = None,
+    ) -> Iterator[ResultRow]:
+        """executes a sparql select query, see RDFStore.select_iter
+
+        Unlike the paged stores, the whole result is materialised first:
+        paging would re-evaluate the whole query for every page, so this
+        does not limit the memory used.
+        """
+        yield from self.select(sparql, named_graph, named_graphs=named_graphs)
+
+    def insert(self, graph: Graph, named_graph: Optional[str] = None):
+        self._write(named_graph, added=self.clean(graph))
+        self._registered(named_graph)
+
+    def replace_graph(self, graph: Graph, named_graph: str) -> None:
+        assert named_graph is not None, "only named_graphs can be replaced"
+        replacement: Graph = self.clean(graph)
+        self._replace_cleaned(
+            replacement,
+            named_graph,
+            content_fingerprint(replacement, named_graph),
+        )
+
+    def _replace_cleaned(
+        self, graph: Graph, named_graph: str, fingerprint: Tuple[str, int]
+    ) -> None:
+        self._write(named_graph, added=graph, fresh=True)
+        self._registered(named_graph, fingerprint)
+
+    def _apply_diff(
+        self,
+        named_graph: str,
+        removed: Graph,
+        added: Graph,
+        fingerprint: Tuple[str, int],
+    ) -> None:
+        added = de_skolemized(added, named_graph)  # keeps blank nodes
+        self._write(named_graph, added=added, removed=removed)
+        self._registered(named_graph, fingerprint)
+
+    def fingerprint(self, named_graph: str) -> Optional[Tuple[str, int]]:
+        return self._fingerprints.get(named_graph)
+
+    def _refresh_lastmod(
+        self, named_graph: str, fingerprint: Tuple[str, int]
+    ) -> None:
+        self._registered(named_graph, fingerprint)
 
     def lastmod_ts(self, named_graph: str) -> datetime:
         return self._admin_registry.get(named_graph, None)
 
+    def lastmod_ts_many(
+        self, named_graphs: Iterable[str]
+    ) -> Dict[str, Optional[datetime]]:
+        return {ng: self._admin_registry.get(ng) for ng in named_graphs}
+
+    def fetch_graph(self, named_graph: str) -> Graph:
+        graph = Graph(**g_cfg_kwargs)
+        with self._reading(named_graph) as source:
+            graph += source
+        return graph
+
     def drop_graph(self, named_graph: str) -> None:
-        if named_graph is not None and named_graph in self._named_graphs:
-            self._all -= self._named_graphs.pop(named_graph)
-            self._named_graphs[named_graph] = Graph()
-        self._admin_registry[named_graph] = timestamp()
+        if named_graph is not None:
+            self._write(named_graph, fresh=True)
+        with self._registry_lock:
+            self._admin_registry[named_graph] = timestamp()
+            self._fingerprints.pop(named_graph, None)
 
     def forget_graph(self, named_graph: str) -> None:
-        self._admin_registry.pop(named_graph)
+        with self._registry_lock:
+            self._admin_registry.pop(named_graph)
+            self._fingerprints.pop(named_graph, None)
 
     @property
     def named_graphs(self) -> Iterable[str]:
-        return self._admin_registry.keys()
+        return list(self._admin_registry)
+
+    def _registry_entries(self) -> Dict[str, RegistryEntry]:
+        with self._registry_lock:
+            return {
+                ng: (lastmod, self._fingerprints.get(ng))
+                for ng, lastmod in self._admin_registry.items()
+                if ng is not None
+            }
+
+    def _load(self, dataset: Dataset, snapshot: Snapshot) -> None:
+        """swaps in the dataset and the registry read from the snapshot
+        (replacing all current content)
+        """
+        with self._lock.writing(), self._registry_lock:
+            self._dataset = dataset
+            self._admin_registry = {
+                ng: lastmod for ng, (lastmod, _) in snapshot.registry.items()
+            }
+            self._fingerprints = {
+                ng: fingerprint
+                for ng, (_, fingerprint) in snapshot.registry.items()
+                if fingerprint is not None
+            }
+
+    def save_snapshot(self, path: Union[str, Path]) -> None:
+        """writes the content of the store, with its lastmod registry,
+        to a compact binary file, see load_snapshot.
+        Writes to the store wait until the file is written.
+
+        :param path: the file to write, replaced as a whole
+        :type path: Union[str, Path]
+        :rtype: None
+        """
+        with self._reading() as dataset:
+            graphs: List[Graph] = list(dataset.store.contexts())
+            # the terms are written before the quads, so they are numbered
+            # in a first pass, the quads then packed one graph at a time
+            ids: Dict[Node, int] = dict()
+            for graph in graphs:
+                ids.setdefault(graph.identifier, len(ids))
+                for triple in graph:
+                    for term in triple:
+                        ids.setdefault(term, len(ids))
+
+            def quads() -> Iterator[bytes]:
+                for graph in graphs:
+                    chunk = array("q")
+                    for triple in graph:
+                        chunk.append(ids[graph.identifier])
+                        chunk.extend(ids[term] for term in triple)
+                    yield packed(chunk)
+
+            write_snapshot(path, list(ids), quads(), self._registry_entries())
+
+    def load_snapshot(self, path: Union[str, Path]) -> None:
+        """replaces the content of the store, and its lastmod registry,
+        with that of a file written by save_snapshot.
+        This skips all parsing and cleaning of the original sources,
+        yet every triple is still added to the (rdflib) indexes, so
+        unlike for the "arrays:" store the load takes time (and memory)
+        in proportion to the number of triples.
+
+        :param path: the snapshot file to read
+        :type path: Union[str, Path]
+        :rtype: None
+        """
+        snapshot = Snapshot(path)
+        dataset: Dataset = union_dataset(self._backend())
+        terms: List[Node] = snapshot.terms
+        contexts: Dict[int, Graph] = dict()
+
+        def quads(ids) -> Iterator[tuple]:
+            ids = iter(ids)
+            for g, s, p, o in zip(ids, ids, ids, ids):
+                if g not in contexts:
+                    contexts[g] = Graph(
+                        store=dataset.store, identifier=terms[g]
+                    )
+                yield terms[s], terms[p], terms[o], contexts[g]
+
+        dataset.store.addN(quads(snapshot.quads))
+        self._load(dataset, snapshot)
 
 
 class RDFStoreDecorator(RDFStore):
@@ -517,8 +2491,29 @@ class RDFStoreDecorator(RDFStore):
         # the mapper and cleaner of the core
         self._core = store
 
-    def select(self, sparql: str, named_graph: Optional[str] = None) -> Result:
-        return self._core.select(sparql, named_graph)
+    def select(
+        self,
+        sparql: str,
+        named_graph: Optional[str] = None,
+        *,
+        bindings: Optional[Bindings] = None,
+        named_graphs: Optional[Iterable[str]] = None,
+    ) -> Union[Result, List[Result]]:
+        return self._core.select(
+            sparql, named_graph, bindings=bindings, named_graphs=named_graphs
+        )
+
+    def select_iter(
+        self,
+        sparql: str,
+        named_graph: Optional[str] = None,
+        page_size: Optional[int] = None,
+        *,
+        named_graphs: Optional[Iterable[str]] = None,
+    ) -> Iterator[ResultRow]:
+        return self._core.select_iter(
+            sparql, named_graph, page_size, named_graphs=named_graphs
+        )
 
     def insert(self, graph: Graph, named_graph: Optional[str] = None):
         return self._core.insert(graph, named_graph)
@@ -526,12 +2521,40 @@ class RDFStoreDecorator(RDFStore):
     def lastmod_ts(self, named_graph: str) -> datetime:
         return self._core.lastmod_ts(named_graph)
 
+    def lastmod_ts_many(
+        self, named_graphs: Iterable[str]
+    ) -> Dict[str, Optional[datetime]]:
+        return self._core.lastmod_ts_many(named_graphs)
+
+    def stale_named_graphs(
+        self, age_minutes: int = 0, reference_time: datetime = None
+    ) -> Iterable[str]:
+        return self._core.stale_named_graphs(age_minutes, reference_time)
+
     def drop_graph(self, named_graph: str) -> None:
         return self._core.drop_graph(named_graph)
 
+    def replace_graph(self, graph: Graph, named_graph: str) -> None:
+        return self._core.replace_graph(graph, named_graph)
+
+    def sync_graph(self, graph: Graph, named_graph: str) -> bool:
+        return self._core.sync_graph(graph, named_graph)
+
+    def fingerprint(self, named_graph: str) -> Optional[Tuple[str, int]]:
+        return self._core.fingerprint(named_graph)
+
+    def replace_if_changed(self, graph: Graph, named_graph: str) -> bool:
+        return self._core.replace_if_changed(graph, named_graph)
+
+    def fetch_graph(self, named_graph: str) -> Graph:
+        return self._core.fetch_graph(named_graph)
+
     def forget_graph(self, named_graph: str) -> None:
         return self._core.forget_graph(named_graph)
 
+    def close(self) -> None:
+        return self._core.close()
+
     @property
     def named_graphs(self) -> Iterable[str]:
         return self._core.named_graphs
@@ -0,0 +1,28 @@
+"""Encoding of rdf terms as plain (kind, value, datatype, lang) strings."""
+
+from typing import Tuple
+
+from rdflib import BNode, Literal, URIRef
+from rdflib.term import Node
+
+TermKey = Tuple[str, str, str, str]
+
+
+def term_key(term: Node) -> TermKey:
+    """the (kind, value, datatype, lang) columns identifying the term"""
+    if isinstance(term, Literal):
+        return ("l", str(term), str(term.datatype or ""), term.language or "")
+    if isinstance(term, BNode):
+        return ("b", str(term), "", "")
+    return ("u", str(term), "", "")
+
+
+def key_term(kind: str, value: str, datatype: str, lang: str) -> Node:
+    """the term for the (kind, value, datatype, lang) columns"""
+    if kind == "l":
+        return Literal(
+            value, lang=lang or None, datatype=URIRef(datatype) or None
+        )
+    if kind == "b":
+        return BNode(value)
+    return URIRef(value)
@@ -81,6 +81,36 @@ def _mem_rdf_store() -> RDFStore:
     return create_rdf_store()
 
 
+@pytest.fixture(scope="session")
+def _array_rdf_store() -> RDFStore:
+    """in memory store keeping the triples in numpy arrays
+    But only if numpy is available, else None
+    """
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        log.debug("not creating array rdf store in test - no numpy")
+        return None
+    return create_rdf_store("arrays:")
+
+
+@pytest.fixture(scope="session")
+def _sharded_rdf_store() -> Iterable[RDFStore]:
+    """in memory store spread over (two) worker processes"""
+    log.debug("creating sharded rdf store")
+    store = create_rdf_store("shards:", shards=2)
+    yield store
+    store.close()
+
+
+@pytest.fixture(scope="session")
+def _sqlite_rdf_store(tmp_path_factory) -> RDFStore:
+    """persistent store in a (temporary) sqlite database file"""
+    path = tmp_path_factory.mktemp("sqlite") / "test.db"
+    log.debug(f"creating sqlite rdf store in {path}")
+    return create_rdf_store(f"sqlite:///{path}")
+
+
 @pytest.fixture(scope="session")
 def _uri_rdf_store() -> RDFStore:
     """proxy to available graphdb store
@@ -99,14 +129,27 @@ def _uri_rdf_store() -> RDFStore:
 
 
 @pytest.fixture()
-def rdf_stores(_mem_rdf_store, _uri_rdf_store) -> Iterable[RDFStore]:
+def rdf_stores(
+    _mem_rdf_store,
+    _array_rdf_store,
+    _sharded_rdf_store,
+    _sqlite_rdf_store,
+    _uri_rdf_store,
+) -> Iterable[RDFStore]:
     """trimmed list of available stores to be tested
-    result should contain at least memory_rdf_store, and (if available)
-    also include uri_rdf_store
+    result should contain at least memory_rdf_store, sharded_rdf_store
+    and sqlite_rdf_store,
+    and (if available) also include array_rdf_store and uri_rdf_store
     """
     stores = tuple(
         store
-        for store in (_mem_rdf_store, _uri_rdf_store)
+        for store in (
+            _mem_rdf_store,
+            _array_rdf_store,
+            _sharded_rdf_store,
+            _sqlite_rdf_store,
+            _uri_rdf_store,
+        )
         if store is not None
     )
     return stores
@@ -0,0 +1,136 @@
+#! /usr/bin/env python
+"""test_arrays
+tests the numpy array backed store against the rdflib based one
+"""
+
+import pytest
+from conftest import make_sample_graph
+from rdflib import Graph, Literal, URIRef
+from util4tests import run_single_test
+
+from pyrdfstore.build import create_rdf_store
+from pyrdfstore.store import MemoryRDFStore
+
+np = pytest.importorskip("numpy")
+from pyrdfstore.arrays import (  # noqa: E402
+    ArrayRDFStore,
+    TermDictionary,
+    TripleIndex,
+)
+
+EX = "urn:test:arrays:"
+
+
+def test_term_dictionary():
+    terms = TermDictionary()
+    a, b = URIRef(EX + "a"), Literal("b")
+    assert terms.intern(a) == 0
+    assert terms.intern(b) == 1
+    assert terms.intern(a) == 0
+    assert terms.lookup(Literal("c")) is None
+    assert list(terms.decode(np.array([1, 0, 1]))) == [b, a, b]
+
+
+def test_triple_index_match():
+    rows = np.array(
+        [[s, p, o] for s in range(4) for p in range(3) for o in (7, 8)]
+    )
+    index = TripleIndex()
+    index.add(rows[::2])
+    index.add(rows[1::2])
+    index.add(rows[:5])  # duplicates are only kept once
+    assert len(index) == len(rows)
+    for pattern in [
+        (1, None, None),
+        (None, 2, None),
+        (None, None, 8),
+        (1, 2, None),
+        (None, 2, 7),
+        (1, None, 8),
+        (1, 2, 8),
+        (9, None, None),
+    ]:
+        expected = {
+            tuple(row)
+            for row in rows.tolist()
+            if all(v is None or v == r for v, r in zip(pattern, row))
+        }
+        assert {tuple(r) for r in index.match(pattern).tolist()} == expected
+    index.remove(rows[rows[:, 0] == 1])
+    assert len(index.match((1, None, None))) == 0
+    assert len(index) == len(rows) * 3 // 4
+
+
+def test_create_rdf_store():
+    store = create_rdf_store("arrays:")
+    assert isinstance(store, ArrayRDFStore)
+
+
+def _sample(size: int) -> Graph:
+    g = Graph()
+    for i in range(size):
+        s = URIRef(f"{EX}s{i}")
+        g.add((s, URIRef(EX + "next"), URIRef(f"{EX}s{(i + 1) % size}")))
+        g.add((s, URIRef(EX + "value"), Literal(i % 7)))
+        if i % 3 == 0:
+            g.add((s, URIRef(EX + "self"), s))
+    return g
+
+
+@pytest.mark.parametrize(
+    "sparql",
+    [
+        "SELECT ?s ?v WHERE { ?s <urn:test:arrays:value> ?v }",
+        """SELECT ?a ?c WHERE {
+            ?a <urn:test:arrays:next> ?b . ?b <urn:test:arrays:next> ?c .
+            ?c <urn:test:arrays:value> 3 }""",
+        """SELECT ?a ?b WHERE {
+            ?a <urn:test:arrays:value> ?v . ?b <urn:test:arrays:value> ?v .
+            ?a <urn:test:arrays:next> ?b }""",
+        "SELECT ?x WHERE { ?x ?p ?x }",
+        """SELECT ?s ?x WHERE { ?s <urn:test:arrays:value> 2
+            OPTIONAL { ?s <urn:test:arrays:self> ?x } }""",
+        """SELECT ?s ?n WHERE { VALUES ?s { <urn:test:arrays:s4> }
+            ?s <urn:test:arrays:next> ?n }""",
+        "SELECT ?s WHERE { ?s <urn:test:arrays:value> 'unknown' }",
+        """ASK { <urn:test:arrays:s1>
+            <urn:test:arrays:next> <urn:test:arrays:s2> }""",
+    ],
+)
+def test_select_like_memory(sparql: str):
+    stores = (MemoryRDFStore(), ArrayRDFStore())
+    for store in stores:
+        store.insert(_sample(30), EX + "one")
+        store.insert(_sample(12), EX + "two")
+    for ng in (None, EX + "one"):
+        expected, actual = (store.select(sparql, ng) for store in stores)
+        if expected.type == "ASK":
+            assert actual.askAnswer == expected.askAnswer
+            continue
+        assert sorted(map(tuple, actual)) == sorted(map(tuple, expected))
+
+
+def test_select_graphs():
+    sparql = """SELECT ?g (count(*) as ?n)
+        WHERE { GRAPH ?g { ?s ?p ?o } } GROUP BY ?g"""
+    results = list()
+    for store in (MemoryRDFStore(), ArrayRDFStore()):
+        store.insert(_sample(30), EX + "one")
+        store.insert(_sample(12), EX + "two")
+        results.append(sorted(map(tuple, store.select(sparql))))
+    assert results[0] == results[1]
+    assert len(results[0]) == 2
+
+
+def test_large_graph():
+    store = ArrayRDFStore()
+    ng: str = EX + "large"
+    store.insert(make_sample_graph(range(5000)), ng)
+    result = store.select("SELECT (count(*) as ?n) WHERE { ?s ?p ?o }", ng)
+    assert int(list(result)[0][0]) == len(store.fetch_graph(ng)) > 0
+    store.drop_graph(ng)
+    assert len(store.fetch_graph(ng)) == 0
+
+
+if __name__ == "__main__":
+    run_single_test(__file__)
@@ -0,0 +1,168 @@
+#! /usr/bin/env python
+"""test_balance
+tests the spreading of reads over multiple (replicated) endpoints
+"""
+
+import json
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+import pytest
+from conftest import make_sample_graph
+from util4tests import run_single_test
+
+from pyrdfstore.balance import ReadBalancer
+from pyrdfstore.store import URIRDFStore
+
+SELECT_SERVER = "SELECT ?server WHERE { ?s ?p ?server }"
+
+
+def test_round_robin():
+    balancer = ReadBalancer(["a", "b", "c"])
+    picked = list()
+    for _ in range(6):
+        uri = balancer.acquire()
+        balancer.release(uri)
+        picked.append(uri)
+    assert Counter(picked) == Counter(a=2, b=2, c=2)
+
+
+def test_least_outstanding():
+    balancer = ReadBalancer(["a", "b"], strategy="least_outstanding")
+    busy = balancer.acquire()
+    other = balancer.acquire()
+    assert other != busy
+    balancer.release(other)
+    for _ in range(3):
+        assert balancer.acquire() == other
+        balancer.release(other)
+    assert balancer.outstanding(busy) == 1
+
+
+def test_eject_and_prefer():
+    balancer = ReadBalancer(["a", "b"], eject_seconds=60)
+    balancer.eject("a")
+    assert balancer.healthy() == ["b"]
+    for _ in range(3):
+        assert balancer.acquire() == "b"
+        assert balancer.acquire(prefer="a") == "b"
+    assert balancer.acquire(prefer="b", exclude=["b"]) == "a"
+    with pytest.raises(AssertionError):
+        ReadBalancer(["a"], strategy="random")
+
+
+class ReplicaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    failing: List[int] = list()
+    hits: Counter = Counter()
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass  # keep the test output clean
+
+    def _reply(self, status: int, data: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _answer(self):
+        port: int = self.server.server_address[1]
+        with ReplicaHandler.lock:
+            ReplicaHandler.hits[port] += 1
+        if port in ReplicaHandler.failing:
+            return self._reply(500, b"down", "text/plain")
+        doc = dict(
+            head=dict(vars=["server"]),
+            results=dict(
+                bindings=[dict(server=dict(type="literal", value=str(port)))]
+            ),
+        )
+        data = json.dumps(doc).encode()
+        self._reply(200, data, "application/sparql-results+json")
+
+    def do_GET(self):
+        self._answer()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        if self.path.endswith("/statements"):
+            return self._reply(204, b"", "text/plain")
+        self._answer()
+
+
+@pytest.fixture()
+def replicas():
+    ReplicaHandler.failing = list()
+    ReplicaHandler.hits = Counter()
+    servers = [
+        ThreadingHTTPServer(("127.0.0.1", 0), ReplicaHandler) for _ in range(3)
+    ]
+    for server in servers:
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield [f"http://127.0.0.1:{s.server_address[1]}/repo" for s in servers]
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def port_of(uri: str) -> int:
+    return int(uri.split(":")[2].split("/")[0])
+
+
+def test_reads_are_spread(replicas: List[str]):
+    with URIRDFStore(replicas) as store:
+        for _ in range(9):
+            store.select(SELECT_SERVER)
+    assert set(ReplicaHandler.hits.values()) == {3}
+
+
+def test_failing_replica_is_ejected(replicas: List[str]):
+    ReplicaHandler.failing = [port_of(replicas[1])]
+    with URIRDFStore(replicas, eject_seconds=60) as store:
+        answers = [
+            str(next(iter(store.select(SELECT_SERVER))).server)
+            for _ in range(6)
+        ]
+    assert str(port_of(replicas[1])) not in answers
+    assert ReplicaHandler.hits[port_of(replicas[1])] == 1
+
+
+def test_all_replicas_failing_raises(replicas: List[str]):
+    ReplicaHandler.failing = [port_of(uri) for uri in replicas]
+    with URIRDFStore(replicas) as store:
+        with pytest.raises(Exception):
+            store.select(SELECT_SERVER)
+    assert sum(ReplicaHandler.hits.values()) == 3
+
+
+def test_read_your_writes(replicas: List[str]):
+    ng: str = "urn:test:balance:ryw"
+    primary: str = str(port_of(replicas[0]))
+    with URIRDFStore(
+        replicas, replicas[0] + "/statements", read_your_writes=60
+    ) as store:
+        before = {
+            str(next(iter(store.select(SELECT_SERVER, ng))).server)
+            for _ in range(6)
+        }
+        assert len(before) == 3
+        store.insert(make_sample_graph(range(3)), ng)
+        after = {
+            str(next(iter(store.select(SELECT_SERVER, ng))).server)
+            for _ in range(6)
+        }
+        assert after == {primary}
+        other = {
+            str(next(iter(store.select(SELECT_SERVER, "urn:other"))).server)
+            for _ in range(6)
+        }
+        assert len(other) == 3, "other graphs are still spread"
+
+
+if __name__ == "__main__":
+    run_single_test(__file__)
@@ -14,11 +14,25 @@ from conftest import (
     assert_file_ingest,
     make_sample_graph,
 )
-from rdflib import BNode, Graph, Literal, URIRef
+from rdflib import BNode, Dataset, Graph, Literal, URIRef
+from rdflib.plugins.sparql import prepareQuery
 from rdflib.query import Result
 from util4tests import log, run_single_test
 
-from pyrdfstore.store import MemoryRDFStore, RDFStore, timestamp
+from pyrdfstore.sqlite import SQLiteRDFStore
+from pyrdfstore.store import (
+    ADMIN_NAMED_GRAPH,
+    MemoryRDFStore,
+    RDFStore,
+    URIRDFStore,
+    content_fingerprint,
+    lastmod_update_sparql,
+    paged_select,
+    paging_order,
+    stable_relabelled,
+    stable_skolemized,
+    timestamp,
+)
 
 
 @pytest.mark.usefixtures("rdf_stores", "example_graphs")
@@ -123,6 +137,67 @@ def test_verify_ref_time(rdf_stores: Iterable[RDFStore]):
         )
 
 
+@pytest.mark.usefixtures("rdf_stores")
+def test_verify_max_age_of_keys(rdf_stores: Iterable[RDFStore]):
+    log.info(f"test_verify_max_age_of_keys ({len(rdf_stores)})")
+    keys: List[str] = [f"bulk-age:{uuid4()}" for i in range(3)]
+    unknown: str = f"bulk-age-unknown:{uuid4()}"
+    g: Graph = make_sample_graph(("X",))
+    for rdf_store in rdf_stores:
+        rdf_store_type: str = type(rdf_store).__name__
+        ts_ante = timestamp()
+        for key in keys:
+            rdf_store.insert_for_key(g, key)
+        ts_post = timestamp()
+
+        ngs = [rdf_store.named_graph_for_key(k) for k in keys + [unknown]]
+        lastmods = rdf_store.lastmod_ts_many(ngs)
+        assert set(lastmods) == set(ngs)
+        assert lastmods[ngs[-1]] is None
+        assert all(
+            ts_ante <= lastmods[ng] <= ts_post for ng in ngs[:-1]
+        ), f"{rdf_store_type} :: bulk lastmods should match the inserts"
+
+        young = rdf_store.verify_max_age_of_keys(keys + [unknown], 1)
+        assert young == {
+            **{k: True for k in keys},
+            unknown: False,
+        }, f"{rdf_store_type} :: only the inserted keys should be young"
+        old = rdf_store.verify_max_age_of_keys(keys, reference_time=ts_post)
+        assert not any(old.values())
+        for key in keys:
+            rdf_store.forget_graph_for_key(key)
+
+
+@pytest.mark.usefixtures("rdf_stores")
+def test_stale_keys(rdf_stores: Iterable[RDFStore]):
+    log.info(f"test_stale_keys ({len(rdf_stores)})")
+    keys: List[str] = [f"stale:{uuid4()}" for i in range(3)]
+    g: Graph = make_sample_graph(("X",))
+    for rdf_store in rdf_stores:
+        rdf_store_type: str = type(rdf_store).__name__
+        ts_ante = timestamp()
+        for key in keys:
+            rdf_store.insert_for_key(g, key)
+        ts_post = timestamp()
+
+        stale = set(rdf_store.stale_keys(reference_time=ts_post))
+        assert (
+            set(keys) <= stale
+        ), f"{rdf_store_type} :: all keys are older than after the inserts"
+        stale = set(rdf_store.stale_keys(reference_time=ts_ante))
+        assert (
+            not set(keys) & stale
+        ), f"{rdf_store_type} :: no keys are older than before the inserts"
+        stale_ngs = set(rdf_store.stale_named_graphs(age_minutes=1))
+        ngs = {rdf_store.named_graph_for_key(key) for key in keys}
+        assert (
+            not ngs & stale_ngs
+        ), f"{rdf_store_type} :: no graphs are older than a minute"
+        for key in keys:
+            rdf_store.forget_graph_for_key(key)
+
+
 @pytest.mark.usefixtures("rdf_stores", "example_graphs")
 def test_insert(rdf_stores: Iterable[RDFStore], example_graphs: List[Graph]):
     log.info(f"test_insert ({len(rdf_stores)})")
@@ -387,7 +462,8 @@ def test_insert_drop_forget_forkey(rdf_stores: Iterable[RDFStore]):
     rnd_key: str = "rnd/" + "".join(choice(ascii_letters) for i in range(12))
     for rdf_store in rdf_stores:
         # -- note: don't forget one extra key is in the admin graph
-        admin_triple: int = 0 if isinstance(rdf_store, MemoryRDFStore) else 1
+        # (of the triple store, the local stores keep it aside)
+        admin_triple: int = 1 if isinstance(rdf_store, URIRDFStore) else 0
         rdf_store_type: str = type(rdf_store).__name__
         g: Graph = Graph().add(
             tuple(
@@ -439,6 +515,331 @@ def test_insert_drop_forget_forkey(rdf_stores: Iterable[RDFStore]):
         )
 
 
+@pytest.mark.usefixtures("rdf_stores")
+def test_fetch_graph(rdf_stores: Iterable[RDFStore]):
+    log.info(f"test_fetch_graph ({len(rdf_stores)})")
+    ng: str = f"urn:test-fetch-graph:{uuid4()}"
+    g: Graph = make_sample_graph(range(7))
+    for rdf_store in rdf_stores:
+        rdf_store_type: str = type(rdf_store).__name__
+        assert len(rdf_store.fetch_graph(ng)) == 0, (
+            f"{rdf_store_type} :: " "unknown graphs should fetch empty"
+        )
+        rdf_store.insert(g, ng)
+        fetched: Graph = rdf_store.fetch_graph(ng)
+        assert set(fetched) == set(g), (
+            f"{rdf_store_type} :: " "fetched graph should match the inserted"
+        )
+        rdf_store.drop_graph(ng)
+        assert len(rdf_store.fetch_graph(ng)) == 0
+        rdf_store.forget_graph(ng)
+
+
+@pytest.mark.usefixtures("rdf_stores")
+def test_replace_for_key(rdf_stores: Iterable[RDFStore]):
+    log.info(f"test_replace_for_key ({len(rdf_stores)})")
+    key: str = f"replace:{uuid4()}"
+    g1: Graph = make_sample_graph(range(5))
+    g2: Graph = make_sample_graph(range(3, 9))
+    for rdf_store in rdf_stores:
+        rdf_store_type: str = type(rdf_store).__name__
+        ng: str = rdf_store.named_graph_for_key(key)
+        rdf_store.insert_for_key(g1, key)
+        ts_ante = timestamp()
+        rdf_store.replace_for_key(g2, key)
+        ts_post = timestamp()
+        result = rdf_store.select(SELECT_ALL_SPO, ng)
+        assert {tuple(row) for row in result} == set(
+            g2
+        ), f"{rdf_store_type} :: only the replacing triples should remain"
+        assert ts_ante <= rdf_store.lastmod_ts(ng) <= ts_post
+        rdf_store.replace_for_key(Graph(), key)
+        assert len(rdf_store.select(SELECT_ALL_SPO, ng)) == 0
+        rdf_store.drop_graph_for_key(key)
+        rdf_store.forget_graph_for_key(key)
+
+
+def test_stable_skolemized():
+    g: Graph = make_sample_graph(range(3), bnode_subjects=True)
+    again: Graph = Graph().parse(data=g.serialize(format="nt"), format="nt")
+    assert set(g) != set(again), "reparsing should have renamed the bnodes"
+    ng: str = "urn:test:skolem"
+    skolemized: Graph = stable_skolemized(g, ng)
+    assert set(skolemized) == set(stable_skolemized(again, ng))
+    assert len(set(skolemized.subjects())) == 3
+    assert not any(isinstance(s, BNode) for s in skolemized.subjects())
+    assert set(skolemized) != set(stable_skolemized(g, "urn:test:other"))
+    plain: Graph = make_sample_graph(range(3))
+    assert stable_skolemized(plain, ng) is plain
+
+
+@pytest.mark.usefixtures("rdf_stores")
+def test_sync_graph_for_key(rdf_stores: Iterable[RDFStore]):
+    log.info(f"test_sync_graph_for_key ({len(rdf_stores)})")
+    key: str = f"sync:{uuid4()}"
+    g1: Graph = make_sample_graph(range(5), bnode_subjects=True)
+    g1 += make_sample_graph(range(5))
+    g2: Graph = make_sample_graph(range(2, 7), bnode_subjects=True)
+    g2 += make_sample_graph(range(5))
+    for rdf_store in rdf_stores:
+        rdf_store_type: str = type(rdf_store).__name__
+        ng: str = rdf_store.named_graph_for_key(key)
+        assert rdf_store.sync_graph_for_key(g1, key)
+        lastmod = rdf_store.lastmod_ts(ng)
+        # the same content, with other bnode ids, is no change
+        same: Graph = Graph().parse(
+            data=g1.serialize(format="nt"), format="nt"
+        )
+        assert not rdf_store.sync_graph_for_key(
+            same, key
+        ), f"{rdf_store_type} :: no changes expected"
+        assert rdf_store.lastmod_ts(ng) == lastmod
+        ts_ante = timestamp()
+        assert rdf_store.sync_graph_for_key(g2, key)
+        ts_post = timestamp()
+        assert ts_ante <= rdf_store.lastmod_ts(ng) <= ts_post
+        content, _ = stable_relabelled(rdf_store.fetch_graph(ng), ng)
+        expected = stable_skolemized(rdf_store.clean(g2), ng)
+        assert set(content) == set(
+            expected
+        ), f"{rdf_store_type} :: content should match the synced graph"
+        rdf_store.drop_graph_for_key(key)
+        rdf_store.forget_graph_for_key(key)
+
+
+@pytest.mark.usefixtures("rdf_stores")
+def test_sync_graph_after_insert(rdf_stores: Iterable[RDFStore]):
+    ng: str = f"urn:test:sync-after-insert:{uuid4()}"
+    g: Graph = make_sample_graph(range(4), bnode_subjects=True)
+    g += make_sample_graph(range(2))
+    more: Graph = make_sample_graph(range(4, 6), bnode_subjects=True)
+    for rdf_store in rdf_stores:
+        rdf_store_type: str = type(rdf_store).__name__
+        rdf_store.insert(g, ng)
+        stored: Graph = rdf_store.fetch_graph(ng)
+        # the blank nodes (or skolem iris) of the insert are recognised
+        assert not rdf_store.sync_graph(
+            g, ng
+        ), f"{rdf_store_type} :: same content should not be rewritten"
+        assert set(rdf_store.fetch_graph(ng)) == set(stored)
+        assert rdf_store.sync_graph(g + more, ng)
+        synced: Graph = rdf_store.fetch_graph(ng)
+        assert len(synced) == len(g) + len(more), rdf_store_type
+        if not isinstance(rdf_store, URIRDFStore):
+            assert all(
+                isinstance(s, BNode)
+                for s in set(synced.subjects())
+                - {URIRef(f"https://example.org/subject-{i}") for i in (0, 1)}
+            ), f"{rdf_store_type} :: blank nodes should stay blank nodes"
+        rdf_store.drop_graph(ng)
+        rdf_store.forget_graph(ng)
+
+
+def test_content_fingerprint():
+    g: Graph = make_sample_graph(range(4), bnode_subjects=True)
+    again: Graph = Graph().parse(data=g.serialize(format="nt"), format="nt")
+    hash, count = content_fingerprint(g)
+    assert count == 4
+    assert content_fingerprint(again) == (hash, count)
+    assert content_fingerprint(make_sample_graph(range(5)))[0] != hash
+
+
+def test_lastmod_update_sparql_fingerprint():
+    ng: str = "urn:test:fingerprint"
+    ds = Dataset()
+    adm = ds.graph(URIRef(ADMIN_NAMED_GRAPH))
+    ds.update(lastmod_update_sparql(ng, timestamp(), ("abc", 3)))
+    assert len(adm) == 3
+    ds.update(lastmod_update_sparql(ng, timestamp(), ("def", 4)))
+    assert len(adm) == 3
+    assert {str(o) for o in adm.objects()} >= {"def", "4"}
+    ds.update(lastmod_update_sparql(ng, timestamp()))
+    assert len(adm) == 1, "no fingerprint should remain"
+    ds.update(lastmod_update_sparql(ng))
+    assert len(adm) == 0
+
+
+@pytest.mark.usefixtures("rdf_stores")
+def test_insert_for_key_if_changed(rdf_stores: Iterable[RDFStore]):
+    log.info(f"test_insert_for_key_if_changed ({len(rdf_stores)})")
+    key: str = f"if-changed:{uuid4()}"
+    g1: Graph = make_sample_graph(range(5), bnode_subjects=True)
+    g2: Graph = make_sample_graph(range(6))
+    for rdf_store in rdf_stores:
+        rdf_store_type: str = type(rdf_store).__name__
+        ng: str = rdf_store.named_graph_for_key(key)
+        assert rdf_store.insert_for_key(g1, key, if_changed=True)
+        assert rdf_store.fingerprint(ng) is not None
+        assert rdf_store.fingerprint(ng)[1] == 5
+        lastmod = rdf_store.lastmod_ts(ng)
+        same: Graph = Graph().parse(
+            data=g1.serialize(format="nt"), format="nt"
+        )
+        assert not rdf_store.insert_for_key(
+            same, key, if_changed=True
+        ), f"{rdf_store_type} :: unchanged content should not be uploaded"
+        assert rdf_store.lastmod_ts(ng) > lastmod, "lastmod should be touched"
+        assert len(rdf_store.select(SELECT_ALL_SPO, ng)) == 5
+
+        assert rdf_store.insert_for_key(g2, key, if_changed=True)
+        result = rdf_store.select(SELECT_ALL_SPO, ng)
+        assert {tuple(row) for row in result} == set(
+            g2
+        ), f"{rdf_store_type} :: changed content should replace the old"
+        # plain inserts make the fingerprint unknown
+        rdf_store.insert_for_key(g1, key)
+        assert rdf_store.fingerprint(ng) is None
+        rdf_store.drop_graph_for_key(key)
+        rdf_store.forget_graph_for_key(key)
+
+
+def test_insert_for_key_if_changed_untouched():
+    rdf_store = MemoryRDFStore(touch_unchanged=False)
+    g: Graph = make_sample_graph(range(3))
+    assert rdf_store.insert_for_key(g, "untouched", if_changed=True)
+    ng: str = rdf_store.named_graph_for_key("untouched")
+    lastmod = rdf_store.lastmod_ts(ng)
+    assert not rdf_store.insert_for_key(g, "untouched", if_changed=True)
+    assert rdf_store.lastmod_ts(ng) == lastmod
+
+
+def test_replace_if_changed_cleans_once(monkeypatch, tmp_path):
+    import pyrdfstore.sqlite
+    import pyrdfstore.store
+
+    calls: List[str] = list()
+
+    def cleaner(graph: Graph) -> Graph:
+        calls.append("clean")
+        return graph
+
+    def fingerprint(graph: Graph, named_graph: str = None):
+        calls.append("fingerprint")
+        return content_fingerprint(graph, named_graph)
+
+    for module in (pyrdfstore.store, pyrdfstore.sqlite):
+        monkeypatch.setattr(module, "content_fingerprint", fingerprint)
+    for rdf_store in (
+        MemoryRDFStore(cleaner=cleaner),
+        SQLiteRDFStore(tmp_path / "once.db", cleaner=cleaner),
+    ):
+        calls.clear()
+        g: Graph = make_sample_graph(range(3))
+        assert rdf_store.replace_if_changed(g, "urn:test:once")
+        assert calls == ["clean", "fingerprint"], type(rdf_store).__name__
+        rdf_store.close()
+
+
+@pytest.mark.usefixtures("rdf_stores")
+def test_drop_keeps_shared_triples(rdf_stores: Iterable[RDFStore]):
+    log.info(f"test_drop_keeps_shared_triples ({len(rdf_stores)})")
+    ng1: str = f"urn:test-shared:one:{uuid4()}"
+    ng2: str = f"urn:test-shared:two:{uuid4()}"
+    shared: Graph = make_sample_graph(range(3))
+    for rdf_store in rdf_stores:
+        rdf_store_type: str = type(rdf_store).__name__
+        rdf_store.insert(shared, ng1)
+        rdf_store.insert(shared + make_sample_graph(range(3, 5)), ng2)
+        rdf_store.drop_graph(ng1)
+        assert len(rdf_store.select(SELECT_ALL_SPO, ng1)) == 0
+        assert (
+            len(rdf_store.select(SELECT_ALL_SPO, ng2)) == 5
+        ), f"{rdf_store_type} :: the shared triples should remain in {ng2=}"
+        for ng in (ng1, ng2):
+            rdf_store.drop_graph(ng)
+            rdf_store.forget_graph(ng)
+
+
+def test_memory_union_default_graph():
+    rdf_store = MemoryRDFStore()
+    rdf_store.insert(make_sample_graph(range(3)), "urn:test:union:one")
+    rdf_store.insert(make_sample_graph(range(2, 5)), "urn:test:union:two")
+    rdf_store.insert(make_sample_graph(range(5, 6)))  # into default graph
+    assert len(rdf_store.select(SELECT_ALL_SPO)) == 6
+    rdf_store.drop_graph("urn:test:union:one")
+    assert len(rdf_store.select(SELECT_ALL_SPO)) == 4
+    in_graphs: str = "SELECT DISTINCT ?g WHERE { GRAPH ?g { ?s ?p ?o } }"
+    assert [str(row.g) for row in rdf_store.select(in_graphs)] == [
+        "urn:test:union:two"
+    ]
+
+
+def test_paging_order():
+    assert paging_order(SELECT_ALL_SPO) == "ORDER BY ?s ?p ?o"
+    ordered: str = "SELECT DISTINCT ?s WHERE { ?s ?p ?o . } ORDER BY ?s"
+    assert paging_order(ordered) == ""
+    with pytest.raises(AssertionError):
+        paging_order(SELECT_ALL_SPO + " LIMIT 3")
+    with pytest.raises(AssertionError):
+        paging_order("ASK { ?s ?p ?o }")
+
+
+def test_paged_select():
+    paged: str = paged_select(SELECT_ALL_SPO, "ORDER BY ?s", 5, 10)
+    assert paged == SELECT_ALL_SPO + "\nORDER BY ?s LIMIT 5 OFFSET 10\n"
+    trailing: str = "SELECT ?s WHERE { VALUES ?o { 1 } ?s ?p ?o } VALUES ?s {}"
+    paged = paged_select(trailing, "ORDER BY ?s", 5, 0)
+    assert paged.endswith("ORDER BY ?s LIMIT 5 OFFSET 0\nVALUES ?s {}")
+    prepareQuery(paged)  # parses
+    braced: str = (
+        "SELECT ?s WHERE { ?s ?p ?o } # no VALUES { here\n"
+        "VALUES ?o { \"a}b\" '{' }"
+    )
+    paged = paged_select(braced, "ORDER BY ?s", 5, 0)
+    assert paged.endswith("OFFSET 0\nVALUES ?o { \"a}b\" '{' }")
+    prepareQuery(paged)  # parses
+
+
+@pytest.mark.usefixtures("rdf_stores")
+def test_select_iter(rdf_stores: Iterable[RDFStore]):
+    log.info(f"test_select_iter ({len(rdf_stores)})")
+    ng: str = f"urn:test-select-iter:{uuid4()}"
+    g: Graph = make_sample_graph(range(25))
+    ordered: str = "SELECT ?s ?o WHERE { ?s ?p ?o . } ORDER BY DESC(?s)"
+    for rdf_store in rdf_stores:
+        rdf_store_type: str = type(rdf_store).__name__
+        rdf_store.insert(g, ng)
+        rows = list(rdf_store.select_iter(SELECT_ALL_SPO, ng, page_size=7))
+        assert len(rows) == len(g)
+        assert {tuple(row) for row in rows} == set(
+            g
+        ), f"{rdf_store_type} :: paged rows should match all triples"
+        rows = [tuple(r) for r in rdf_store.select_iter(ordered, ng, 10)]
+        assert rows == [tuple(r) for r in rdf_store.select(ordered, ng)]
+        subjects = " ".join(s.n3() for s in sorted(set(g.subjects()))[:9])
+        values: str = f"{SELECT_ALL_SPO} VALUES ?s {{ {subjects} }}"
+        rows = list(rdf_store.select_iter(values, ng, page_size=4))
+        assert len(rows) == 9, f"{rdf_store_type} :: trailing VALUES paged"
+        rdf_store.drop_graph(ng)
+        rdf_store.forget_graph(ng)
+
+
+@pytest.mark.usefixtures("rdf_stores")
+def test_select_property_paths(rdf_stores: Iterable[RDFStore]):
+    ng: str = f"urn:test-paths:{uuid4()}"
+    a, b, c = (URIRef(f"https://example.org/path/{n}") for n in "abc")
+    p = URIRef("https://example.org/path/p")
+    g = Graph()
+    g.add((a, p, b))
+    g.add((b, p, c))
+    queries = (
+        (f"SELECT ?o WHERE {{ {a.n3()} {p.n3()}+ ?o }}", {b, c}),
+        (f"SELECT ?o WHERE {{ {a.n3()} {p.n3()}/{p.n3()} ?o }}", {c}),
+        (f"SELECT ?s WHERE {{ ?s ^{p.n3()} {b.n3()} }}", {c}),
+    )
+    for rdf_store in rdf_stores:
+        rdf_store_type: str = type(rdf_store).__name__
+        rdf_store.insert(g, ng)
+        for sparql, expected in queries:
+            for scope in (ng, None):
+                result = rdf_store.select(sparql, scope)
+                assert {
+                    row[0] for row in result
+                } == expected, f"{rdf_store_type} :: {sparql} in {scope}"
+        rdf_store.drop_graph(ng)
+        rdf_store.forget_graph(ng)
+
+
 @pytest.mark.usefixtures("rdf_stores", "sample_file_graph")
 def test_select_property_trajectory(
     rdf_stores: Iterable[RDFStore], sample_file_graph
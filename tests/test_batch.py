@@ -0,0 +1,204 @@
+#! /usr/bin/env python
+"""test_batch
+tests the splitting of inserts into batches limited in triples and bytes
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+from typing import List, Optional
+
+import pytest
+from conftest import make_sample_graph
+from rdflib import Dataset, Graph, Literal, URIRef
+from util4tests import run_single_test
+
+from pyrdfstore.batch import (
+    BatchInsertError,
+    batched,
+    insert_data,
+    split,
+    triple_lines,
+)
+from pyrdfstore.store import URIRDFStore
+
+
+def test_batched_by_triples():
+    lines = [f"<urn:s:{i}> <urn:p> <urn:o> ." for i in range(25)]
+    batches = list(batched(lines, max_triples=10, max_bytes=10**6))
+    assert [len(b) for b in batches] == [10, 10, 5]
+    assert sum(batches, []) == lines
+
+
+def test_batched_by_bytes():
+    small = "<urn:s> <urn:p> 'x' ."
+    large = "<urn:s> <urn:p> '" + "x" * 1000 + "' ."
+    lines = [small, small, large, small]
+    batches = list(batched(lines, max_triples=100, max_bytes=100))
+    assert batches == [[small, small], [large], [small]]
+
+
+def test_batched_nothing():
+    assert list(batched([], max_triples=1, max_bytes=1)) == []
+
+
+def test_split():
+    assert split(["a", "b", "c"]) == [["a"], ["b", "c"]]
+    with pytest.raises(AssertionError):
+        split(["a"])
+
+
+def test_insert_data_roundtrip():
+    g: Graph = make_sample_graph(range(5))
+    g.add((URIRef("urn:s"), URIRef("urn:p"), Literal('with "quotes"\n')))
+    sparql: str = insert_data(triple_lines(g), "urn:test:batch")
+    assert sparql.startswith("INSERT DATA { GRAPH <urn:test:batch> {")
+    ds = Dataset()
+    ds.update(sparql)
+    assert set(ds.graph(URIRef("urn:test:batch"))) == set(g)
+
+
+def test_insert_data_refuses_unsafe_graph():
+    with pytest.raises(Exception, match="not look like a valid URI"):
+        insert_data(["<urn:s> <urn:p> <urn:o> ."], "urn:x> } ; DROP ALL ; #")
+
+
+class LimitedHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    max_body: int = 0
+    accepted: List[str] = list()
+    rejected: int = 0
+    fail_marker: Optional[str] = None
+    delay: float = 0
+    active: int = 0
+    max_active: int = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass  # keep the test output clean
+
+    def do_POST(self):
+        size = int(self.headers["Content-Length"])
+        body = self.rfile.read(size).decode()
+        with LimitedHandler.lock:
+            LimitedHandler.active += 1
+            LimitedHandler.max_active = max(
+                LimitedHandler.active, LimitedHandler.max_active
+            )
+        sleep(LimitedHandler.delay)
+        status = 413 if size > LimitedHandler.max_body else 204
+        marker = LimitedHandler.fail_marker
+        if marker is not None and marker in body:
+            status = 500
+        with LimitedHandler.lock:
+            LimitedHandler.active -= 1
+            if status == 413:
+                LimitedHandler.rejected += 1
+            elif status == 204:
+                LimitedHandler.accepted.append(body)
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+@pytest.fixture()
+def limited_endpoint(monkeypatch):
+    monkeypatch.delenv("RDFSTORE_COMPRESSION", raising=False)
+    LimitedHandler.accepted = list()
+    LimitedHandler.rejected = 0
+    LimitedHandler.fail_marker = None
+    LimitedHandler.delay = 0
+    LimitedHandler.max_active = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), LimitedHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/repo"
+    server.shutdown()
+    server.server_close()
+
+
+def test_insert_splits_on_too_large(limited_endpoint: str):
+    LimitedHandler.max_body = 2000
+    g: Graph = make_sample_graph(range(60))
+    ng: str = "urn:test:batch:split"
+    with URIRDFStore(
+        limited_endpoint, limited_endpoint + "/statements", batch_bytes=10**6
+    ) as store:
+        store.insert(g, ng)
+    assert LimitedHandler.rejected > 0
+    inserts = [b for b in LimitedHandler.accepted if b.startswith("INSERT")]
+    assert len(inserts) > 1
+    sent = "\n".join(inserts)
+    for line in triple_lines(g):
+        assert sent.count(line) == 1, f"{line=} should be sent exactly once"
+
+
+def test_insert_too_large_single_triple_fails(limited_endpoint: str):
+    LimitedHandler.max_body = 100
+    g: Graph = make_sample_graph(["with-a-long-enough-name-to-be-rejected"])
+    with URIRDFStore(limited_endpoint, limited_endpoint + "/statements") as s:
+        with pytest.raises(Exception):
+            s.insert(g, "urn:test:batch:fail")
+
+
+def test_insert_uploads_concurrently(limited_endpoint: str):
+    LimitedHandler.max_body = 10**6
+    LimitedHandler.delay = 0.05
+    g: Graph = make_sample_graph(range(60))
+    with URIRDFStore(
+        limited_endpoint,
+        limited_endpoint + "/statements",
+        batch_triples=5,
+        upload_workers=4,
+    ) as store:
+        store.insert(g, "urn:test:batch:concurrent")
+    assert LimitedHandler.max_active > 1
+    inserts = [b for b in LimitedHandler.accepted if "dateModified" not in b]
+    assert len(inserts) == 12
+    # the registry is only updated after all batches landed
+    assert all("dateModified" in b for b in LimitedHandler.accepted[12:])
+
+
+def test_insert_failure_reports_batches(limited_endpoint: str):
+    LimitedHandler.max_body = 10**6
+    LimitedHandler.fail_marker = "subject-7>"
+    g: Graph = make_sample_graph(range(20))
+    with URIRDFStore(
+        limited_endpoint,
+        limited_endpoint + "/statements",
+        batch_triples=5,
+        upload_workers=2,
+    ) as store:
+        with pytest.raises(BatchInsertError) as exc_info:
+            store.insert(g, "urn:test:batch:failing")
+    error = exc_info.value
+    assert len(error.failed) == 1
+    assert len(error.landed) == len(LimitedHandler.accepted)
+    assert not set(error.landed) & set(error.failed)
+    assert not any("dateModified" in b for b in LimitedHandler.accepted)
+
+
+def test_single_roundtrip_writes(limited_endpoint: str):
+    LimitedHandler.max_body = 10**6
+    ng: str = "urn:test:batch:roundtrip"
+    with URIRDFStore(limited_endpoint, limited_endpoint + "/statements") as s:
+        s.insert(make_sample_graph(range(10)), ng)
+        assert len(LimitedHandler.accepted) == 1
+        assert "INSERT DATA" in LimitedHandler.accepted[0]
+        assert "dateModified" in LimitedHandler.accepted[0]
+        s.drop_graph(ng)
+        assert len(LimitedHandler.accepted) == 2
+        assert "DROP SILENT GRAPH" in LimitedHandler.accepted[1]
+        assert "dateModified" in LimitedHandler.accepted[1]
+        s.forget_graph(ng)
+        assert len(LimitedHandler.accepted) == 3
+        s.replace_graph(make_sample_graph(range(5)), ng)
+        assert len(LimitedHandler.accepted) == 4
+        replace: str = LimitedHandler.accepted[3]
+        assert replace.startswith("DROP SILENT GRAPH")
+        assert "INSERT DATA" in replace and "dateModified" in replace
+
+
+if __name__ == "__main__":
+    run_single_test(__file__)
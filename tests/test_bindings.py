@@ -0,0 +1,121 @@
+#! /usr/bin/env python
+"""test_bindings
+tests the selects with bindings, one or many at once
+"""
+
+from typing import Iterable
+
+import pytest
+from conftest import make_sample_graph
+from rdflib import Literal, URIRef, Variable
+from rdflib.plugins.sparql import prepareQuery
+from util4tests import run_single_test
+
+from pyrdfstore import CachingRDFStore, RDFStore
+from pyrdfstore.store import foldable, values_sparql
+
+NG = "urn:test:bindings"
+EX = "https://example.org/"
+LOOKUP = "SELECT ?o WHERE { ?s ?p ?o }"
+
+
+def _subject(i: int) -> URIRef:
+    return URIRef(f"{EX}subject-{i}")
+
+
+def test_values_sparql():
+    query = prepareQuery(LOOKUP)
+    s = Variable("s")
+    folded = values_sparql(
+        LOOKUP, query, [s], [(_subject(1),), (_subject(2),)]
+    )
+    # the bound variable gets projected, to split the rows per binding
+    assert set(prepareQuery(folded).algebra.PV) == {Variable("o"), s}
+    assert f"VALUES (?s) {{ (<{EX}subject-1>) (<{EX}subject-2>) }}" in folded
+    star = "SELECT * WHERE { ?s ?p ?o }"
+    folded = values_sparql(star, prepareQuery(star), [s], [(Literal(1),)])
+    assert folded.startswith("SELECT * WHERE {")
+    assert prepareQuery(folded).algebra.PV == prepareQuery(star).algebra.PV
+    commented = (
+        "# select the { objects of\nPREFIX select: <urn:select:>\n"
+        "SELECT DISTINCT (CONCAT('{', STR(?o)) AS ?x) (COUNT(*) AS ?n)\n"
+        "WHERE { ?s ?p ?o } GROUP BY ?o"
+    )
+    folded = values_sparql(
+        commented, prepareQuery(commented), [s], [(_subject(1),)]
+    )
+    assert folded.startswith(commented.partition("SELECT")[0])
+    assert set(prepareQuery(folded).algebra.PV) == {
+        Variable("x"),
+        Variable("n"),
+        s,
+    }
+    assert "WHERE { VALUES (?s)" in folded
+
+
+def test_foldable():
+    assert foldable(prepareQuery(LOOKUP))
+    assert foldable(
+        prepareQuery("SELECT DISTINCT ?o WHERE { ?s ?p ?o } ORDER BY ?o")
+    )
+    assert not foldable(prepareQuery("SELECT ?o WHERE { ?s ?p ?o } LIMIT 1"))
+    assert not foldable(
+        prepareQuery("SELECT (count(?o) as ?n) WHERE { ?s ?p ?o }")
+    )
+
+
+@pytest.mark.usefixtures("rdf_stores")
+def test_select_bindings(rdf_stores: Iterable[RDFStore]):
+    stores = list(rdf_stores)
+    stores.append(CachingRDFStore(stores[0]))
+    for rdf_store in stores:
+        rdf_store_type = type(rdf_store).__name__
+        rdf_store.replace_graph(make_sample_graph(range(5)), NG)
+        one = rdf_store.select(LOOKUP, NG, bindings={"s": _subject(1)})
+        assert [row.o for row in one] == [
+            URIRef(f"{EX}object-1")
+        ], f"{rdf_store_type} :: single binding"
+        # unknown and repeated subjects keep their place in the list
+        subjects = [2, 7, 3, 2]
+        many = rdf_store.select(
+            LOOKUP, NG, bindings=[{"?s": _subject(i)} for i in subjects]
+        )
+        assert len(many) == len(subjects)
+        for i, result in zip(subjects, many):
+            expected = [URIRef(f"{EX}object-{i}")] if i < 5 else []
+            assert [
+                row.o for row in result
+            ] == expected, f"{rdf_store_type} :: binding of subject {i}"
+            assert result.vars == [Variable("o")]
+        commented = rdf_store.select(
+            "# select the objects\n" + LOOKUP,
+            NG,
+            bindings=[{"s": _subject(i)} for i in (0, 1)],
+        )
+        assert [[row.o for row in r] for r in commented] == [
+            [URIRef(f"{EX}object-{i}")] for i in (0, 1)
+        ], f"{rdf_store_type} :: bindings of a commented query"
+        counts = rdf_store.select(
+            "SELECT (count(?o) as ?n) WHERE { ?s ?p ?o }",
+            NG,
+            bindings=[{"s": _subject(i)} for i in (0, 9)],
+        )
+        assert [int(list(r)[0][0]) for r in counts] == [
+            1,
+            0,
+        ], f"{rdf_store_type} :: aggregate per binding"
+
+
+def test_caching_bindings(rdf_stores: Iterable[RDFStore]):
+    store = CachingRDFStore(list(rdf_stores)[0])
+    store.replace_graph(make_sample_graph(range(3)), NG)
+    bindings = [{"s": _subject(i)} for i in range(3)]
+    store.select(LOOKUP, NG, bindings=bindings[:2])
+    assert (store.hits, store.misses) == (0, 2)
+    results = store.select(LOOKUP, NG, bindings=bindings)
+    assert (store.hits, store.misses) == (2, 3)
+    assert [len(result) for result in results] == [1, 1, 1]
+
+
+if __name__ == "__main__":
+    run_single_test(__file__)
@@ -0,0 +1,149 @@
+#! /usr/bin/env python
+"""test_cache
+tests the select results cache decorator and its invalidation
+"""
+
+import threading
+from pathlib import Path
+from typing import Iterable
+from uuid import uuid4
+
+import pytest
+from conftest import SELECT_ALL_SPO, make_sample_graph
+from util4tests import run_single_test
+
+from pyrdfstore.cache import CachingRDFStore, result_size
+from pyrdfstore.store import MemoryRDFStore, RDFStore
+
+
+@pytest.mark.usefixtures("rdf_stores")
+def test_cache_hits_and_invalidation(rdf_stores: Iterable[RDFStore]):
+    ng: str = f"urn:test:cache:{uuid4()}"
+    for rdf_store in rdf_stores:
+        rdf_store_type: str = type(rdf_store).__name__
+        cache = CachingRDFStore(rdf_store)
+        cache.insert(make_sample_graph(range(3)), ng)
+        assert len(cache.select(SELECT_ALL_SPO, ng)) == 3
+        assert len(cache.select(SELECT_ALL_SPO, ng)) == 3
+        assert (cache.hits, cache.misses) == (1, 1), rdf_store_type
+
+        cache.insert(make_sample_graph(range(3, 5)), ng)
+        assert len(cache.select(SELECT_ALL_SPO, ng)) == 5, rdf_store_type
+        assert cache.misses == 2
+
+        cache.drop_graph(ng)
+        assert len(cache.select(SELECT_ALL_SPO, ng)) == 0, rdf_store_type
+        cache.forget_graph(ng)
+        assert len(cache) == 0
+
+
+@pytest.mark.usefixtures("rdf_stores")
+def test_cache_check_lastmod(rdf_stores: Iterable[RDFStore]):
+    ng: str = f"urn:test:cache:lastmod:{uuid4()}"
+    for rdf_store in rdf_stores:
+        rdf_store_type: str = type(rdf_store).__name__
+        cache = CachingRDFStore(rdf_store, check_lastmod=True)
+        cache.insert(make_sample_graph(range(3)), ng)
+        assert len(cache.select(SELECT_ALL_SPO, ng)) == 3
+        # a write elsewhere, i.e. not passing through the cache
+        rdf_store.insert(make_sample_graph(range(3, 4)), ng)
+        assert len(cache.select(SELECT_ALL_SPO, ng)) == 4, rdf_store_type
+        assert len(cache.select(SELECT_ALL_SPO, ng)) == 4
+        assert (cache.hits, cache.misses) == (1, 2), rdf_store_type
+        cache.forget_graph(ng)
+
+
+def test_cache_evicts_least_recently_used():
+    store = MemoryRDFStore()
+    ngs = [f"urn:test:cache:lru:{i}" for i in range(3)]
+    for ng in ngs:
+        store.insert(make_sample_graph(range(20)), ng)
+    one_size: int = result_size(store.select(SELECT_ALL_SPO, ngs[0]))
+    cache = CachingRDFStore(store, max_bytes=int(2.5 * one_size))
+    cache.select(SELECT_ALL_SPO, ngs[0])
+    cache.select(SELECT_ALL_SPO, ngs[1])
+    cache.select(SELECT_ALL_SPO, ngs[0])  # refresh the first
+    cache.select(SELECT_ALL_SPO, ngs[2])  # should evict the second
+    assert len(cache) == 2
+    assert cache.size_bytes <= int(2.5 * one_size)
+    cache.select(SELECT_ALL_SPO, ngs[0])
+    assert cache.hits == 2
+    cache.select(SELECT_ALL_SPO, ngs[1])
+    assert cache.misses == 4
+
+
+def test_cache_on_disk(tmp_path: Path):
+    store = MemoryRDFStore()
+    ng: str = "urn:test:cache:disk"
+    store.insert(make_sample_graph(range(4)), ng)
+    expected = set(store.select(SELECT_ALL_SPO, ng))
+
+    first = CachingRDFStore(store, cache_dir=tmp_path, check_lastmod=True)
+    first.select(SELECT_ALL_SPO, ng)
+    # a new instance (as after a restart) is served from disk
+    second = CachingRDFStore(store, cache_dir=tmp_path, check_lastmod=True)
+    assert set(second.select(SELECT_ALL_SPO, ng)) == expected
+    assert (second.hits, second.misses) == (1, 0)
+
+    second.drop_graph(ng)
+    third = CachingRDFStore(store, cache_dir=tmp_path)
+    assert len(third.select(SELECT_ALL_SPO, ng)) == 0
+    assert third.misses == 1
+
+
+def test_cache_on_disk_cleared_without_check_lastmod(tmp_path: Path):
+    store = MemoryRDFStore()
+    ng: str = "urn:test:cache:disk:unchecked"
+    store.insert(make_sample_graph(range(4)), ng)
+    CachingRDFStore(store, cache_dir=tmp_path).select(SELECT_ALL_SPO, ng)
+    store.insert(make_sample_graph(range(4, 6)), ng)  # while "restarting"
+    restarted = CachingRDFStore(store, cache_dir=tmp_path)
+    assert len(restarted.select(SELECT_ALL_SPO, ng)) == 6
+    assert restarted.misses == 1
+
+
+class WriteWhileSelecting(MemoryRDFStore):
+    """lets a write (through the cache) land right after
+    the select read its (then outdated) result
+    """
+
+    def select(self, *args, **kwargs):
+        result = super().select(*args, **kwargs)
+        while self.pending:
+            self.cache.insert(*self.pending.pop())
+        return result
+
+
+def test_cache_skips_result_overlapping_write(tmp_path: Path):
+    store = WriteWhileSelecting()
+    ng: str = "urn:test:cache:overlap"
+    store.insert(make_sample_graph(range(2)), ng)
+    store.cache = CachingRDFStore(store, cache_dir=tmp_path)
+    store.pending = [(make_sample_graph(range(2, 3)), ng)]
+    assert len(store.cache.select(SELECT_ALL_SPO, ng)) == 2
+    assert len(store.cache) == 0, "outdated result should not be kept"
+    assert len(store.cache.select(SELECT_ALL_SPO, ng)) == 3
+    assert len(store.cache.select(SELECT_ALL_SPO, ng)) == 3
+    assert (store.cache.hits, store.cache.misses) == (1, 2)
+
+
+def test_cache_counts_concurrent_selects():
+    store = MemoryRDFStore()
+    ng: str = "urn:test:cache:counts"
+    store.insert(make_sample_graph(range(2)), ng)
+    cache = CachingRDFStore(store)
+
+    def select_often():
+        for _ in range(200):
+            cache.select(SELECT_ALL_SPO, ng)
+
+    threads = [threading.Thread(target=select_often) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.hits + cache.misses == 800
+
+
+if __name__ == "__main__":
+    run_single_test(__file__)
@@ -0,0 +1,112 @@
+#! /usr/bin/env python
+"""test_gsp
+tests the graph store protocol client against a tiny local graph store
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from conftest import make_sample_graph
+from rdflib import Graph
+from util4tests import run_single_test
+
+from pyrdfstore.gsp import GraphStoreClient
+from pyrdfstore.pool import HTTPConnectionPool
+
+
+class GraphStoreHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    graphs: dict = dict()
+    content_types: list = list()
+
+    def log_message(self, *args):
+        pass  # keep the test output clean
+
+    def _graph_name(self) -> str:
+        return parse_qs(urlparse(self.path).query)["graph"][0]
+
+    def _reply(self, status: int, data: bytes = b"", ctype="text/plain"):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> Graph:
+        data = self.rfile.read(int(self.headers["Content-Length"]))
+        self.content_types.append(self.headers["Content-Type"])
+        return Graph().parse(data=data, format="nt")
+
+    def do_POST(self):
+        ng = self._graph_name()
+        self.graphs.setdefault(ng, Graph())
+        self.graphs[ng] += self._body()
+        self._reply(204)
+
+    def do_PUT(self):
+        self.graphs[self._graph_name()] = self._body()
+        self._reply(201)
+
+    def do_DELETE(self):
+        if self.graphs.pop(self._graph_name(), None) is None:
+            return self._reply(404)
+        self._reply(204)
+
+    def do_GET(self):
+        graph = self.graphs.get(self._graph_name())
+        if graph is None:
+            return self._reply(404)
+        data = graph.serialize(format="nt").encode()
+        self._reply(200, data, "application/n-triples")
+
+
+@pytest.fixture()
+def gsp_uri():
+    GraphStoreHandler.graphs = dict()
+    GraphStoreHandler.content_types = list()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GraphStoreHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/rdf-graphs/service"
+    server.shutdown()
+    server.server_close()
+
+
+def test_graph_url():
+    client = GraphStoreClient("http://localhost/gsp", HTTPConnectionPool(1))
+    assert (
+        client.graph_url("urn:a:b") == "http://localhost/gsp?graph=urn%3Aa%3Ab"
+    )
+    assert client.graph_url(None) == "http://localhost/gsp?default"
+    with pytest.raises(AssertionError):
+        GraphStoreClient("http://localhost/gsp", None, format="rdfxml")
+
+
+@pytest.mark.parametrize("format", ["nt", "turtle"])
+def test_post_get_put_delete(gsp_uri: str, format: str):
+    ng: str = "urn:test:gsp"
+    g1: Graph = make_sample_graph(range(5))
+    g2: Graph = make_sample_graph(range(5, 8))
+    lines = [line.strip() for line in g1.serialize(format="nt").splitlines()]
+    with HTTPConnectionPool(maxsize=1) as pool:
+        client = GraphStoreClient(gsp_uri, pool, format)
+        assert len(client.get(ng)) == 0
+        client.post(lines[:2], ng)
+        client.post(lines[2:], ng)
+        assert set(client.get(ng)) == set(g1)
+        client.put(g2.serialize(format="nt").splitlines(), ng)
+        assert set(client.get(ng)) == set(g2)
+        client.delete(ng)
+        client.delete(ng)  # unknown graphs are silently ignored
+        assert len(client.get(ng)) == 0
+    assert all(
+        ct.startswith(client.mime_type)
+        for ct in GraphStoreHandler.content_types
+    )
+
+
+if __name__ == "__main__":
+    run_single_test(__file__)
@@ -0,0 +1,99 @@
+#! /usr/bin/env python
+"""test_named_graphs
+tests the selects narrowed to a set of named_graphs
+"""
+
+from typing import Iterable
+
+import pytest
+from conftest import make_sample_graph
+from rdflib import URIRef
+from util4tests import run_single_test
+
+from pyrdfstore import CachingRDFStore, RDFStore
+from pyrdfstore.store import URIRDFStore
+
+# (a and b are owned by the same shard of two, d by the other)
+NG_A = "urn:test:graphs:a"
+NG_B = "urn:test:graphs:b"
+NG_D = "urn:test:graphs:d"
+EX = "https://example.org/"
+SUBJECTS = "SELECT DISTINCT ?s WHERE { ?s ?p ?o }"
+
+
+def _subjects(result) -> set:
+    return {int(str(row.s).rpartition("-")[2]) for row in result}
+
+
+def _fill(rdf_store: RDFStore) -> None:
+    rdf_store.replace_graph(make_sample_graph(range(0, 3)), NG_A)
+    rdf_store.replace_graph(make_sample_graph(range(2, 5)), NG_B)
+    rdf_store.replace_graph(make_sample_graph(range(5, 7)), NG_D)
+
+
+@pytest.mark.usefixtures("rdf_stores")
+def test_select_named_graphs(rdf_stores: Iterable[RDFStore]):
+    for rdf_store in rdf_stores:
+        rdf_store_type = type(rdf_store).__name__
+        _fill(rdf_store)
+        for named_graphs, expected in (
+            ([NG_A, NG_B], {0, 1, 2, 3, 4}),
+            ([NG_A, NG_D], {0, 1, 2, 5, 6}),
+            ([NG_D], {5, 6}),
+            ([NG_A, "urn:test:graphs:unknown"], {0, 1, 2}),
+        ):
+            result = rdf_store.select(SUBJECTS, named_graphs=named_graphs)
+            assert (
+                _subjects(result) == expected
+            ), f"{rdf_store_type} :: subjects of {named_graphs}"
+        rows = list(
+            rdf_store.select_iter(SUBJECTS, named_graphs=iter([NG_B, NG_D]))
+        )
+        assert _subjects(rows) == {2, 3, 4, 5, 6}, f"{rdf_store_type} :: iter"
+        counts = rdf_store.select(
+            "SELECT (count(?o) as ?n) WHERE { ?s ?p ?o }",
+            named_graphs=[NG_A, NG_D],
+            bindings=[{"s": URIRef(f"{EX}subject-{i}")} for i in (1, 3, 6)],
+        )
+        assert [int(list(r)[0][0]) for r in counts] == [
+            1,
+            0,
+            1,
+        ], f"{rdf_store_type} :: bindings within the named_graphs"
+        if isinstance(rdf_store, URIRDFStore):
+            continue  # the named graphs of the endpoint are not narrowed
+        per_graph = rdf_store.select(
+            "SELECT DISTINCT ?g WHERE { GRAPH ?g { ?s ?p ?o } }",
+            named_graphs=[NG_A, NG_D],
+        )
+        assert {str(row.g) for row in per_graph} == {
+            NG_A,
+            NG_D,
+        }, f"{rdf_store_type} :: graphs seen"
+
+
+@pytest.mark.usefixtures("rdf_stores")
+def test_narrowed_once(rdf_stores: Iterable[RDFStore]):
+    rdf_store = list(rdf_stores)[0]
+    with pytest.raises(AssertionError):
+        rdf_store.select(SUBJECTS, NG_A, named_graphs=[NG_B])
+    with pytest.raises(AssertionError):
+        rdf_store.select(SUBJECTS, named_graphs=[])
+
+
+def test_caching_named_graphs(rdf_stores: Iterable[RDFStore]):
+    store = CachingRDFStore(list(rdf_stores)[0])
+    _fill(store)
+    store.select(SUBJECTS, named_graphs=[NG_A, NG_B])
+    result = store.select(SUBJECTS, named_graphs=[NG_B, NG_A])
+    assert (store.hits, store.misses) == (1, 1)
+    assert _subjects(result) == {0, 1, 2, 3, 4}
+    # a write to any graph invalidates
+    store.replace_graph(make_sample_graph(range(7, 8)), NG_B)
+    result = store.select(SUBJECTS, named_graphs=[NG_A, NG_B])
+    assert (store.hits, store.misses) == (1, 2)
+    assert _subjects(result) == {0, 1, 2, 7}
+
+
+if __name__ == "__main__":
+    run_single_test(__file__)
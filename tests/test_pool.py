@@ -0,0 +1,190 @@
+#! /usr/bin/env python
+"""test_pool
+tests the keep-alive connection pool against a tiny local http server
+"""
+
+import gzip
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+
+import pytest
+from util4tests import run_single_test
+
+from pyrdfstore.pool import COMPRESS_MIN_BYTES, HTTPConnectionPool
+from pyrdfstore.store import URIRDFStore
+
+
+class CountingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # needed for keep-alive
+    connections: int = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with CountingHandler.lock:
+            CountingHandler.connections += 1
+
+    def log_message(self, *args):
+        pass  # keep the test output clean
+
+    def _reply(self, status: int, data: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.startswith("/missing"):
+            return self._reply(404, b"not here")
+        self._reply(200, self.path.encode())
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self._reply(200, body)
+
+
+@pytest.fixture()
+def http_base():
+    CountingHandler.connections = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CountingHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_connection_reuse(http_base: str):
+    with HTTPConnectionPool(maxsize=2) as pool:
+        for i in range(10):
+            resp = pool.request("GET", f"{http_base}/path/{i}")
+            assert resp.status == 200
+            assert resp.data == f"/path/{i}".encode()
+        resp = pool.request("POST", f"{http_base}/echo", b"some-body")
+        assert resp.data == b"some-body"
+        assert resp.content_type == "text/plain"
+        assert pool.num_idle == 1
+    assert CountingHandler.connections == 1
+    assert pool.num_idle == 0
+
+
+def test_concurrent_use_is_bounded(http_base: str):
+    size: int = 3
+    pool = HTTPConnectionPool(maxsize=size)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(
+            executor.map(
+                lambda i: pool.request("GET", f"{http_base}/{i}").data,
+                range(40),
+            )
+        )
+    assert results == [f"/{i}".encode() for i in range(40)]
+    assert CountingHandler.connections <= size
+    assert pool.num_idle <= size
+    pool.close()
+
+
+def test_error_status_raises(http_base: str):
+    pool = HTTPConnectionPool(maxsize=1)
+    with pytest.raises(HTTPError) as exc_info:
+        pool.request("GET", f"{http_base}/missing")
+    assert exc_info.value.code == 404
+    # the connection is still fine for reuse
+    assert pool.request("GET", f"{http_base}/ok").status == 200
+    assert CountingHandler.connections == 1
+    pool.close()
+
+
+def test_reconnect_after_close(http_base: str):
+    pool = HTTPConnectionPool(maxsize=1)
+    pool.request("GET", f"{http_base}/first")
+    pool.close()
+    assert pool.request("GET", f"{http_base}/again").status == 200
+    assert CountingHandler.connections == 2
+    pool.close()
+
+
+class CompressingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass  # keep the test output clean
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        received = self.headers.get("Content-Encoding") or "identity"
+        if received == "gzip":
+            body = gzip.decompress(body)
+        elif received == "deflate":
+            body = zlib.decompress(body)
+        # reply the decoded body, gzipped if accepted
+        accepted = self.headers.get("Accept-Encoding") or ""
+        encoded = "gzip" in accepted
+        data = gzip.compress(body) if encoded else body
+        self.send_response(200)
+        self.send_header("X-Received-Encoding", received)
+        if encoded:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture()
+def compressing_base():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CompressingHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("compression", ["gzip", "deflate"])
+def test_compression(compressing_base: str, compression: str):
+    body: bytes = b"<urn:s> <urn:p> <urn:o> .\n" * 100
+    assert len(body) >= COMPRESS_MIN_BYTES
+    with HTTPConnectionPool(maxsize=1, compression=compression) as pool:
+        resp = pool.request("POST", compressing_base, body, compress=True)
+        assert resp.headers["X-Received-Encoding"] == compression
+        assert resp.data == body
+        # only bodies that ask for it are compressed
+        resp = pool.request("POST", compressing_base, body)
+        assert resp.headers["X-Received-Encoding"] == "identity"
+        assert resp.data == body
+        # small bodies are not worth it
+        resp = pool.request("POST", compressing_base, b"tiny", compress=True)
+        assert resp.headers["X-Received-Encoding"] == "identity"
+
+
+def test_no_compression_by_default(compressing_base: str, monkeypatch):
+    monkeypatch.delenv("RDFSTORE_COMPRESSION", raising=False)
+    body: bytes = b"x" * 2 * COMPRESS_MIN_BYTES
+    with HTTPConnectionPool(maxsize=1) as pool:
+        resp = pool.request("POST", compressing_base, body, compress=True)
+        assert resp.headers["X-Received-Encoding"] == "identity"
+        assert "Content-Encoding" not in resp.headers
+        assert resp.data == body
+    with pytest.raises(AssertionError):
+        HTTPConnectionPool(compression="brotli")
+
+
+def test_store_reuses_sparql_store():
+    with URIRDFStore("http://localhost/read", "http://localhost/write") as s:
+        assert s.sparql_store is s.sparql_store
+        other = []
+        thread = threading.Thread(target=lambda: other.append(s.sparql_store))
+        thread.start()
+        thread.join()
+        assert other[0] is not s.sparql_store
+        assert other[0]._pool is s.sparql_store._pool
+
+
+if __name__ == "__main__":
+    run_single_test(__file__)
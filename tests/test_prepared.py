@@ -0,0 +1,38 @@
+#! /usr/bin/env python
+"""test_prepared
+tests the cache of prepared queries of the in memory store
+"""
+
+from conftest import make_sample_graph
+from util4tests import run_single_test
+
+from pyrdfstore.store import MemoryRDFStore, PreparedQueries
+
+NG = "urn:test:prepared"
+
+
+def test_lru_bounded():
+    cache = PreparedQueries(2)
+    queries = [f"SELECT ?s WHERE {{ ?s ?p {i} }}" for i in range(3)]
+    for sparql in queries:
+        cache.get(sparql)
+    assert len(cache) == 2 and cache.misses == 3 and cache.hits == 0
+    assert cache.get(queries[2]) is cache.get(queries[2])
+    assert cache.hits == 2
+    cache.get(queries[0])  # was evicted as least recently used
+    assert cache.misses == 4 and len(cache) == 2
+
+
+def test_select_hits():
+    store = MemoryRDFStore(cleaner=lambda g: g)
+    store.insert(make_sample_graph(range(5)), NG)
+    sparql = "SELECT ?o WHERE { <https://example.org/subject-1> ?p ?o }"
+    results = [list(store.select(sparql, NG)) for _ in range(3)]
+    results.append(list(store.select(sparql)))
+    assert all(len(rows) == 1 for rows in results)
+    assert store.query_cache.misses == 1
+    assert store.query_cache.hits == 3
+
+
+if __name__ == "__main__":
+    run_single_test(__file__)
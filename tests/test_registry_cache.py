@@ -0,0 +1,73 @@
+#! /usr/bin/env python
+"""test_registry_cache
+tests the write-through in-process cache of the lastmod registry
+"""
+
+from time import sleep
+
+from util4tests import run_single_test
+
+from pyrdfstore.store import LastmodCache, URIRDFStore, timestamp
+
+
+class CountingLoader:
+    def __init__(self, registry: dict):
+        self.registry = registry
+        self.calls: int = 0
+
+    def __call__(self) -> dict:
+        self.calls += 1
+        return dict(self.registry)
+
+
+def test_loads_once_and_writes_through():
+    ts = timestamp()
+    loader = CountingLoader({"urn:a": ts})
+    cache = LastmodCache(loader, ttl=60)
+    cache.set("urn:ignored", ts)  # nothing loaded yet, so nothing to update
+    assert loader.calls == 0
+
+    assert cache.get("urn:a") == ts
+    assert cache.get("urn:unknown") is None
+    assert loader.calls == 1
+
+    later = timestamp()
+    cache.set("urn:b", later)
+    cache.set("urn:a", None)
+    assert cache.get_many(["urn:a", "urn:b"]) == {
+        "urn:a": None,
+        "urn:b": later,
+    }
+    assert cache.snapshot() == {"urn:b": later}
+    assert loader.calls == 1
+
+
+def test_reloads_after_ttl():
+    loader = CountingLoader({"urn:a": timestamp()})
+    cache = LastmodCache(loader, ttl=0.05)
+    assert set(cache.snapshot()) == {"urn:a"}
+    loader.registry["urn:elsewhere"] = timestamp()  # written by others
+    assert set(cache.snapshot()) == {"urn:a"}
+    sleep(0.1)
+    assert set(cache.snapshot()) == {"urn:a", "urn:elsewhere"}
+    assert loader.calls == 2
+
+
+def test_invalidate():
+    loader = CountingLoader({})
+    cache = LastmodCache(loader, ttl=60)
+    cache.snapshot()
+    cache.invalidate()
+    cache.snapshot()
+    assert loader.calls == 2
+
+
+def test_explicit_zero_ttl_disables(monkeypatch):
+    monkeypatch.setenv("RDFSTORE_REGISTRY_TTL", "60")
+    read_uri = "http://localhost:1/repositories/x"
+    assert URIRDFStore(read_uri)._registry_cache is not None
+    assert URIRDFStore(read_uri, registry_ttl=0)._registry_cache is None
+
+
+if __name__ == "__main__":
+    run_single_test(__file__)
@@ -0,0 +1,167 @@
+#! /usr/bin/env python
+"""test_results
+tests the fast path parsing of the negotiable sparql result formats
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from rdflib import BNode, Literal, URIRef, Variable
+from rdflib.namespace import XSD
+from util4tests import run_single_test
+
+from pyrdfstore.results import (
+    RESULT_FORMATS,
+    parse_csv,
+    parse_json,
+    parse_results,
+    parse_tsv,
+)
+from pyrdfstore.store import URIRDFStore
+
+TSV_SAMPLE: bytes = (
+    "?s\t?o\t?x\n"
+    '<urn:s:1>\t"tab\\there"@en\t\n'
+    '_:b0\t"42"^^<http://www.w3.org/2001/XMLSchema#integer>\t<urn:x>\n'
+    '<urn:s:3>\t"with \\"quotes\\""\t\n'
+).encode("utf-8")
+
+CSV_SAMPLE: bytes = (
+    "s,o,x\r\n"
+    'urn:s:1,"comma, inside",\r\n'
+    "_:b0,42,http://example.org/x\r\n"
+).encode("utf-8")
+
+JSON_SAMPLE: bytes = b"""{
+  "head": {"vars": ["s", "o", "x"]},
+  "results": {"bindings": [
+    {"s": {"type": "uri", "value": "urn:s:1"},
+     "o": {"type": "literal", "value": "hi", "xml:lang": "en"}},
+    {"s": {"type": "bnode", "value": "b0"},
+     "o": {"type": "literal", "value": "42",
+           "datatype": "http://www.w3.org/2001/XMLSchema#integer"},
+     "x": {"type": "uri", "value": "urn:x"}}
+  ]}
+}"""
+
+
+def test_parse_tsv():
+    result = parse_tsv(TSV_SAMPLE)
+    assert result.vars == [Variable("s"), Variable("o"), Variable("x")]
+    rows = list(result)
+    assert len(rows) == 3
+    assert rows[0].s == URIRef("urn:s:1")
+    assert rows[0].o == Literal("tab\there", lang="en")
+    assert rows[0].x is None
+    assert isinstance(rows[1].s, BNode)
+    assert rows[1].o == Literal(42)
+    assert rows[1].o.datatype == XSD.integer
+    assert rows[1].x == URIRef("urn:x")
+    assert rows[2].o == Literal('with "quotes"')
+
+
+def test_parse_tsv_raw():
+    rows = parse_tsv(TSV_SAMPLE, raw=True)
+    assert rows[0] == ("<urn:s:1>", '"tab\\there"@en', None)
+    assert rows[1][2] == "<urn:x>"
+
+
+def test_parse_tsv_empty():
+    assert len(parse_tsv(b"?s\n")) == 0
+    assert parse_tsv(b"", raw=True) == []
+
+
+def test_parse_tsv_line_breaks_in_literals():
+    data: bytes = (
+        '?s\t?o\r\n<http://a>\t"x\x0cy"\r\n<http://b>\t"p\u2028q\x85r"\n'
+    ).encode("utf-8")
+    rows = list(parse_tsv(data))
+    assert len(rows) == 2
+    assert rows[0].o == Literal("x\x0cy")
+    assert rows[1].s == URIRef("http://b")
+    assert rows[1].o == Literal("p\u2028q\x85r")
+
+
+def test_parse_csv():
+    rows = list(parse_csv(CSV_SAMPLE))
+    assert rows[0].s == Literal("urn:s:1")  # csv can not tell uris apart
+    assert rows[0].o == Literal("comma, inside")
+    assert rows[0].x is None
+    assert isinstance(rows[1].s, BNode)
+    assert rows[1].x == URIRef("http://example.org/x")
+    raw = parse_csv(CSV_SAMPLE, raw=True)
+    assert raw[1] == ("_:b0", "42", "http://example.org/x")
+
+
+def test_parse_json():
+    rows = list(parse_json(JSON_SAMPLE))
+    assert rows[0].s == URIRef("urn:s:1")
+    assert rows[0].o == Literal("hi", lang="en")
+    assert rows[0].x is None
+    assert rows[1].s == BNode("b0")
+    assert rows[1].o == Literal(42)
+    raw = parse_json(JSON_SAMPLE, raw=True)
+    assert raw == [("urn:s:1", "hi", None), ("b0", "42", "urn:x")]
+
+
+def test_parse_results_fallback():
+    xml: bytes = parse_json(JSON_SAMPLE).serialize(format="xml")
+    result = parse_results(xml, RESULT_FORMATS["xml"])
+    assert [row.s for row in result] == [URIRef("urn:s:1"), BNode("b0")]
+    raw = parse_results(xml, RESULT_FORMATS["xml"], raw=True)
+    assert raw[0] == ("urn:s:1", "hi", None)
+
+
+class CannedHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    accepted: list = list()
+
+    def log_message(self, *args):
+        pass  # keep the test output clean
+
+    def do_GET(self):
+        accept: str = self.headers["Accept"]
+        CannedHandler.accepted.append(accept)
+        data = {
+            RESULT_FORMATS["tsv"]: TSV_SAMPLE,
+            RESULT_FORMATS["csv"]: CSV_SAMPLE,
+        }.get(accept, JSON_SAMPLE)
+        self.send_response(200)
+        content_type = accept if accept in RESULT_FORMATS.values() else ""
+        self.send_header(
+            "Content-Type", content_type or RESULT_FORMATS["json"]
+        )
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture()
+def canned_endpoint():
+    CannedHandler.accepted = list()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CannedHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/repo"
+    server.shutdown()
+    server.server_close()
+
+
+def test_select_negotiates_format(canned_endpoint: str):
+    sparql: str = "SELECT ?s ?o ?x WHERE { ?s ?o ?x }"
+    with URIRDFStore(canned_endpoint) as store:
+        for fmt in ("tsv", "csv", "json"):
+            result = store.select(sparql, result_format=fmt)
+            assert len(result) == len(list(result))
+            assert CannedHandler.accepted[-1] == RESULT_FORMATS[fmt]
+        raw = store.select(sparql, raw=True)
+        assert CannedHandler.accepted[-1] == RESULT_FORMATS["tsv"]
+        assert raw[0][0] == "<urn:s:1>"
+        with pytest.raises(AssertionError):
+            store.select(sparql, result_format="yaml")
+
+
+if __name__ == "__main__":
+    run_single_test(__file__)
@@ -0,0 +1,108 @@
+#! /usr/bin/env python
+"""test_shards
+tests the routing and the scatter-gather selects of the sharded store
+"""
+
+import pytest
+from conftest import make_sample_graph
+from rdflib import Literal, URIRef
+from rdflib.plugins.sparql import prepareQuery
+from util4tests import run_single_test
+
+from pyrdfstore.shards import ShardedMemoryRDFStore, per_graph, triple_patterns
+from pyrdfstore.store import MemoryRDFStore
+
+NGS = [f"urn:test:shards:{i}" for i in range(6)]
+QUERIES = [
+    "SELECT ?s ?o WHERE { ?s ?p ?o }",
+    "SELECT (count(*) as ?n) WHERE { ?s ?p ?o }",
+    "SELECT DISTINCT ?g WHERE { GRAPH ?g { ?s ?p ?o } }",
+    "SELECT ?g (count(*) as ?n) WHERE { GRAPH ?g { ?s ?p ?o } } GROUP BY ?g",
+    "SELECT ?s WHERE { ?s <https://example.org/predicate-3> ?o }",
+    "SELECT ?s ?z WHERE { ?s ?p ?o . OPTIONAL { ?o ?q ?z } }",
+]
+
+
+@pytest.fixture(scope="module")
+def stores():
+    sharded = ShardedMemoryRDFStore(3, cleaner=lambda g: g)
+    memory = MemoryRDFStore(cleaner=lambda g: g)
+    for store in (sharded, memory):
+        for i, ng in enumerate(NGS):
+            store.insert(make_sample_graph(range(i * 5, i * 5 + 8)), ng)
+    yield sharded, memory
+    sharded.close()
+
+
+def test_per_graph():
+    def check(sparql):
+        return per_graph(prepareQuery(sparql).algebra)
+
+    assert check("SELECT ?s WHERE { GRAPH ?g { ?s ?p ?o } }") is False
+    assert check("SELECT DISTINCT ?g WHERE { GRAPH ?g { ?s ?p ?o } }")
+    assert check("SELECT ?s WHERE { ?s ?p ?o }") is None
+    assert (
+        check("SELECT ?g WHERE { GRAPH ?g { ?s ?p ?o } } ORDER BY ?g") is None
+    )
+
+
+def test_triple_patterns():
+    def patterns(sparql):
+        return triple_patterns(prepareQuery(sparql).algebra, set())
+
+    assert patterns(
+        "SELECT * WHERE { ?s <urn:p> ?o OPTIONAL { ?o ?q 'x' } }"
+    ) == {(None, URIRef("urn:p"), None), (None, None, Literal("x"))}
+    # the hops of property paths could match anything
+    assert patterns("SELECT * WHERE { ?s <urn:p>/<urn:q> ?o }") == {
+        (None, None, None)
+    }
+
+
+@pytest.mark.parametrize("sparql", QUERIES)
+def test_union_select_like_memory(stores, sparql):
+    sharded, memory = stores
+    expected = sorted(map(tuple, memory.select(sparql)))
+    assert sorted(map(tuple, sharded.select(sparql))) == expected
+
+
+def test_graph_routing(stores):
+    sharded, memory = stores
+    assert len({sharded.shard_of(ng) for ng in NGS}) > 1
+    assert sorted(sharded.named_graphs) == sorted(memory.named_graphs)
+    for ng in NGS:
+        got = sorted(map(tuple, sharded.select(QUERIES[0], ng)))
+        assert got == sorted(map(tuple, memory.select(QUERIES[0], ng)))
+        assert sharded.lastmod_ts(ng) is not None
+    unknown = "urn:test:shards:unknown"
+    lastmods = sharded.lastmod_ts_many(NGS + [unknown])
+    assert lastmods[unknown] is None and lastmods[NGS[0]] is not None
+
+
+def test_errors_raised(stores):
+    sharded, _ = stores
+    with pytest.raises(AssertionError):
+        sharded.replace_graph(make_sample_graph(range(1)), None)
+
+
+def test_replies_paired_after_errors():
+    with ShardedMemoryRDFStore(2, cleaner=lambda g: g) as sharded:
+        sharded.insert(make_sample_graph(range(3)), NGS[0])
+        # the call to shard 1 can not be sent, that to shard 0 was
+        with pytest.raises(Exception):
+            sharded._scatter(
+                {0: ("lastmod_ts", NGS[0]), 1: ("lastmod_ts", lambda: 0)}
+            )
+        assert sharded._scatter({0: ("named_graphs",)})[0] == [NGS[0]]
+        # the reply of shard 0 is still read if shard 1 is gone
+        sharded._workers[1].terminate()
+        sharded._workers[1].join()
+        with pytest.raises((OSError, EOFError)):
+            sharded._broadcast("named_graphs")
+        assert sharded._scatter({0: ("named_graphs",)})[0] == [NGS[0]]
+        with pytest.raises(OSError):
+            sharded._scatter({1: ("named_graphs",)})
+
+
+if __name__ == "__main__":
+    run_single_test(__file__)
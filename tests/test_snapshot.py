@@ -0,0 +1,90 @@
+#! /usr/bin/env python
+"""test_snapshot
+tests saving and loading the in memory stores as binary snapshots
+"""
+
+from array import array
+from pathlib import Path
+from typing import List
+
+import pytest
+from conftest import make_sample_graph
+from rdflib import BNode, Graph, Literal, URIRef
+from util4tests import run_single_test
+
+from pyrdfstore.snapshot import Snapshot, packed, write_snapshot
+from pyrdfstore.store import MemoryRDFStore
+
+NG = "urn:test:snapshot:"
+COUNT_ALL = "SELECT (count(*) as ?n) WHERE { ?s ?p ?o }"
+
+
+def _store_types() -> List[type]:
+    types: List[type] = [MemoryRDFStore]
+    try:
+        from pyrdfstore.arrays import ArrayRDFStore
+
+        types.append(ArrayRDFStore)
+    except ImportError:
+        pass
+    return types
+
+
+def _filled(store_type: type) -> MemoryRDFStore:
+    store = store_type()
+    store.replace_graph(make_sample_graph(range(20)), NG + "one")
+    extra = Graph()
+    extra.add((BNode("b"), URIRef("urn:p"), Literal("tekst", lang="nl")))
+    extra.add((URIRef("urn:s"), URIRef("urn:p"), Literal(42)))
+    store.insert(extra, NG + "two")
+    store.insert(make_sample_graph(range(3)))  # into the default graph
+    return store
+
+
+@pytest.mark.parametrize("saved_by", _store_types())
+@pytest.mark.parametrize("loaded_by", _store_types())
+def test_snapshot_roundtrip(tmp_path: Path, saved_by: type, loaded_by: type):
+    original = _filled(saved_by)
+    path = tmp_path / "store.snapshot"
+    original.save_snapshot(path)
+
+    loaded = loaded_by()
+    loaded.insert(make_sample_graph(range(5)), NG + "gone")
+    loaded.load_snapshot(path)
+    assert set(loaded.named_graphs) == set(original.named_graphs)
+    for ng in original.named_graphs:
+        assert loaded.lastmod_ts(ng) == original.lastmod_ts(ng)
+        assert loaded.fingerprint(ng) == original.fingerprint(ng)
+        assert set(loaded.fetch_graph(ng)) == set(original.fetch_graph(ng))
+    assert len(loaded.fetch_graph(NG + "gone")) == 0
+    assert list(loaded.select(COUNT_ALL)) == list(original.select(COUNT_ALL))
+
+    # and the loaded store keeps working as before
+    loaded.insert(make_sample_graph(range(30, 35)), NG + "one")
+    loaded.drop_graph(NG + "two")
+    assert len(loaded.fetch_graph(NG + "two")) == 0
+
+
+def test_snapshot_written_in_chunks(tmp_path: Path):
+    terms = [URIRef(f"urn:term:{i}") for i in range(5)]
+    chunks = [packed(array("q", ids)) for ids in ([0, 1, 2, 3], [4, 1, 2, 3])]
+    path = tmp_path / "chunked.snapshot"
+    write_snapshot(path, terms, iter(chunks), {})
+    snapshot = Snapshot(path)
+    assert snapshot.n_quads == 2
+    assert list(snapshot.quads) == [0, 1, 2, 3, 4, 1, 2, 3]
+    assert snapshot.terms == terms
+
+    write_snapshot(path, terms, iter([]), {})
+    assert Snapshot(path).n_quads == 0
+
+
+def test_snapshot_not_a_snapshot(tmp_path: Path):
+    path = tmp_path / "other.file"
+    path.write_bytes(b"certainly not a snapshot" * 10)
+    with pytest.raises(ValueError):
+        MemoryRDFStore().load_snapshot(path)
+
+
+if __name__ == "__main__":
+    run_single_test(__file__)
@@ -0,0 +1,85 @@
+#! /usr/bin/env python
+"""test_sqlite
+tests the persistence and concurrency of the sqlite backed store
+"""
+
+import threading
+from pathlib import Path
+
+from conftest import make_sample_graph
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.namespace import XSD
+from util4tests import run_single_test
+
+from pyrdfstore.build import create_rdf_store
+from pyrdfstore.sqlite import SQLiteRDFStore, sqlite_path
+from pyrdfstore.terms import key_term, term_key
+
+NG = "urn:test:sqlite"
+
+
+def test_sqlite_path():
+    assert sqlite_path("sqlite:///data/store.db") == "data/store.db"
+    assert sqlite_path("sqlite:////tmp/store.db") == "/tmp/store.db"
+
+
+def test_term_roundtrip():
+    for term in (
+        URIRef("urn:x"),
+        BNode("b1"),
+        Literal("plain"),
+        Literal("hallo", lang="nl"),
+        Literal("2024-01-02", datatype=XSD.date),
+        Literal(""),
+    ):
+        back = key_term(*term_key(term))
+        assert back == term and type(back) is type(term)
+
+
+def test_create_and_reopen(tmp_path: Path):
+    path = tmp_path / "reopen.db"
+    store = create_rdf_store(f"sqlite:///{path}")
+    assert isinstance(store, SQLiteRDFStore)
+    g: Graph = make_sample_graph(range(10))
+    store.replace_graph(g, NG)
+    lastmod = store.lastmod_ts(NG)
+    fingerprint = store.fingerprint(NG)
+    store.close()
+
+    reopened = SQLiteRDFStore(path)
+    assert NG in reopened.named_graphs
+    assert reopened.lastmod_ts(NG) == lastmod
+    assert reopened.fingerprint(NG) == fingerprint
+    assert set(reopened.fetch_graph(NG)) == set(reopened.clean(g))
+    reopened.close()
+
+
+def test_read_while_writing(tmp_path: Path):
+    store = SQLiteRDFStore(tmp_path / "concurrent.db")
+    store.insert(make_sample_graph(range(100)), NG)
+    count = "SELECT (count(*) as ?n) WHERE { ?s ?p ?o }"
+    before: int = int(list(store.select(count, NG))[0][0])
+    counts = list()
+
+    def read():
+        counts.extend(
+            int(list(store.select(count, NG))[0][0]) for _ in range(5)
+        )
+
+    writer = threading.Thread(
+        target=store.insert, args=(make_sample_graph(range(100, 200)), NG)
+    )
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for thread in [writer] + readers:
+        thread.start()
+    for thread in [writer] + readers:
+        thread.join()
+    after: int = int(list(store.select(count, NG))[0][0])
+    assert after > before
+    # every read saw either all or none of the insert
+    assert set(counts) <= {before, after}
+    store.close()
+
+
+if __name__ == "__main__":
+    run_single_test(__file__)
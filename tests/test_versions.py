@@ -0,0 +1,94 @@
+#! /usr/bin/env python
+"""test_versions
+tests the isolation of the reads from the writes in the in memory stores
+"""
+
+import threading
+from time import perf_counter
+
+import pytest
+from conftest import make_sample_graph
+from util4tests import run_single_test
+
+from pyrdfstore.store import MemoryRDFStore
+
+NG = "urn:test:versions"
+COUNT = "SELECT (count(*) as ?n) WHERE { ?s ?p ?o }"
+
+
+def _stores():
+    yield MemoryRDFStore
+    try:
+        from pyrdfstore.arrays import ArrayRDFStore
+
+        yield ArrayRDFStore
+    except ImportError:
+        pass
+
+
+@pytest.fixture(params=list(_stores()), ids=lambda cls: cls.__name__)
+def store(request) -> MemoryRDFStore:
+    return request.param(cleaner=lambda g: g)
+
+
+def _count(store: MemoryRDFStore, named_graph=None) -> int:
+    return int(list(store.select(COUNT, named_graph))[0][0])
+
+
+def test_reads_see_whole_versions(store: MemoryRDFStore):
+    store.insert(make_sample_graph(range(100)), NG)
+    before: int = _count(store, NG)
+    counts = list()
+
+    def read():
+        for _ in range(20):
+            counts.append(_count(store, NG))
+            counts.append(_count(store))
+
+    def write():
+        store.insert(make_sample_graph(range(100, 200)), NG)
+
+    writer = threading.Thread(target=write)
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for thread in [writer] + readers:
+        thread.start()
+    for thread in [writer] + readers:
+        thread.join()
+    after: int = _count(store, NG)
+    assert after == 2 * before
+    # every read saw either all or none of the insert
+    assert set(counts) <= {before, after}
+
+
+def test_open_result_unaffected_by_writes(store: MemoryRDFStore):
+    store.replace_graph(make_sample_graph(range(10)), NG)
+    rows = iter(store.select("SELECT ?s WHERE { ?s ?p ?o }", NG))
+    first = next(rows)
+    store.replace_graph(make_sample_graph(range(10, 30)), NG)
+    store.drop_graph(NG)
+    assert len([first, *rows]) == 10
+    assert _count(store, NG) == 0
+
+
+def test_graphs_versioned_apart(store: MemoryRDFStore):
+    other = "urn:test:versions:other"
+    shared = make_sample_graph(range(5))
+    store.insert(shared, NG)
+    store.insert(shared, other)
+    store.drop_graph(NG)
+    assert _count(store, other) == 5
+    assert _count(store) == 5
+
+
+def test_repeated_appends_stay_linear(store: MemoryRDFStore):
+    # appends should not cost in proportion to the graph written into
+    start: float = perf_counter()
+    for i in range(300):
+        store.insert(make_sample_graph(range(i * 100, (i + 1) * 100)), NG)
+    elapsed: float = perf_counter() - start
+    assert _count(store, NG) == 30000
+    assert elapsed < 30, f"300 appends took {elapsed:.1f}s"
+
+
+if __name__ == "__main__":
+    run_single_test(__file__)